@@ -0,0 +1,77 @@
+"""Throughput comparison of the CRC64 kernels.
+
+Run from the repository root after building the extension:
+
+    python benchmarks/bench_crc64.py [--size MiB] [--repeat N]
+
+Slow kernels are measured on a shorter prefix of the buffer.
+"""
+
+import argparse
+import os
+import time
+
+from pycheckit import crc64_pure
+
+try:
+    from pycheckit import crc64 as crc64_ext
+except ImportError:
+    crc64_ext = None
+
+try:
+    from pycheckit import crc64_numpy
+except ImportError:
+    crc64_numpy = None
+
+MiB = 1024 * 1024
+
+
+def kernels():
+    """Return the (name, function, max_bytes) triples to benchmark."""
+    result = []
+    if crc64_ext is not None:
+        result += [
+            ("bytewise", crc64_ext.crc64_bytewise, None),
+            ("slice-by-8", crc64_ext.crc64_slice8, None),
+            ("slice-by-16", crc64_ext.crc64_slice16, None),
+        ]
+        if crc64_ext.HAVE_CLMUL:
+            result.append(("clmul", crc64_ext.crc64_clmul, None))
+    if crc64_numpy is not None:
+        result.append(("numpy", crc64_numpy.crc64, 16 * MiB))
+    result.append(("python", crc64_pure.crc64, 1 * MiB))
+    return result
+
+
+def bench(func, data, repeat: int) -> float:
+    """Return the best throughput of func over data in MiB/s."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(0, data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(data) / MiB / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=64, help='Buffer size in MiB')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions per kernel')
+    args = parser.parse_args()
+
+    data = memoryview(os.urandom(args.size * MiB))
+    reference = crc64_pure.crc64(0, data[:64 * 1024])
+    baseline = None
+
+    print(f"{'kernel':<14}{'MiB/s':>10}{'speedup':>10}")
+    for name, func, max_bytes in kernels():
+        assert func(0, data[:64 * 1024]) == reference, f"{name} disagrees with crc64_pure"
+        sample = data[:max_bytes] if max_bytes else data
+        rate = bench(func, sample, args.repeat)
+        baseline = baseline or rate
+        print(f"{name:<14}{rate:>10.1f}{rate / baseline:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
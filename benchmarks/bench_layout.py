@@ -0,0 +1,137 @@
+"""Benchmark of name vs inode vs physical processing order on a fragmented tree.
+
+Creates files whose names are unrelated to their creation order, so
+name order jumps back and forth across the disk. With --pieces N each
+file is written in N pieces, round robin with the others and with an
+fsync after every round, which interleaves the files' blocks as well.
+For every --order mode it reports the seeks implied by the order (jumps
+between the extents of consecutive reads, from FIEMAP) and times
+`pycheckit -c -r --direct-io` over the tree, so the reads go to the disk
+and not to the page cache:
+
+    python benchmarks/bench_layout.py [--files N] [--size SIZE] [--pieces N] [--root DIR]
+    python benchmarks/bench_layout.py --image FILE [--image-size SIZE] ...
+
+Seek times only show on rotating media. Without one at hand, --image
+creates an ext4 image in FILE, loop-mounts it (as root) and runs the
+benchmark inside; put FILE on a hard disk for meaningful timings.
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from pycheckit.cli import main as pycheckit_main
+from pycheckit.constants import WalkOrder
+from pycheckit.core import file_extents
+from pycheckit.walk import walk_tree
+
+ORDERS = [WalkOrder.NAME, WalkOrder.INODE, WalkOrder.PHYSICAL]
+
+
+def make_fragmented_tree(root: str, count: int, size: int, pieces: int) -> None:
+    """Create count files of size bytes in root with random names, written in interleaved pieces."""
+    rng = random.Random(0)
+    names = [f"f{rng.getrandbits(32):08x}" for _ in range(count)]
+    files = [open(os.path.join(root, name), 'wb') for name in names]
+    try:
+        piece = -(-size // pieces)
+        for _ in range(pieces):
+            for f in files:
+                f.write(os.urandom(piece))
+                f.flush()
+                os.fsync(f.fileno())
+    finally:
+        for f in files:
+            f.close()
+
+
+def seeks(root: str, order: WalkOrder) -> tuple:
+    """Return (seeks, total seek distance in bytes) of reading the tree in order."""
+    count = distance = 0
+    position = None
+    for path, dir_fd, entries in walk_tree(root, order=order):
+        for entry in entries:
+            fd = os.open(entry.name, os.O_RDONLY, dir_fd=dir_fd)
+            try:
+                extents = file_extents(fd, 1024) or []
+            finally:
+                os.close(fd)
+            for _, physical, length in extents:
+                if position is not None and physical != position:
+                    count += 1
+                    distance += abs(physical - position)
+                position = physical + length
+    return count, distance
+
+
+def run_pycheckit(*args: str) -> float:
+    """Run pycheckit with args, discard its output and return the wall-clock time."""
+    sys.argv = ['pycheckit', *args]
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            start = time.perf_counter()
+            pycheckit_main()
+            return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def loop_mounted(image: str, size: int):
+    """Create an ext4 image of size bytes, mount it and yield the mount point."""
+    with open(image, 'wb') as f:
+        f.truncate(size)
+    subprocess.run(['mkfs.ext4', '-q', '-F', image], check=True)
+    mountpoint = tempfile.mkdtemp(prefix='pycheckit-mnt-')
+    subprocess.run(['mount', '-o', 'loop', image, mountpoint], check=True)
+    try:
+        yield mountpoint
+    finally:
+        subprocess.run(['umount', mountpoint], check=False)
+        os.rmdir(mountpoint)
+        os.unlink(image)
+
+
+def benchmark(root: str, args: argparse.Namespace) -> None:
+    print(f"Creating {args.files} files of {args.size} bytes in {args.pieces} pieces in {root} ...")
+    make_fragmented_tree(root, args.files, args.size, args.pieces)
+    run_pycheckit('-s', '-r', root)
+    total = args.files * args.size
+
+    print(f"{'order':<10}{'seeks':>8}{'seek GB':>10}{'seconds':>10}{'MB/s':>10}")
+    for order in ORDERS:
+        count, distance = seeks(root, order)
+        elapsed = run_pycheckit('-c', '-r', '--direct-io', '--order', order, root)
+        print(f"{order:<10}{count:>8}{distance / 1e9:>10.2f}{elapsed:>10.2f}{total / elapsed / 1e6:>10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=200, help='Number of files')
+    parser.add_argument('--size', type=int, default=1024 * 1024, help='Size of each file in bytes')
+    parser.add_argument('--pieces', type=int, default=1, help='Pieces each file is written in')
+    parser.add_argument('--root', help='Directory for the tree (default: new temporary directory)')
+    parser.add_argument('--image', help='Create and loop-mount an ext4 image here and use it (needs root)')
+    parser.add_argument('--image-size', type=int, default=1 << 30, help='Size of the image in bytes')
+    args = parser.parse_args()
+
+    if args.image:
+        with loop_mounted(args.image, args.image_size) as mountpoint:
+            benchmark(mountpoint, args)
+        return
+
+    root = args.root or tempfile.mkdtemp(prefix='pycheckit-bench-')
+    try:
+        benchmark(root, args)
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark of hashing with worker processes, from 1 to N cores.
+
+Creates a tree of files and times `pycheckit -c -r` over it, first in a
+single process, then with `-j K --pool process` for K = 2 .. N, and
+prints the throughput and speedup of each run:
+
+    python benchmarks/bench_processes.py [--backend python] [--files N] [--size SIZE] [--max-jobs N]
+
+The pure-Python backend holds the GIL while hashing, so threads cannot
+speed it up; worker processes should scale close to linearly until the
+storage or the main process (xattr calls and output) becomes the limit.
+The files are checked once before timing so they are in the page cache.
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pycheckit.cli import main as pycheckit_main
+
+FILES_PER_DIR = 100
+
+
+def make_tree(root: str, count: int, size: int) -> None:
+    """Create count files of size random bytes below root, FILES_PER_DIR per directory."""
+    for index in range(count):
+        directory = os.path.join(root, f"d{index // FILES_PER_DIR:04d}")
+        if index % FILES_PER_DIR == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"f{index:06d}"), 'wb') as f:
+            f.write(os.urandom(size))
+
+
+def run_pycheckit(*args: str) -> float:
+    """Run pycheckit with args, discard its output and return the wall-clock time."""
+    sys.argv = ['pycheckit', *args]
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            start = time.perf_counter()
+            pycheckit_main()
+            return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', default='python', help='CRC64 backend (default: python)')
+    parser.add_argument('--files', type=int, default=400, help='Number of files')
+    parser.add_argument('--size', type=int, default=64 * 1024, help='Size of each file in bytes')
+    parser.add_argument('--max-jobs', type=int, default=os.cpu_count() or 1, help='Largest number of processes')
+    parser.add_argument('--root', help='Directory for the tree (default: new temporary directory)')
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix='pycheckit-bench-')
+    try:
+        print(f"Creating {args.files} files of {args.size} bytes in {root} ...")
+        make_tree(root, args.files, args.size)
+        backend = ['--crc-backend', args.backend]
+        run_pycheckit(*backend, '-s', '-r', root)
+        total = args.files * args.size
+
+        print(f"{'jobs':>5}{'seconds':>10}{'MB/s':>10}{'speedup':>10}")
+        baseline = None
+        for jobs in range(1, args.max_jobs + 1):
+            pool = ['-j', str(jobs), '--pool', 'process'] if jobs > 1 else []
+            elapsed = run_pycheckit(*backend, '-c', '-r', *pool, root)
+            baseline = baseline or elapsed
+            print(f"{jobs:>5}{elapsed:>10.2f}{total / elapsed / 1e6:>10.1f}{baseline / elapsed:>10.2f}")
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark of directory traversal on a tree with many entries.
+
+Creates a tree of empty files (1000 per directory) and compares the stat
+calls and wall-clock time of the former pathlib walk (iterdir, is_dir,
+then exists/is_dir/is_file per file) with the os.scandir walk used by
+process_dir, then times a full `pycheckit -c -r` over the tree:
+
+    python benchmarks/bench_walk.py [--entries N] [--root DIR] [--keep] [--strace]
+
+With --strace (and strace installed) the pycheckit run is repeated under
+`strace -c` to show the system calls by type. Drop the page cache
+between runs to measure cold metadata lookups.
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from pycheckit.cli import main as pycheckit_main
+
+FILES_PER_DIR = 1000
+
+
+def make_tree(root: str, count: int) -> None:
+    """Create count empty files below root, FILES_PER_DIR per directory."""
+    for index in range(count):
+        directory = os.path.join(root, f"d{index // FILES_PER_DIR // 100:03d}",
+                                 f"d{index // FILES_PER_DIR:05d}")
+        if index % FILES_PER_DIR == 0:
+            os.makedirs(directory, exist_ok=True)
+        open(os.path.join(directory, f"f{index:07d}"), 'wb').close()
+
+
+class StatCounter:
+    """Count os.stat calls made from Python code, including pathlib's."""
+
+    def __init__(self):
+        self.calls = 0
+
+    @contextlib.contextmanager
+    def counting(self):
+        real_stat = os.stat
+
+        def counting_stat(*args, **kwargs):
+            self.calls += 1
+            return real_stat(*args, **kwargs)
+        os.stat = counting_stat
+        try:
+            yield
+        finally:
+            os.stat = real_stat
+
+
+def pathlib_walk(path: Path) -> int:
+    """Walk the tree the way process_dir/process_file used to; return the file count."""
+    files = 0
+    for entry in sorted(path.iterdir()):
+        if entry.is_dir():
+            files += pathlib_walk(entry)
+        elif entry.exists() and not entry.is_dir() and entry.is_file():
+            files += 1
+    return files
+
+
+def scandir_walk(path: str, counter: StatCounter) -> int:
+    """Walk the tree like process_dir does now; return the file count."""
+    files = 0
+    with os.scandir(path) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        if entry.is_dir():
+            files += scandir_walk(entry.path, counter)
+        else:
+            # One fstatat per file, cached on the entry
+            counter.calls += 1
+            entry.stat()
+            files += 1
+    return files
+
+
+def timed(func, *args):
+    """Return the result and wall-clock time of func(*args)."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run_pycheckit(*args: str) -> float:
+    """Run pycheckit with args, discard its output and return the wall-clock time."""
+    sys.argv = ['pycheckit', *args]
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            start = time.perf_counter()
+            pycheckit_main()
+            return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=1_000_000, help='Number of files')
+    parser.add_argument('--root', help='Directory for the tree (default: new temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='Keep the tree afterwards')
+    parser.add_argument('--strace', action='store_true', help='Count system calls of the pycheckit run with strace')
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix='pycheckit-bench-')
+    try:
+        print(f"Creating {args.entries} files in {root} ...")
+        make_tree(root, args.entries)
+
+        old = StatCounter()
+        with old.counting():
+            files, old_time = timed(pathlib_walk, Path(root))
+        new = StatCounter()
+        _, new_time = timed(scandir_walk, root, new)
+        print(f"{'walk':<10}{'seconds':>10}{'stat calls':>14}{'per file':>10}")
+        print(f"{'pathlib':<10}{old_time:>10.2f}{old.calls:>14}{old.calls / files:>10.2f}")
+        print(f"{'scandir':<10}{new_time:>10.2f}{new.calls:>14}{new.calls / files:>10.2f}")
+
+        elapsed = run_pycheckit('-c', '-r', root)
+        print(f"pycheckit -c -r: {elapsed:.2f} s, {files / elapsed:.0f} files/s")
+
+        if args.strace:
+            if shutil.which('strace') is None:
+                print("strace not found")
+            else:
+                subprocess.run(['strace', '-f', '-c', '-e', 'trace=%stat,%file,%desc',
+                                sys.executable, '-m', 'pycheckit', '-c', '-r', root],
+                               stdout=subprocess.DEVNULL)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
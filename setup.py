@@ -1,15 +1,24 @@
 """Setup configuration for pycheckit with Cython extension."""
 
-from setuptools import setup
+from setuptools import setup, Extension
 from Cython.Build import cythonize
 import os
 
-# Determine the path to the .pyx file
-pyx_file = os.path.join("src", "pycheckit", "crc64.pyx")
+# Determine the path to the .pyx file and the C folding kernel
+src_dir = os.path.join("src", "pycheckit")
+crc64_ext = Extension(
+    "pycheckit.crc64",
+    sources=[
+        os.path.join(src_dir, "crc64.pyx"),
+        os.path.join(src_dir, "crc64_clmul.c"),
+    ],
+    include_dirs=[src_dir],
+    depends=[os.path.join(src_dir, "crc64_clmul.h")],
+)
 
 setup(
     ext_modules=cythonize(
-        [pyx_file],
+        [crc64_ext],
         compiler_directives={
             'language_level': "3",
             'boundscheck': False,
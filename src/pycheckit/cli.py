@@ -1,33 +1,67 @@
 """Command-line interface for pycheckit."""
 
 import os
+import stat
 import sys
 import argparse
+import contextlib
+from functools import partial
 from pathlib import Path
+from collections.abc import Iterator
 
 from pycheckit.constants import (
     VERSION,
+    MAX_BUF_LEN,
+    MIN_BUF_LEN,
+    HARDLINK_CACHE_SIZE,
+    SMALL_FILE_BATCH,
+    SMALL_FILE_SIZE,
+    WALK_CHUNK,
     ErrorType,
     Flags,
     CheckitOptions,
+    DeviceClass,
+    ReadMethod,
+    IoProfile,
+    PoolType,
+    WalkOrder,
     Color,
     Attribute,
 )
 from pycheckit.core import (
+    Mounts,
     Stats,
+    Settings,
+    FileMeta,
+    HardlinkCache,
     error_message,
     get_crc,
     file_crc64,
     put_crc,
     remove_crc,
+    refresh_crc,
     export_crc,
     import_crc,
-    get_checkit_options,
     set_checkit_options,
     remove_checkit_options,
     hidden_crc_file,
+    open_fd,
+    throttle_read,
 )
+from pycheckit.crc64_wrapper import (
+    AUTO,
+    BACKEND_ENV,
+    BACKEND_NAMES,
+    available_backends,
+    crc64_files,
+    get_implementation,
+    select_backend,
+)
+from pycheckit.devices import DeviceQueues
 from pycheckit.file_list import FileList
+from pycheckit.throttle import AdaptiveTokenBucket, TokenBucket
+from pycheckit.pipeline import Pipeline, ProcessPool, in_order, in_worker
+from pycheckit.walk import walk_tree
 
 
 def textcolor(attr: int, fg: int, bg: int) -> None:
@@ -59,12 +93,105 @@ def cprintf(msg: str, directory: str, base_filename: str, mono: bool, color: Col
         reset_text()
 
 
+def parse_size(value: str) -> int:
+    """Parse a byte count with an optional K, M, G or T suffix (powers of 1024).
+
+    Args:
+        value: Size string, e.g. "4096", "64K" or "1G"
+
+    Returns:
+        Size in bytes
+    """
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    text = value.strip().upper().removesuffix('B')
+    multiplier = units.get(text[-1:], 1)
+    if multiplier != 1:
+        text = text[:-1]
+    try:
+        size = int(text) * multiplier
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
+    if size < 0:
+        raise argparse.ArgumentTypeError(f"size must not be negative: {value!r}")
+    return size
+
+
+def positive_int(value: str) -> int:
+    """Parse a positive integer command line argument."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value!r}")
+    return number
+
+
+def non_negative_int(value: str) -> int:
+    """Parse a non-negative integer command line argument."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {value!r}")
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative: {value!r}")
+    return number
+
+
+def buffer_size(value: str) -> int:
+    """Parse the read buffer size: a size of at least MIN_BUF_LEN bytes or "auto".
+
+    Returns:
+        Size in bytes, or 0 for "auto" (adaptive buffer)
+    """
+    if value.strip().lower() == 'auto':
+        return 0
+    size = parse_size(value)
+    if size < MIN_BUF_LEN:
+        raise argparse.ArgumentTypeError(f"buffer size must be at least {MIN_BUF_LEN}: {value!r}")
+    return size
+
+
+def device_depth(value: str) -> tuple[DeviceClass | int, int]:
+    """Parse a --device-depth argument KEY=N.
+
+    KEY is a device class (hdd, ssd or other) or a path on the device.
+
+    Returns:
+        Tuple of (DeviceClass or device number, number of workers)
+    """
+    key, sep, depth = value.rpartition('=')
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"expected KEY=N: {value!r}")
+    depth = positive_int(depth)
+    if key in [c.value for c in DeviceClass]:
+        return DeviceClass(key), depth
+    try:
+        return os.stat(key).st_dev, depth
+    except OSError as e:
+        raise argparse.ArgumentTypeError(f"cannot stat {key!r}: {e.strerror}")
+
+
+def print_read_stats() -> None:
+    """Print the number of bytes read, read calls issued and I/O wait vs hash time."""
+    average = Stats.bytes_read // Stats.read_calls if Stats.read_calls else 0
+    print(f"Read {Stats.bytes_read} bytes in {Stats.read_calls} read call(s) "
+          f"(average {average} bytes per read).", file=sys.stderr)
+    print(f"Waited {Stats.io_wait:.3f} s for I/O, hashed for {Stats.hash_time:.3f} s.", file=sys.stderr)
+    if Stats.linked:
+        print(f"Reused the checksum of another hard link for {Stats.linked} file(s).", file=sys.stderr)
+    if Stats.unchanged:
+        print(f"Skipped {Stats.unchanged} unchanged file(s).", file=sys.stderr)
+
+
 def print_error_message(result: ErrorType, filename: str) -> None:
     """Print error message."""
     print(f"For file {filename}: {error_message(result)}", file=sys.stderr)
 
 
-def process_file(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_files: FileList) -> ErrorType:
+def process_file(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_files: FileList,
+                 crc: int | None = None, dir_fd: int | None = None,
+                 st: os.stat_result | None = None, meta: FileMeta | None = None) -> ErrorType:
     """Process a single file.
 
     Args:
@@ -72,39 +199,110 @@ def process_file(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_fi
         flags: Command line flags
         no_crc_files: List to store files without CRC
         bad_crc_files: List to store files with bad CRC
+        crc: Checksum of the file if it is already known
+        dir_fd: Descriptor of the directory containing the file; if given,
+            the file is looked up by its name relative to it
+        st: Stat result of the file if it is already known
+        meta: Metadata of the file if it is already loaded
 
     Returns:
         Error code
     """
-    path = Path(filepath)
+    name = os.path.basename(filepath) if dir_fd is not None else filepath
 
     # Check if file exists
-    if not path.exists():
-        print_error_message(ErrorType.ERROR_OPEN_FILE, filepath)
-        return ErrorType.ERROR_OPEN_FILE
+    if st is None:
+        try:
+            st = os.stat(name, dir_fd=dir_fd)
+        except (OSError, ValueError):
+            in_order(print_error_message, ErrorType.ERROR_OPEN_FILE, filepath)
+            return ErrorType.ERROR_OPEN_FILE
 
     # Skip hidden files
-    if path.name.startswith('.'):
+    if Path(filepath).name.startswith('.'):
         return ErrorType.SUCCESS
 
     # Check if it's a directory
-    if path.is_dir():
+    if stat.S_ISDIR(st.st_mode):
         if flags & Flags.RECURSE:
-            return process_dir(filepath, flags, no_crc_files, bad_crc_files)
+            return process_dir(filepath, flags, no_crc_files, bad_crc_files, dir_fd)
         return ErrorType.SUCCESS
 
     # Only process regular files
-    if not path.is_file():
+    if not stat.S_ISREG(st.st_mode):
+        return ErrorType.SUCCESS
+
+    pipeline = Settings.pipeline
+    if pipeline is not None and not in_worker():
+        pipeline.submit(open_and_process, filepath, flags, no_crc_files, bad_crc_files, crc, dir_fd, st, meta,
+                        device=st.st_dev)
+        return ErrorType.SUCCESS
+    pool = Settings.process_pool
+    if pool is not None and not pool.completing and crc is None and flags & (Flags.STORE | Flags.CHECK):
+        meta = meta or FileMeta(filepath, None, st)
+        # Files that are not hashed still wait for their turn
+        pool.hash([(filepath, st.st_size)] if crc_needed(meta, flags) else [],
+                  lambda crcs: open_and_process(filepath, flags, no_crc_files, bad_crc_files,
+                                                crcs.get(filepath), dir_fd, st, meta))
         return ErrorType.SUCCESS
+    return open_and_process(filepath, flags, no_crc_files, bad_crc_files, crc, dir_fd, st, meta)
+
+
+def open_and_process(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_files: FileList,
+                     crc: int | None, dir_fd: int | None, st: os.stat_result,
+                     meta: FileMeta | None = None) -> ErrorType:
+    """Open a regular file and process it, see process_regular_file()."""
+    # Open the file once; xattr calls and hashing then use the descriptor.
+    # Without read permission fall back to path-based calls, which report
+    # the error as before.
+    name = os.path.basename(filepath) if dir_fd is not None else filepath
+    try:
+        fd = open_fd(name, dir_fd)
+    except OSError:
+        fd = None
+    # Checksums hashed ahead (small files, worker processes) count for the
+    # other links to the inode as well
+    if crc is not None and Settings.hardlinks is not None:
+        Settings.hardlinks.add_link(st, crc)
+    try:
+        return process_regular_file(filepath, flags, no_crc_files, bad_crc_files, crc, fd, st, meta)
+    finally:
+        if fd is not None:
+            os.close(fd)
 
+
+def process_regular_file(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_files: FileList,
+                         crc: int | None, fd: int | None,
+                         st: os.stat_result | None = None, meta: FileMeta | None = None) -> ErrorType:
+    """Display, store, check or remove the checksum of a regular file.
+
+    Args:
+        filepath: Path to the file
+        flags: Command line flags
+        no_crc_files: List to store files without CRC
+        bad_crc_files: List to store files with bad CRC
+        crc: Checksum of the file if it is already known
+        fd: Open descriptor of the file, or None to use the path
+        st: Stat result of the file, handed to the hashing layer
+        meta: Metadata loaded before the file was hashed ahead, if any
+
+    Returns:
+        Error code
+    """
+    path = Path(filepath)
     directory = str(path.parent / "")
     base_filename = path.name
 
-    checkit_attrs = get_checkit_options(filepath)
+    if meta is None:
+        meta = FileMeta(filepath, fd, st)
+    elif meta.fd is None:
+        # Loaded by path; use the descriptor from here on
+        meta.fd = fd
+    checkit_attrs = meta.options
 
     # Display CRC
     if flags & Flags.DISPLAY:
-        status, crc_value = get_crc(filepath)
+        status, crc_value = get_crc(filepath, meta)
         if status != ErrorType.SUCCESS:
             print_error_message(status, filepath)
             return status
@@ -118,38 +316,47 @@ def process_file(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_fi
     if flags & Flags.SETCRCRO:
         if flags & Flags.VERBOSE:
             print(f"Setting CRC for {filepath} to remain static/read only.", file=sys.stderr)
-        result = set_checkit_options(filepath, CheckitOptions.STATIC)
+        result = set_checkit_options(meta.target, CheckitOptions.STATIC)
         if result != ErrorType.SUCCESS:
             print_error_message(result, filepath)
             return result
+        meta.options = CheckitOptions.STATIC
 
     # Set CRC to read-write
     if flags & Flags.SETCRCRW:
         if flags & Flags.VERBOSE:
             print(f"Setting CRC for {filepath} to allow updates/read-write.", file=sys.stderr)
-        result = set_checkit_options(filepath, CheckitOptions.UPDATEABLE)
+        result = set_checkit_options(meta.target, CheckitOptions.UPDATEABLE)
         if result != ErrorType.SUCCESS:
             print_error_message(result, filepath)
             return result
+        meta.options = CheckitOptions.UPDATEABLE
 
     # Export CRC
     if flags & Flags.EXPORT and not flags & Flags.STORE:
         if flags & Flags.VERBOSE:
             print(f"Exporting attribute for {filepath} to {hidden_crc_file(base_filename)}")
-        result = export_crc(filepath, flags)
+        result = export_crc(filepath, flags, meta)
         if result != ErrorType.SUCCESS:
             print_error_message(result, filepath)
             return result
+        # The checksum has moved to the hidden file
+        meta = FileMeta(filepath, fd, st)
 
     # Import CRC
     if flags & Flags.IMPORT:
-        result = import_crc(filepath, flags)
+        result = import_crc(filepath, flags, meta)
         if result != ErrorType.SUCCESS:
             print_error_message(result, filepath)
             return result
+        meta = FileMeta(filepath, fd, st)
 
-    # Store CRC
-    if flags & Flags.STORE:
+    # Store CRC, unless an incremental store finds the file unchanged
+    if flags & Flags.STORE and Settings.incremental and meta.unchanged():
+        Stats.count('unchanged')
+        if flags & Flags.VERBOSE:
+            print(f"Skipping unchanged file {filepath}", file=sys.stderr)
+    elif flags & Flags.STORE:
         print(f"Storing checksum for file {filepath}", file=sys.stderr)
 
         if checkit_attrs == CheckitOptions.STATIC:
@@ -158,7 +365,7 @@ def process_file(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_fi
         elif checkit_attrs == CheckitOptions.UPDATEABLE:
             flags |= Flags.OVERWRITE
 
-        result = put_crc(filepath, flags)
+        result = put_crc(filepath, flags, crc, meta)
         if result != ErrorType.SUCCESS:
             # For ERROR_NO_XATTR_SUPPORT, print error and return immediately
             # This will cause the program to abort
@@ -171,7 +378,7 @@ def process_file(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_fi
 
     # Check CRC
     if flags & Flags.CHECK:
-        stored_status, stored_crc = get_crc(filepath)
+        stored_status, stored_crc = get_crc(filepath, meta)
         calc_crc = None
 
         if stored_status != ErrorType.ERROR_NO_XATTR:
@@ -179,7 +386,10 @@ def process_file(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_fi
                 print_error_message(ErrorType.ERROR_READ_FILE, filepath)
                 return stored_status
 
-            calc_status, calc_crc = file_crc64(filepath)
+            if crc is not None:
+                calc_status, calc_crc = ErrorType.SUCCESS, crc
+            else:
+                calc_status, calc_crc = file_crc64(filepath, fd, st)
             if calc_status != ErrorType.SUCCESS:
                 print_error_message(ErrorType.ERROR_CRC_CALC, filepath)
                 return calc_status
@@ -188,16 +398,25 @@ def process_file(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_fi
 
         if stored_status != ErrorType.ERROR_NO_XATTR and calc_crc is not None and calc_crc == stored_crc:
             cprintf("  OK  ", directory, base_filename, mono, Color.GREEN)
+        elif (flags & Flags.SCRUB and stored_status == ErrorType.SUCCESS
+              and checkit_attrs == CheckitOptions.UPDATEABLE and meta.modified()):
+            # Modified since the checksum was computed, not corrupted: take the new one
+            result = refresh_crc(meta, calc_crc)
+            if result != ErrorType.SUCCESS:
+                print_error_message(result, filepath)
+                return result
+            cprintf("CHANGED", directory, base_filename, mono, Color.CYAN)
+            Stats.count('updated')
         elif stored_status == ErrorType.ERROR_NO_XATTR:
             cprintf("NO CRC", directory, base_filename, mono, Color.YELLOW)
-            Stats.nocrc += 1
+            Stats.count('nocrc')
             if flags & Flags.VERBOSE:
-                no_crc_files.append(directory, base_filename)
+                in_order(no_crc_files.append, directory, base_filename)
         else:
             cprintf("FAILED", directory, base_filename, mono, Color.RED)
-            Stats.failed += 1
+            Stats.count('failed')
             if flags & Flags.VERBOSE:
-                bad_crc_files.append(directory, base_filename)
+                in_order(bad_crc_files.append, directory, base_filename)
 
         if not mono:
             print("]")
@@ -209,45 +428,244 @@ def process_file(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_fi
         if flags & Flags.VERBOSE:
             print("Removing checksum.", file=sys.stderr)
 
-        result = remove_crc(filepath)
+        result = remove_crc(filepath, meta)
         if result == ErrorType.SUCCESS:
-            result = remove_checkit_options(filepath)
+            result = remove_checkit_options(filepath, meta)
 
         if result != ErrorType.SUCCESS:
             print_error_message(result, filepath)
             return result
 
-    Stats.processed += 1
+    Stats.count('processed')
     return ErrorType.SUCCESS
 
 
-def process_dir(dirpath: str, flags: Flags, no_crc_files: FileList, bad_crc_files: FileList) -> ErrorType:
-    """Process a directory recursively.
+def linked_before(st: os.stat_result) -> bool:
+    """Return True if another hard link to the file's inode has been hashed in this run."""
+    return st.st_nlink > 1 and Settings.hardlinks is not None and st in Settings.hardlinks
+
+
+def crc_needed(meta: FileMeta, flags: Flags) -> bool:
+    """Return True if process_regular_file would use a checksum of the file's data.
+
+    Files are only hashed ahead (small file batches, worker processes) if
+    so: a store that may not overwrite the stored checksum and a check of
+    a file without one never read the file.
+    """
+    if flags & Flags.IMPORT:
+        # The stored checksum is only known after the import
+        return True
+    if flags & Flags.CHECK and meta.crc_status == ErrorType.SUCCESS:
+        return True
+    if not flags & Flags.STORE:
+        return False
+    if not meta.xattrs and not flags & Flags.EXPORT:
+        return False
+    if Settings.incremental and meta.unchanged():
+        return False
+    if meta.options == CheckitOptions.STATIC:
+        return False
+    if meta.crc_status == ErrorType.SUCCESS:
+        return bool(flags & Flags.OVERWRITE) or meta.options == CheckitOptions.UPDATEABLE
+    return meta.crc_status == ErrorType.ERROR_NO_XATTR
+
+
+def small_file_crcs(entries: list[os.DirEntry], flags: Flags,
+                    dirpath: str) -> tuple[dict[str, int], dict[str, FileMeta]]:
+    """Hash the small regular files of one directory in batches.
+
+    The metadata of each small file is loaded first, and only the files
+    whose checksum will be used (see crc_needed) are read.
+
+    Args:
+        entries: Directory entries from os.scandir
+        flags: Command line flags
+        dirpath: Path to the directory
+
+    Returns:
+        Tuple of dictionaries mapping file names to their checksums and to
+        their loaded metadata. Files that could not be hashed are left out
+        of the first and handled by process_file as usual.
+    """
+    if not Settings.small_file_size or not flags & (Flags.STORE | Flags.CHECK):
+        return {}, {}
+    # The native batch reader knows nothing about O_NOATIME and drop-behind
+    if Settings.io_profile == IoProfile.SCRUB or Settings.direct_io:
+        return {}, {}
+    # Most files of an incremental store are not read at all
+    if Settings.incremental:
+        return {}, {}
+    # Batches are hashed while the walker waits, which would stall the
+    # other devices; with device queues small files are tasks like any other
+    if Settings.pipeline is not None and Settings.pipeline.devices is not None:
+        return {}, {}
+
+    small_files = []
+    metas = {}
+    for entry in entries:
+        if entry.name.startswith('.'):
+            continue
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode) and st.st_size <= Settings.small_file_size and not linked_before(st):
+            meta = metas[entry.name] = FileMeta(os.path.join(dirpath, entry.name), None, st)
+            if crc_needed(meta, flags):
+                small_files.append((entry, st.st_size))
+
+    # Read every small file with a single call where possible
+    batch_buffer = max(Settings.buffer_size, Settings.small_file_size)
+
+    def hash_batch(batch):
+        if Settings.file_limiter is not None:
+            Settings.file_limiter.acquire(len(batch))
+        throttle_read(sum(size for _, size in batch))
+        paths = [os.path.join(dirpath, entry.name) for entry, _ in batch]
+        return crc64_files(paths, batch_buffer)
+
+    # With a worker pool, split the files evenly over the workers
+    pipeline = Settings.pipeline
+    batch_size = SMALL_FILE_BATCH
+    if pipeline is not None:
+        batch_size = max(1, min(batch_size, -(-len(small_files) // pipeline.jobs)))
+    batches = [small_files[start:start + batch_size] for start in range(0, len(small_files), batch_size)]
+    results = pipeline.executor.map(hash_batch, batches) if pipeline is not None else map(hash_batch, batches)
+
+    crcs = {}
+    for batch, batch_results in zip(batches, results):
+        for (entry, size), (error, crc) in zip(batch, batch_results):
+            if not error:
+                crcs[entry.name] = crc
+                Stats.add_reads(-(-size // batch_buffer), size)
+    return crcs, metas
+
+
+def process_dir(dirpath: str, flags: Flags, no_crc_files: FileList, bad_crc_files: FileList,
+                dir_fd: int | None = None) -> ErrorType:
+    """Process a directory tree.
+
+    Files are processed as the walker discovers them, in chunks of at most
+    WALK_CHUNK entries, so memory use does not depend on the size of a
+    directory and the depth of the tree is not limited by recursion. See
+    walk_tree() for the order.
 
     Args:
         dirpath: Path to the directory
         flags: Command line flags
         no_crc_files: List to store files without CRC
         bad_crc_files: List to store files with bad CRC
+        dir_fd: Descriptor of the parent directory, if dirpath is relative to it
 
     Returns:
         Error code
     """
-    try:
-        for entry in sorted(Path(dirpath).iterdir()):
-            if entry.name in ('.', '..'):
+    for _ in iter_process_dir(dirpath, flags, no_crc_files, bad_crc_files, dir_fd):
+        pass
+    return ErrorType.SUCCESS
+
+
+def iter_process_dir(dirpath: str, flags: Flags, no_crc_files: FileList, bad_crc_files: FileList,
+                     dir_fd: int | None = None) -> Iterator[None]:
+    """Process a directory tree step by step, see process_dir().
+
+    Yields after each file is processed or submitted to the worker pool
+    (after each chunk with worker processes), so that several trees can
+    be walked side by side.
+    """
+    pipeline = Settings.pipeline
+    pool = Settings.process_pool
+    for path, dfd, entries in walk_tree(dirpath, dir_fd, Settings.walk_order):
+        if pool is not None and flags & (Flags.STORE | Flags.CHECK):
+            hash_in_processes(pool, entries, flags, path, dfd, no_crc_files, bad_crc_files)
+            yield
+            continue
+        crcs, metas = small_file_crcs(entries, flags, path)
+        if pipeline is not None:
+            # The walker closes dfd when it moves on; the tasks get their own copy
+            chunk_fd = os.dup(dfd)
+        for index, entry in enumerate(entries):
+            filepath = os.path.join(path, entry.name)
+            try:
+                st = entry.stat()
+            except OSError:
+                st = None
+            if pipeline is None:
+                process_dir_entry(filepath, flags, no_crc_files, bad_crc_files, crcs.get(entry.name), dfd, st,
+                                  metas.get(entry.name))
+                yield
                 continue
+            last = index == len(entries) - 1
+            pipeline.submit(process_dir_entry, filepath, flags, no_crc_files, bad_crc_files,
+                            crcs.get(entry.name), chunk_fd, st, metas.get(entry.name),
+                            cleanup=partial(os.close, chunk_fd) if last else None,
+                            device=st.st_dev if st is not None else None)
+            yield
 
-            if entry.is_dir() and (flags & Flags.RECURSE):
-                process_dir(str(entry), flags, no_crc_files, bad_crc_files)
-            else:
-                process_file(str(entry), flags, no_crc_files, bad_crc_files)
-                if flags & Flags.VERBOSE:
-                    print(f"Processing file {entry}.")
 
-        return ErrorType.SUCCESS
-    except (OSError, IOError):
-        return ErrorType.ERROR_OPEN_DIR
+def hash_in_processes(pool: ProcessPool, entries: list[os.DirEntry], flags: Flags, dirpath: str,
+                      dir_fd: int, no_crc_files: FileList, bad_crc_files: FileList) -> None:
+    """Hash a chunk of directory entries in worker processes.
+
+    The regular files of the chunk whose checksum will be used (see
+    crc_needed) are sent to the pool; once their checksums are back, every
+    entry of the chunk is processed in order by the main process, with the
+    checksum if there is one.
+
+    Args:
+        pool: Worker processes
+        entries: Directory entries from the walker
+        flags: Command line flags
+        dirpath: Path to the directory
+        dir_fd: Descriptor of the directory
+        no_crc_files: List to store files without CRC
+        bad_crc_files: List to store files with bad CRC
+    """
+    files = []
+    for entry in entries:
+        try:
+            st = entry.stat()
+        except OSError:
+            st = None
+        files.append((os.path.join(dirpath, entry.name), st))
+    links = Settings.hardlinks
+    to_hash = []
+    claimed = []
+    metas = {}
+    for filepath, st in files:
+        if st is None or not stat.S_ISREG(st.st_mode) or os.path.basename(filepath).startswith('.'):
+            continue
+        meta = metas[filepath] = FileMeta(filepath, None, st)
+        if not crc_needed(meta, flags):
+            continue
+        if st.st_nlink > 1 and links is not None:
+            # Hash one link per inode; the others reuse its checksum
+            if not links.claim(st):
+                continue
+            claimed.append(st)
+        to_hash.append((filepath, st.st_size))
+
+    # The walker closes dir_fd when it moves on
+    chunk_fd = os.dup(dir_fd)
+
+    def process_chunk(crcs: dict[str, int]) -> None:
+        for filepath, st in files:
+            process_dir_entry(filepath, flags, no_crc_files, bad_crc_files, crcs.get(filepath), chunk_fd, st,
+                              metas.get(filepath))
+        for st in claimed:
+            links.release(st)
+
+    pool.hash(to_hash, process_chunk, cleanup=partial(os.close, chunk_fd))
+
+
+def process_dir_entry(filepath: str, flags: Flags, no_crc_files: FileList, bad_crc_files: FileList,
+                      crc: int | None, dir_fd: int, st: os.stat_result | None,
+                      meta: FileMeta | None = None) -> ErrorType:
+    """Process a file found by the directory walker."""
+    result = process_file(filepath, flags, no_crc_files, bad_crc_files, crc, dir_fd, st, meta)
+    if flags & Flags.VERBOSE:
+        print(f"Processing file {filepath}.")
+    return result
 
 
 def print_header() -> None:
@@ -260,6 +678,13 @@ def print_header() -> None:
     print()
 
 
+def print_version() -> None:
+    """Print version and CRC64 backend information."""
+    print(f"pycheckit {VERSION}")
+    print(f"CRC64 backend: {get_implementation()}")
+    print(f"Available backends: {', '.join(available_backends())}")
+
+
 def print_license() -> None:
     """Print license information."""
     license_text = """License GPLv3+: GNU GPL version 3 or later <http://gnu.org/licenses/gpl.html>.
@@ -278,6 +703,69 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>."""
     print(license_text)
 
 
+def process_inputs(args: argparse.Namespace, flags: Flags, no_crc_files: FileList,
+                   bad_crc_files: FileList) -> ErrorType:
+    """Process the files named on stdin and on the command line.
+
+    Returns:
+        ERROR_NO_XATTR_SUPPORT if the run has to be aborted, SUCCESS otherwise
+    """
+    # Process files from stdin
+    if args.from_stdin:
+        for line in sys.stdin:
+            filepath = line.strip()
+            if filepath:
+                result = process_file(filepath, flags, no_crc_files, bad_crc_files)
+                # Abort immediately if filesystem doesn't support extended attributes
+                if result == ErrorType.ERROR_NO_XATTR_SUPPORT:
+                    return result
+
+    # Process files from command line
+    pipeline = Settings.pipeline
+    if pipeline is not None and pipeline.devices is not None and flags & Flags.RECURSE:
+        return process_side_by_side(args.files, flags, no_crc_files, bad_crc_files)
+    for filepath in args.files:
+        result = process_file(filepath, flags, no_crc_files, bad_crc_files)
+        # Abort immediately if filesystem doesn't support extended attributes
+        if result == ErrorType.ERROR_NO_XATTR_SUPPORT:
+            return result
+
+    return ErrorType.SUCCESS
+
+
+def process_side_by_side(paths: list[str], flags: Flags, no_crc_files: FileList,
+                         bad_crc_files: FileList) -> ErrorType:
+    """Process paths, walking the directories among them side by side.
+
+    Other paths are processed first, in order. Then the directory trees
+    take turns, one file each, so that the queues of all their devices
+    are fed at the same time instead of one disk after the other.
+
+    Returns:
+        ERROR_NO_XATTR_SUPPORT if the run has to be aborted, SUCCESS otherwise
+    """
+    walks = []
+    for filepath in paths:
+        try:
+            is_dir = stat.S_ISDIR(os.stat(filepath).st_mode)
+        except OSError:
+            is_dir = False
+        if is_dir and not Path(filepath).name.startswith('.'):
+            walks.append(iter_process_dir(filepath, flags, no_crc_files, bad_crc_files))
+            continue
+        result = process_file(filepath, flags, no_crc_files, bad_crc_files)
+        if result == ErrorType.ERROR_NO_XATTR_SUPPORT:
+            return result
+
+    while walks:
+        for walk in list(walks):
+            try:
+                next(walk)
+            except StopIteration:
+                walks.remove(walk)
+    return ErrorType.SUCCESS
+
+
 def main() -> int:
     """Main entry point."""
     parser = argparse.ArgumentParser(
@@ -288,6 +776,9 @@ def main() -> int:
 
     parser.add_argument('-s', '--store', action='store_true', help='Calculate and store checksum')
     parser.add_argument('-c', '--check', action='store_true', help='Check file against stored checksum')
+    parser.add_argument('--scrub', action='store_true',
+                        help='Check files and, for updateable checksums of files modified since, store the '
+                             'new checksum; reads each file once')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
     parser.add_argument('-p', '--display', action='store_true', help='Display CRC64 checksum and status')
     parser.add_argument('-x', '--remove', action='store_true', help='Remove stored CRC64 checksum')
@@ -300,6 +791,61 @@ def main() -> int:
     parser.add_argument('-d', '--disallow-update', action='store_true', dest='disallow_update', help='Disallow CRC updates')
     parser.add_argument('-V', '--license', action='store_true', help='Print license')
     parser.add_argument('-m', '--monochrome', action='store_true', help='No colors')
+    parser.add_argument('--version', action='store_true', help='Print version and CRC64 backend')
+    parser.add_argument('--crc-backend', choices=[AUTO] + BACKEND_NAMES, dest='crc_backend',
+                        help=f'CRC64 implementation to use (default: ${BACKEND_ENV} or auto)')
+    parser.add_argument('--parallel-threshold', type=parse_size, default=0, metavar='SIZE',
+                        help='Hash files of at least SIZE bytes in parallel ranges (e.g. 1G, 0 = never)')
+    parser.add_argument('--parallel-workers', type=positive_int, default=os.cpu_count() or 1,
+                        metavar='N', help='Number of threads hashing ranges of one large file')
+    parser.add_argument('--small-file-size', type=parse_size, default=SMALL_FILE_SIZE,
+                        metavar='SIZE', help='Hash files up to SIZE bytes in batches per directory (0 = never)')
+    parser.add_argument('--read-method', choices=[m.value for m in ReadMethod], default=ReadMethod.READINTO,
+                        dest='read_method',
+                        help='How file data is read: read (new buffer per chunk), readinto (reused buffer, '
+                             'default) or mmap (map regular files; unsafe if files are truncated meanwhile)')
+    parser.add_argument('--buffer-size', type=buffer_size, default=MAX_BUF_LEN, metavar='SIZE|auto',
+                        dest='buffer_size',
+                        help=f'Read buffer size (default: {MAX_BUF_LEN}); "auto" picks it per file from the '
+                             'file size and filesystem block size and grows it on long sequential reads')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='Read the next chunk on a background thread while the current one is hashed')
+    parser.add_argument('--io-profile', choices=[p.value for p in IoProfile], default=IoProfile.DEFAULT,
+                        dest='io_profile',
+                        help='scrub: open files with O_NOATIME and drop hashed data from the page cache, '
+                             'so that verification runs do not evict the cache of other services')
+    parser.add_argument('--direct-io', action='store_true', dest='direct_io',
+                        help='Read files with O_DIRECT, bypassing the page cache (where supported)')
+    parser.add_argument('--max-bytes-per-sec', type=parse_size, default=0, metavar='SIZE',
+                        dest='max_bytes_per_sec', help='Limit the read rate to SIZE bytes per second (e.g. 50M)')
+    parser.add_argument('--max-files-per-sec', type=positive_int, metavar='N',
+                        dest='max_files_per_sec', help='Limit the number of files hashed per second')
+    parser.add_argument('--adaptive-throttle', action='store_true', dest='adaptive_throttle',
+                        help='Lower the read rate below --max-bytes-per-sec while read latency is high')
+    parser.add_argument('--order', choices=[o.value for o in WalkOrder], default=WalkOrder.NAME,
+                        help='Order of files within a directory: name (sorted in chunks of '
+                             f'{WALK_CHUNK} entries, default), none (directory order, no sorting), inode '
+                             '(by inode number) or physical (by location on disk, fewer seeks on HDDs)')
+    parser.add_argument('-j', '--jobs', type=positive_int, default=1, metavar='N',
+                        help='Number of files processed in parallel (default: 1); output keeps the input order')
+    parser.add_argument('--pool', choices=[p.value for p in PoolType], default=PoolType.THREAD,
+                        help='Workers used by -j: thread (default) or process, which hashes in separate '
+                             'processes and helps with GIL-bound CRC backends such as python')
+    parser.add_argument('--device-queues', action='store_true', dest='device_queues',
+                        help='Read files in parallel per device: one at a time from each rotational disk, '
+                             'several at a time from SSDs; directory arguments are walked side by side')
+    parser.add_argument('--device-depth', type=device_depth, action='append', default=[], metavar='KEY=N',
+                        dest='device_depth',
+                        help='Read up to N files at a time from devices of class KEY (hdd, ssd, other) or '
+                             'from the device of path KEY; implies --device-queues')
+    parser.add_argument('--incremental', action='store_true',
+                        help='With -s, skip files whose size, mtime and ctime show no change since their '
+                             'checksum was computed; add -o to update changed files')
+    parser.add_argument('--hardlink-cache', type=non_negative_int, default=HARDLINK_CACHE_SIZE, metavar='N',
+                        dest='hardlink_cache',
+                        help='Remember the checksums of up to N hard-linked inodes, so each is read once '
+                             f'per run (default: {HARDLINK_CACHE_SIZE}, 0 = off)')
+    parser.add_argument('--stats', action='store_true', help='Print I/O statistics with the summary')
     parser.add_argument('files', nargs='*', help='Files to process')
 
     args = parser.parse_args()
@@ -317,6 +863,10 @@ def main() -> int:
         print("Cannot remove and store CRC at same time.", file=sys.stderr)
         return 1
 
+    if args.scrub and (args.store or args.remove):
+        print("Cannot scrub and store or remove CRC at the same time.", file=sys.stderr)
+        return 1
+
     if args.allow_update and args.disallow_update:
         print("Cannot disallow and allow changes to CRC at the same time!", file=sys.stderr)
         return 1
@@ -325,6 +875,28 @@ def main() -> int:
         print("Cannot import and export at the same time.", file=sys.stderr)
         return 1
 
+    if (args.device_queues or args.device_depth) and args.pool == PoolType.PROCESS:
+        print("Cannot use device queues with worker processes.", file=sys.stderr)
+        return 1
+
+    if args.incremental and not args.store:
+        print("--incremental requires --store.", file=sys.stderr)
+        return 1
+
+    if args.adaptive_throttle and not args.max_bytes_per_sec:
+        print("--adaptive-throttle requires --max-bytes-per-sec.", file=sys.stderr)
+        return 1
+
+    try:
+        select_backend(args.crc_backend)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    if args.version:
+        print_version()
+        return 0
+
     # Print license if requested
     if args.license:
         print_header()
@@ -345,6 +917,8 @@ def main() -> int:
         flags |= Flags.STORE
     if args.check:
         flags |= Flags.CHECK
+    if args.scrub:
+        flags |= Flags.CHECK | Flags.SCRUB
     if args.display:
         flags |= Flags.DISPLAY
     if args.remove:
@@ -366,6 +940,24 @@ def main() -> int:
     if args.monochrome:
         flags |= Flags.MONOCHROME
 
+    Settings.parallel_threshold = args.parallel_threshold
+    Settings.parallel_workers = args.parallel_workers
+    Settings.small_file_size = args.small_file_size
+    Settings.read_method = ReadMethod(args.read_method)
+    Settings.adaptive_buffer = not args.buffer_size
+    Settings.buffer_size = args.buffer_size or MAX_BUF_LEN
+    Settings.prefetch = args.prefetch
+    Settings.io_profile = IoProfile(args.io_profile)
+    Settings.direct_io = args.direct_io
+    Settings.walk_order = WalkOrder(args.order)
+    Settings.incremental = args.incremental
+    Settings.hardlinks = HardlinkCache(args.hardlink_cache) if args.hardlink_cache else None
+    bucket = AdaptiveTokenBucket if args.adaptive_throttle else TokenBucket
+    Settings.byte_limiter = bucket(args.max_bytes_per_sec) if args.max_bytes_per_sec else None
+    Settings.file_limiter = TokenBucket(args.max_files_per_sec) if args.max_files_per_sec else None
+    Stats.reset()
+    Mounts.reset()
+
     # Check for NO_COLOR environment variable or non-tty
     if not sys.stdout.isatty() or os.environ.get('NO_COLOR'):
         flags |= Flags.MONOCHROME
@@ -374,22 +966,21 @@ def main() -> int:
     no_crc_files = FileList()
     bad_crc_files = FileList()
 
-    # Process files from stdin
-    if args.from_stdin:
-        for line in sys.stdin:
-            filepath = line.strip()
-            if filepath:
-                result = process_file(filepath, flags, no_crc_files, bad_crc_files)
-                # Abort immediately if filesystem doesn't support extended attributes
-                if result == ErrorType.ERROR_NO_XATTR_SUPPORT:
-                    return 1
-
-    # Process files from command line
-    for filepath in args.files:
-        result = process_file(filepath, flags, no_crc_files, bad_crc_files)
-        # Abort immediately if filesystem doesn't support extended attributes
-        if result == ErrorType.ERROR_NO_XATTR_SUPPORT:
-            return 1
+    # With -j N, regular files are processed by a pool of N threads, or
+    # hashed by N worker processes. Device queues add threads per device.
+    if args.jobs > 1 and args.pool == PoolType.PROCESS:
+        Settings.process_pool = ProcessPool(args.jobs)
+    elif args.device_queues or args.device_depth:
+        Settings.pipeline = Pipeline(args.jobs, devices=DeviceQueues(dict(args.device_depth)))
+    elif args.jobs > 1:
+        Settings.pipeline = Pipeline(args.jobs)
+    try:
+        with Settings.pipeline or Settings.process_pool or contextlib.nullcontext():
+            if process_inputs(args, flags, no_crc_files, bad_crc_files) == ErrorType.ERROR_NO_XATTR_SUPPORT:
+                return 1
+    finally:
+        Settings.pipeline = None
+        Settings.process_pool = None
 
     # Print summary
     if not args.files and not args.from_stdin:
@@ -397,6 +988,11 @@ def main() -> int:
         return 0
 
     print(f"Total of {Stats.processed} file(s) processed.", file=sys.stderr)
+    if args.stats:
+        print_read_stats()
+
+    if Stats.updated:
+        print(f"Updated the checksum of {Stats.updated} modified file(s).", file=sys.stderr)
 
     if Stats.nocrc and Stats.processed:
         print(f"\nWARNING: **** {Stats.nocrc} file(s) without a checksum ****", file=sys.stderr)
@@ -1,13 +1,38 @@
 """Constants for pycheckit."""
 
-from enum import IntEnum, Flag, auto
+from enum import IntEnum, StrEnum, Flag, auto
 
 from pycheckit.version import __version__
 
 VERSION = __version__
 ATTRIBUTE_NAME = "user.crc64"
 CHECKIT_OPTIONS_NAME = "user.checkit"
+# Size, mtime and ctime of the file when the checksum was computed (see core.CrcRecord)
+CRC_RECORD_NAME = "user.crc64.meta"
+CRC_RECORD_VERSION = 1
+# Storing the checksum updates ctime; later changes within this window go unnoticed
+CTIME_TOLERANCE_NS = 2_000_000_000
 MAX_BUF_LEN = 65536
+MIN_BUF_LEN = 4096
+ADAPTIVE_MAX_BUF_LEN = 8 * 1024 * 1024
+PARALLEL_RANGE_SIZE = 64 * 1024 * 1024
+SMALL_FILE_SIZE = 65536
+SMALL_FILE_BATCH = 1024
+# Files per batch sent to a worker process (--pool process)
+PROCESS_BATCH = 64
+# Hashed data is dropped from the page cache in steps of this size (scrub profile)
+DROP_BEHIND_LEN = 8 * 1024 * 1024
+# Directory entries are read, sorted and processed in chunks of this size
+WALK_CHUNK = 16384
+# Files processed at a time per device with --device-queues
+HDD_QUEUE_DEPTH = 1
+SSD_QUEUE_DEPTH = 8
+# Devices not backed by a local block device (network, tmpfs, some btrfs/overlay mounts)
+OTHER_QUEUE_DEPTH = 4
+# Checksums of hard-linked inodes remembered per run (about 160 bytes each)
+HARDLINK_CACHE_SIZE = 262144
+# Directory descriptors kept open for relative lookups during a walk
+MAX_OPEN_DIRS = 256
 
 
 class ErrorType(IntEnum):
@@ -66,6 +91,44 @@ class Flags(Flag):
     SETCRCRO = auto()
     SETCRCRW = auto()
     MONOCHROME = auto()
+    # Check, and update the checksums of updateable files that were modified
+    SCRUB = auto()
+
+
+class ReadMethod(StrEnum):
+    """How file data is read for hashing."""
+    READ = "read"
+    READINTO = "readinto"
+    MMAP = "mmap"
+
+
+class WalkOrder(StrEnum):
+    """Order in which directory entries are processed."""
+    NAME = "name"
+    NONE = "none"
+    # By inode number, which roughly follows the on-disk layout on most filesystems
+    INODE = "inode"
+    # By the physical location of the first extent (FIEMAP), falling back to INODE
+    PHYSICAL = "physical"
+
+
+class IoProfile(StrEnum):
+    """How file I/O treats the page cache."""
+    DEFAULT = "default"
+    SCRUB = "scrub"
+
+
+class PoolType(StrEnum):
+    """Kind of workers used by -j."""
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+class DeviceClass(StrEnum):
+    """Kind of storage device, for the queue depth of --device-queues."""
+    HDD = "hdd"
+    SSD = "ssd"
+    OTHER = "other"
 
 
 class Color(IntEnum):
@@ -92,6 +155,7 @@ class Attribute(IntEnum):
 
 # Filesystem type constants
 FS_VFAT = 0x4d44
+FS_EXFAT = 0x2011bab0
 FS_NTFS = 0x5346544e
 FS_UDF = 0x15013346
 FS_XFS = 0x58465342
@@ -100,6 +164,8 @@ FS_NFS = 0x6969
 FS_SMB = 0x517b
 FS_CIFS = 0xff534d42
 FS_BTRFS = 0x9123683e
+# Filesystems that cannot store user extended attributes; checksums go to hidden files
+NO_XATTR_FS_TYPES = frozenset({FS_VFAT, FS_EXFAT, FS_UDF})
 
 
 ERROR_MESSAGES = {
@@ -116,6 +182,7 @@ ERROR_MESSAGES = {
     ErrorType.ERROR_NO_OVERWRITE: "Can not overwrite existing checksum.",
     ErrorType.ERROR_WRITE_FILE: "Could not write to file.",
     ErrorType.ERROR_FILENAME_OVERFLOW: "Filename too long.",
-    ErrorType.ERROR_NO_XATTR_SUPPORT: "Filesystem does not support extended attributes. Use -e to export to hidden files.",
+    ErrorType.ERROR_NO_XATTR_SUPPORT: ("Filesystem does not support extended attributes. "
+                                       "Use -e to export to hidden files."),
 }
 
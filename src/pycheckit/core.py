@@ -1,29 +1,229 @@
 """Core functionality for pycheckit."""
 
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import functools
+import mmap
 import os
+import platform
+import queue
+import stat
 import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, ClassVar
 import xattr
 
-from pycheckit.crc64 import crc64
+from pycheckit.crc64_wrapper import crc64, crc64_combine
+from pycheckit.throttle import TokenBucket
 from pycheckit.constants import (
     ATTRIBUTE_NAME,
     CHECKIT_OPTIONS_NAME,
+    CRC_RECORD_NAME,
+    CRC_RECORD_VERSION,
+    CTIME_TOLERANCE_NS,
     MAX_BUF_LEN,
+    MIN_BUF_LEN,
+    ADAPTIVE_MAX_BUF_LEN,
+    PARALLEL_RANGE_SIZE,
+    SMALL_FILE_SIZE,
+    DROP_BEHIND_LEN,
+    HARDLINK_CACHE_SIZE,
+    NO_XATTR_FS_TYPES,
     ERROR_MESSAGES,
     ErrorType,
+    IoProfile,
+    ReadMethod,
+    WalkOrder,
     AttributeType,
     CheckitOptions,
     Flags
 )
 
+if TYPE_CHECKING:
+    from pycheckit.pipeline import Pipeline, ProcessPool
+
 
 class Stats:
-    """Global statistics for file processing."""
+    """Global statistics for file processing.
+
+    Counters are updated from worker threads; use count(), add_reads() and
+    add_times(), which hold a lock.
+    """
+    _lock = threading.Lock()
     processed = 0
     failed = 0
     nocrc = 0
+    # Files whose checksum was taken from another hard link to the same inode
+    linked = 0
+    # Files not stored again because their CrcRecord showed no change
+    unchanged = 0
+    # Updateable files whose checksum was replaced by a scrub after they were modified
+    updated = 0
+    bytes_read = 0
+    read_calls = 0
+    # Seconds spent waiting for file data and hashing it
+    io_wait = 0.0
+    hash_time = 0.0
+
+    @classmethod
+    def reset(cls) -> None:
+        """Reset all counters at the start of a run."""
+        cls.processed = 0
+        cls.failed = 0
+        cls.nocrc = 0
+        cls.linked = 0
+        cls.unchanged = 0
+        cls.updated = 0
+        cls.bytes_read = 0
+        cls.read_calls = 0
+        cls.io_wait = 0.0
+        cls.hash_time = 0.0
+
+    @classmethod
+    def count(cls, name: str, amount: int = 1) -> None:
+        """Increment the counter name (processed, failed, nocrc, linked, unchanged or updated)."""
+        with cls._lock:
+            setattr(cls, name, getattr(cls, name) + amount)
+
+    @classmethod
+    def add_reads(cls, calls: int, nbytes: int) -> None:
+        """Account for read calls and the bytes they returned."""
+        with cls._lock:
+            cls.read_calls += calls
+            cls.bytes_read += nbytes
+
+    @classmethod
+    def add_times(cls, io_wait: float, hash_time: float) -> None:
+        """Account for time spent waiting for I/O and hashing."""
+        with cls._lock:
+            cls.io_wait += io_wait
+            cls.hash_time += hash_time
+
+
+class HardlinkCache:
+    """Checksums of files with several hard links, by inode.
+
+    Lets a run read each inode once, however many links to it it finds.
+    Entries are keyed by (st_dev, st_ino) packed into one integer and hold
+    the checksum and the number of links not seen yet, so an entry is
+    dropped as soon as the last link has been processed. At most
+    max_entries are kept; when full, the least recently used goes.
+    """
+
+    _MASK = (1 << 64) - 1
+
+    def __init__(self, max_entries: int = HARDLINK_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, int] = OrderedDict()
+        # Inodes being hashed for a link, by the thread that claimed them; see claim()
+        self._claimed: dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, st: os.stat_result) -> bool:
+        return (st.st_dev << 64 | st.st_ino) in self._entries
+
+    def get(self, st: os.stat_result) -> int | None:
+        """Return the checksum of the inode of st, counting one more link as seen."""
+        key = st.st_dev << 64 | st.st_ino
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is None:
+                return None
+            remaining = (value >> 64) - 1
+            if remaining > 0:
+                self._entries[key] = remaining << 64 | value & self._MASK
+            return value & self._MASK
+
+    def claim(self, st: os.stat_result) -> bool:
+        """Return True if the inode of st should be hashed for this link.
+
+        False if another link has been hashed or claimed already. A claim
+        lasts until release().
+        """
+        key = st.st_dev << 64 | st.st_ino
+        with self._lock:
+            if key in self._entries or key in self._claimed:
+                return False
+            self._claimed[key] = threading.get_ident()
+            return True
+
+    def release(self, st: os.stat_result) -> None:
+        """Give up the claim on the inode of st."""
+        with self._lock:
+            self._claimed.pop(st.st_dev << 64 | st.st_ino, None)
+            self._released.notify_all()
+
+    def wait(self, st: os.stat_result) -> bool:
+        """Wait until another thread has released its claim on the inode of st.
+
+        Returns False at once if the claim is held by the calling thread,
+        which has to hash the link itself, True otherwise.
+        """
+        key = st.st_dev << 64 | st.st_ino
+        with self._released:
+            if self._claimed.get(key) == threading.get_ident():
+                return False
+            while key in self._claimed:
+                self._released.wait()
+            return True
+
+    def add_link(self, st: os.stat_result, crc: int) -> None:
+        """Account for a link of st whose checksum was obtained elsewhere."""
+        if self.get(st) is None:
+            self.put(st, crc)
+
+    def put(self, st: os.stat_result, crc: int) -> None:
+        """Remember the checksum of the inode of st, whose link has just been processed."""
+        if st.st_nlink < 2:
+            return
+        key = st.st_dev << 64 | st.st_ino
+        with self._lock:
+            self._entries[key] = (st.st_nlink - 1) << 64 | crc
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class Settings:
+    """Global tunables for file processing."""
+    # Files of at least this size are hashed in ranges by a worker pool (0 = never)
+    parallel_threshold = 0
+    parallel_workers = os.cpu_count() or 1
+    parallel_range_size = PARALLEL_RANGE_SIZE
+    # Files up to this size are hashed in batches per directory (0 = never)
+    small_file_size = SMALL_FILE_SIZE
+    read_method = ReadMethod.READINTO
+    buffer_size = MAX_BUF_LEN
+    # Pick the read size per file from its size and st_blksize and ramp it up
+    adaptive_buffer = False
+    # Read the next chunk on a background thread while the current one is hashed
+    prefetch = False
+    io_profile = IoProfile.DEFAULT
+    # Bypass the page cache with O_DIRECT (uses the scrub read loop)
+    direct_io = False
+    walk_order = WalkOrder.NAME
+    # Worker pool processing files in parallel (None = one at a time)
+    pipeline: 'Pipeline | None' = None
+    # Worker processes hashing files for the main process (None = hash in this process)
+    process_pool: 'ProcessPool | None' = None
+    # Skip storing files whose CrcRecord shows no change (--incremental)
+    incremental = False
+    # Checksums of hard-linked files already hashed in this run (None = no reuse)
+    hardlinks: HardlinkCache | None = None
+    # Shared rate limits for bytes read and files hashed (None = unlimited)
+    byte_limiter: TokenBucket | None = None
+    file_limiter: TokenBucket | None = None
 
 
 def error_message(error: ErrorType) -> str:
@@ -49,116 +249,869 @@ def file_exists(filepath: str) -> bool:
     return Path(filepath).exists()
 
 
-def present_crc64(filepath: str) -> AttributeType:
-    """Check if CRC64 attribute is present.
+# errno values meaning an extended attribute is not set or not supported
+_NO_ATTR_ERRNOS = {errno.ENODATA, getattr(errno, 'ENOATTR', errno.ENODATA), errno.ENOTSUP, errno.EOPNOTSUPP}
+
+
+_NO_XATTR_SUPPORT_ERRNOS = {errno.ENOTSUP, errno.EOPNOTSUPP}
+
+
+def _read_xattr(filepath: str | int, name: str, st: os.stat_result | None = None) -> bytes | None:
+    """Read an extended attribute with a single getxattr call.
 
     Args:
-        filepath: Path to the file
+        filepath: Path to the file or open file descriptor
+        name: Attribute name
+        st: Stat result of the file; if the filesystem turns out not to
+            support extended attributes, its device is remembered in Mounts
 
     Returns:
-        XATTR if xattr present, HIDDEN_ATTR if hidden file exists, NO_ATTR otherwise
+        Attribute value, or None if it is not set or not supported
+
+    Raises:
+        OSError: For any other error
     """
     try:
-        attrs = xattr.listxattr(filepath)
-        if ATTRIBUTE_NAME in attrs:
-            return AttributeType.XATTR
-    except (OSError, IOError):
+        return xattr.getxattr(filepath, name)
+    except OSError as e:
+        if e.errno in _NO_XATTR_SUPPORT_ERRNOS and st is not None:
+            Mounts.mark_no_xattrs(st)
+        if e.errno in _NO_ATTR_ERRNOS:
+            return None
+        raise
+
+
+@functools.cache
+def _libc() -> ctypes.CDLL | None:
+    """Return the C library for statfs(2), or None where it is not usable."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        return ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+
+
+# Larger than struct statfs on every Linux ABI; f_type is its first field
+_STATFS_BUF_LEN = 256
+# f_type is a long (__fsword_t), except on s390 and alpha where it is a
+# 32-bit int followed directly by f_bsize
+_STATFS_F_TYPE = ctypes.c_uint if platform.machine().startswith(('s390', 'alpha')) else ctypes.c_long
+
+
+def _statfs_type(target: str | int) -> int | None:
+    """Return the f_type of the filesystem holding target, or None if unknown.
+
+    Args:
+        target: Path or open descriptor
+    """
+    libc = _libc()
+    if libc is None:
+        return None
+    buf = ctypes.create_string_buffer(_STATFS_BUF_LEN)
+    if isinstance(target, int):
+        result = libc.fstatfs(target, buf)
+    else:
+        result = libc.statfs(os.fsencode(target), buf)
+    if result != 0:
+        return None
+    return _STATFS_F_TYPE.from_buffer(buf).value & 0xFFFFFFFF
+
+
+class Mounts:
+    """What each mounted filesystem supports, looked up once per device (st_dev).
+
+    The filesystem type comes from statfs(2). Types in NO_XATTR_FS_TYPES
+    are known not to store user extended attributes; on other filesystems
+    the first xattr call that fails with ENOTSUP marks the device. On a
+    marked device checksums are read from and written to hidden files
+    directly, without an xattr call per file.
+    """
+    _lock = threading.Lock()
+    _fs_types: ClassVar[dict[int, int | None]] = {}
+    _no_xattrs: ClassVar[set[int]] = set()
+
+    @classmethod
+    def reset(cls) -> None:
+        """Forget everything, e.g. at the start of a run."""
+        with cls._lock:
+            cls._fs_types = {}
+            cls._no_xattrs = set()
+
+    @classmethod
+    def fs_type(cls, target: str | int, st: os.stat_result) -> int | None:
+        """Return the filesystem type of the device of st.
+
+        Args:
+            target: Path or open descriptor of a file on the device, used
+                for statfs the first time the device is seen
+            st: Stat result of that file
+        """
+        with cls._lock:
+            if st.st_dev in cls._fs_types:
+                return cls._fs_types[st.st_dev]
+        fs_type = _statfs_type(target)
+        with cls._lock:
+            cls._fs_types[st.st_dev] = fs_type
+            if fs_type in NO_XATTR_FS_TYPES:
+                cls._no_xattrs.add(st.st_dev)
+        return fs_type
+
+    @classmethod
+    def xattrs(cls, target: str | int, st: os.stat_result) -> bool:
+        """Return False if the device of st is known not to support user extended attributes."""
+        cls.fs_type(target, st)
+        return st.st_dev not in cls._no_xattrs
+
+    @classmethod
+    def mark_no_xattrs(cls, st: os.stat_result) -> None:
+        """Remember that the device of st does not support user extended attributes."""
+        with cls._lock:
+            cls._no_xattrs.add(st.st_dev)
+
+
+def xattrs_supported(target: str | int, st: os.stat_result | None = None) -> bool:
+    """Return False if the filesystem of a file is known not to support user extended attributes.
+
+    Args:
+        target: Path or open descriptor of the file
+        st: Stat result of the file if already known
+    """
+    if st is None:
+        try:
+            st = os.fstat(target) if isinstance(target, int) else os.stat(target)
+        except OSError:
+            return True
+    return Mounts.xattrs(target, st)
+
+
+class CrcRecord:
+    """State of a file when its checksum was computed.
+
+    Stored next to the checksum in the CRC_RECORD_NAME xattr, so a later
+    store can tell whether the file may have changed without reading it.
+    The checksum itself stays in ATTRIBUTE_NAME as before, so the record
+    does not matter to tools that do not know it. The record starts with
+    a version byte; later versions only append fields.
+    """
+
+    _FORMAT = struct.Struct('<B7xQqqq')
+
+    def __init__(self, size: int, mtime_ns: int, ctime_ns: int, hashed_ns: int):
+        """Initialize the record.
+
+        Args:
+            size: File size in bytes
+            mtime_ns: Modification time before hashing
+            ctime_ns: Status change time before hashing
+            hashed_ns: Time the checksum was computed
+        """
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.ctime_ns = ctime_ns
+        self.hashed_ns = hashed_ns
+
+    @classmethod
+    def from_stat(cls, st: os.stat_result, hashed_ns: int) -> 'CrcRecord':
+        """Create a record from the stat result taken before hashing."""
+        return cls(st.st_size, st.st_mtime_ns, st.st_ctime_ns, hashed_ns)
+
+    def pack(self) -> bytes:
+        """Return the xattr value."""
+        return self._FORMAT.pack(CRC_RECORD_VERSION, self.size, self.mtime_ns, self.ctime_ns, self.hashed_ns)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> 'CrcRecord | None':
+        """Parse an xattr value; None if it is not a valid record."""
+        if len(data) < cls._FORMAT.size or not data[0]:
+            return None
+        return cls(*cls._FORMAT.unpack_from(data)[1:])
+
+    def matches(self, st: os.stat_result) -> bool:
+        """Return True if st shows no change since the checksum was computed.
+
+        Size and mtime must be the same. ctime must be the same too, or
+        no later than CTIME_TOLERANCE_NS after hashing: writing the
+        checksum and this record updates it.
+        """
+        if st.st_size != self.size or st.st_mtime_ns != self.mtime_ns:
+            return False
+        return st.st_ctime_ns == self.ctime_ns or st.st_ctime_ns <= self.hashed_ns + CTIME_TOLERANCE_NS
+
+
+def get_crc_record(target: str | int) -> CrcRecord | None:
+    """Return the CrcRecord of a file, or None if it has none.
+
+    Args:
+        target: Path or open descriptor of the file
+    """
+    try:
+        data = _read_xattr(target, CRC_RECORD_NAME)
+    except OSError:
+        return None
+    return CrcRecord.unpack(data) if data is not None else None
+
+
+def _remove_crc_record(target: str | int) -> None:
+    """Remove the CrcRecord of a file, if any."""
+    try:
+        xattr.removexattr(target, CRC_RECORD_NAME)
+    except OSError:
         pass
 
-    # Check for hidden CRC file
-    if file_exists(hidden_crc_file(filepath)):
-        return AttributeType.HIDDEN_ATTR
 
-    return AttributeType.NO_ATTR
+class FileMeta:
+    """Checksum related metadata of one file, fetched once.
+
+    Loading costs one getxattr per attribute (and an open of the hidden CRC
+    file only if the xattr is absent) instead of a listxattr before every
+    lookup. process_file loads it once and passes it to the display, store,
+    check and remove paths. On a filesystem without user xattrs (see
+    Mounts) only the hidden CRC file is looked at.
+    """
+
+    def __init__(self, filepath: str, fd: int | None = None, st: os.stat_result | None = None):
+        """Load the stored checksum and checkit options of a file.
+
+        Args:
+            filepath: Path to the file
+            fd: Open descriptor of the file; if given, all xattr calls and
+                hashing go through it instead of resolving the path again
+            st: Stat result of the file if already known, reused for hashing
+        """
+        self.filepath = filepath
+        self.fd = fd
+        self.st = st
+        self.xattrs = xattrs_supported(self.target, st)
+        self.options = get_checkit_options(self.target) if self.xattrs else CheckitOptions.OPT_ERROR
+        self.attr_type, self.crc_status, self.crc = self._load_crc()
+
+    @property
+    def target(self) -> str | int:
+        """The descriptor if the file is open, otherwise its path."""
+        return self.fd if self.fd is not None else self.filepath
+
+    @property
+    def record(self) -> CrcRecord | None:
+        """The CrcRecord of the file, loaded on first use."""
+        if not hasattr(self, '_record'):
+            self._record = get_crc_record(self.target) if self.xattrs else None
+        return self._record
+
+    def modified(self) -> bool:
+        """Return True if the CrcRecord shows a new size or mtime since the checksum was computed.
+
+        False if there is no record to compare with.
+        """
+        if self.attr_type != AttributeType.XATTR or self.st is None or self.record is None:
+            return False
+        return self.st.st_size != self.record.size or self.st.st_mtime_ns != self.record.mtime_ns
+
+    def unchanged(self) -> bool:
+        """Return True if the file has a checksum xattr and its CrcRecord matches the stat result."""
+        if self.attr_type != AttributeType.XATTR or self.crc_status != ErrorType.SUCCESS or self.st is None:
+            return False
+        return self.record is not None and self.record.matches(self.st)
+
+    def _load_crc(self) -> tuple[AttributeType, ErrorType, int | None]:
+        try:
+            data = _read_xattr(self.target, ATTRIBUTE_NAME, self.st) if self.xattrs else None
+        except OSError:
+            # Unreadable attribute; fall back to the hidden file like a missing one
+            data = None
+        if data is not None:
+            try:
+                return AttributeType.XATTR, ErrorType.SUCCESS, struct.unpack('<Q', data)[0]
+            except struct.error:
+                return AttributeType.XATTR, ErrorType.ERROR_CRC_CALC, None
+
+        try:
+            with open(hidden_crc_file(self.filepath), 'rb') as f:
+                data = f.read(8)
+        except FileNotFoundError:
+            return AttributeType.NO_ATTR, ErrorType.ERROR_NO_XATTR, None
+        except OSError:
+            return AttributeType.HIDDEN_ATTR, ErrorType.ERROR_READ_FILE, None
+        try:
+            return AttributeType.HIDDEN_ATTR, ErrorType.SUCCESS, struct.unpack('<Q', data)[0]
+        except struct.error:
+            return AttributeType.HIDDEN_ATTR, ErrorType.ERROR_READ_FILE, None
+
+
+def present_crc64(filepath: str, meta: FileMeta | None = None) -> AttributeType:
+    """Check if CRC64 attribute is present.
 
+    Args:
+        filepath: Path to the file
+        meta: Already loaded metadata of the file
 
-def get_crc(filepath: str) -> Tuple[ErrorType, Optional[int]]:
+    Returns:
+        XATTR if xattr present, HIDDEN_ATTR if hidden file exists, NO_ATTR otherwise
+    """
+    return (meta or FileMeta(filepath)).attr_type
+
+
+def get_crc(filepath: str, meta: FileMeta | None = None) -> tuple[ErrorType, int | None]:
     """Retrieve the stored CRC64 checksum.
 
     Args:
         filepath: Path to the file
+        meta: Already loaded metadata of the file
 
     Returns:
         Tuple of (error_code, crc64_value)
     """
-    attr_format = present_crc64(filepath)
+    meta = meta or FileMeta(filepath)
+    return meta.crc_status, meta.crc
+
+
+def read_sizes(st: os.stat_result) -> tuple[int, int]:
+    """Return the initial and maximum read size for a file.
+
+    With a fixed buffer both are Settings.buffer_size. In adaptive mode the
+    first read is at least one filesystem block (st_blksize) and at least
+    MAX_BUF_LEN, but no larger than the file. Every read that fills the
+    buffer doubles the read size, up to ADAPTIVE_MAX_BUF_LEN.
+
+    Args:
+        st: Stat result of the file
+
+    Returns:
+        Tuple of (initial, maximum) read size in bytes
+    """
+    if not Settings.adaptive_buffer:
+        return Settings.buffer_size, Settings.buffer_size
+
+    block = max(getattr(st, 'st_blksize', 0) or MIN_BUF_LEN, MIN_BUF_LEN)
+    # File size rounded up to whole blocks; one block for empty or special files
+    file_cap = max(-(-st.st_size // block) * block, block)
+    initial = min(max(block, MAX_BUF_LEN), file_cap)
+    maximum = max(min(ADAPTIVE_MAX_BUF_LEN, file_cap), initial)
+    return initial, maximum
+
+
+def throttle_read(nbytes: int, latency: float | None = None) -> None:
+    """Account a read against the byte rate limit, sleeping if it is exceeded.
+
+    Args:
+        nbytes: Number of bytes read
+        latency: Duration of the read in seconds, if known
+    """
+    limiter = Settings.byte_limiter
+    if limiter is not None:
+        limiter.observe(latency)
+        limiter.acquire(nbytes)
+
+
+def range_crc64(fd: int, offset: int, length: int, buffer_size: int = MAX_BUF_LEN) -> int:
+    """Calculate CRC64 checksum of a byte range of an open file.
+
+    Args:
+        fd: File descriptor opened for reading
+        offset: Start of the range
+        length: Length of the range in bytes
+        buffer_size: Read size in bytes
 
-    if attr_format == AttributeType.NO_ATTR:
-        return ErrorType.ERROR_NO_XATTR, None
+    Returns:
+        CRC64 checksum of the range, starting from an initial value of 0
+
+    Raises:
+        OSError: If the range cannot be read completely
+    """
+    crc = 0
+    buf = bytearray(min(buffer_size, length) or 1)
+    view = memoryview(buf)
+    reads = 0
+    io_wait = hash_time = 0.0
+    start, total = offset, length
+    while length > 0:
+        read_start = time.perf_counter()
+        count = os.preadv(fd, [view[:min(length, buffer_size)]], offset)
+        read_done = time.perf_counter()
+        io_wait += read_done - read_start
+        if not count:
+            raise OSError(f"Unexpected end of file at offset {offset}")
+        throttle_read(count, read_done - read_start)
+        read_done = time.perf_counter()
+        reads += 1
+        crc = crc64(crc, view[:count])
+        hash_time += time.perf_counter() - read_done
+        offset += count
+        length -= count
+    if Settings.io_profile == IoProfile.SCRUB:
+        drop_cache(fd, start, total)
+    Stats.add_reads(reads, total)
+    Stats.add_times(io_wait, hash_time)
+    return crc
+
+
+def parallel_file_crc64(fd: int, st: os.stat_result) -> int:
+    """Calculate CRC64 checksum of a file by hashing ranges in parallel.
+
+    The file is split into ranges of Settings.parallel_range_size bytes,
+    which are read with os.preadv and hashed by a pool of worker threads.
+    The range checksums are combined in file order.
+
+    Args:
+        fd: File descriptor opened for reading
+        st: Stat result of the file; st_size bytes are hashed
 
-    if attr_format == AttributeType.XATTR:
+    Returns:
+        CRC64 checksum of the first st_size bytes of the file
+    """
+    size = st.st_size
+    range_size = Settings.parallel_range_size
+    buffer_size = read_sizes(st)[1]
+    ranges = [(offset, min(range_size, size - offset)) for offset in range(0, size, range_size)]
+
+    crc = 0
+    with ThreadPoolExecutor(max_workers=Settings.parallel_workers) as pool:
+        results = pool.map(lambda r: range_crc64(fd, r[0], r[1], buffer_size), ranges)
+        for (_, length), range_crc in zip(ranges, results):
+            crc = crc64_combine(crc, range_crc, length)
+    return crc
+
+
+def read_crc64(f, st: os.stat_result) -> int:
+    """Hash an open file with read(), allocating a new buffer per chunk."""
+    chunk, maximum = read_sizes(st)
+    crc = 0
+    reads = 0
+    total = 0
+    io_wait = hash_time = 0.0
+    while True:
+        start = time.perf_counter()
+        data = f.read(chunk)
+        read_done = time.perf_counter()
+        io_wait += read_done - start
+        if not data:
+            break
+        throttle_read(len(data), read_done - start)
+        read_done = time.perf_counter()
+        reads += 1
+        total += len(data)
+        crc = crc64(crc, data)
+        hash_time += time.perf_counter() - read_done
+        if len(data) == chunk:
+            chunk = min(chunk * 2, maximum)
+    Stats.add_reads(reads, total)
+    Stats.add_times(io_wait, hash_time)
+    return crc
+
+
+def readinto_crc64(f, st: os.stat_result) -> int:
+    """Hash an open file with readinto() into one reused buffer."""
+    chunk, maximum = read_sizes(st)
+    crc = 0
+    reads = 0
+    total = 0
+    io_wait = hash_time = 0.0
+    buf = bytearray(maximum)
+    view = memoryview(buf)
+    while True:
+        start = time.perf_counter()
+        length = f.readinto(view[:chunk])
+        read_done = time.perf_counter()
+        io_wait += read_done - start
+        if not length:
+            break
+        throttle_read(length, read_done - start)
+        read_done = time.perf_counter()
+        reads += 1
+        total += length
+        crc = crc64(crc, view[:length])
+        hash_time += time.perf_counter() - read_done
+        if length == chunk:
+            chunk = min(chunk * 2, maximum)
+    Stats.add_reads(reads, total)
+    Stats.add_times(io_wait, hash_time)
+    return crc
+
+
+def prefetch_crc64(f, st: os.stat_result) -> int:
+    """Hash an open file while a background thread reads ahead.
+
+    Two buffers alternate between a reader thread, which fills one with
+    readinto(), and the calling thread, which hashes the other. Both the
+    read and the extension backends release the GIL, so the disk and the
+    CPU stay busy at the same time. Stats.io_wait only counts the time the
+    hashing thread had to wait for data.
+    """
+    chunk, maximum = read_sizes(st)
+    free: queue.Queue = queue.Queue()
+    filled: queue.Queue = queue.Queue()
+    for _ in range(2):
+        free.put(bytearray(maximum))
+
+    def reader() -> None:
+        size = chunk
         try:
-            data = xattr.getxattr(filepath, ATTRIBUTE_NAME)
-            crc_value = struct.unpack('<Q', data)[0]
-            return ErrorType.SUCCESS, crc_value
-        except (OSError, IOError, struct.error):
-            return ErrorType.ERROR_CRC_CALC, None
+            while (buf := free.get()) is not None:
+                start = time.perf_counter()
+                length = f.readinto(memoryview(buf)[:size])
+                throttle_read(length, time.perf_counter() - start)
+                filled.put((buf, length, None))
+                if not length:
+                    return
+                if length == size:
+                    size = min(size * 2, maximum)
+        except (OSError, ValueError) as e:  # re-raised in the hashing thread
+            filled.put((None, 0, e))
+
+    thread = threading.Thread(target=reader, name="pycheckit-prefetch", daemon=True)
+    thread.start()
+    crc = 0
+    reads = 0
+    total = 0
+    io_wait = hash_time = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            buf, length, error = filled.get()
+            ready = time.perf_counter()
+            io_wait += ready - start
+            if error is not None:
+                raise error
+            if not length:
+                break
+            reads += 1
+            total += length
+            crc = crc64(crc, memoryview(buf)[:length])
+            hash_time += time.perf_counter() - ready
+            free.put(buf)
+    finally:
+        # Stop the reader if hashing ended early
+        free.put(None)
+        thread.join()
+    Stats.add_reads(reads, total)
+    Stats.add_times(io_wait, hash_time)
+    return crc
+
+
+def fadvise(fd: int, offset: int, length: int, advice_name: str) -> None:
+    """Give the kernel an access pattern hint, where supported.
+
+    Args:
+        fd: File descriptor
+        offset: Start of the range
+        length: Length of the range (0 = up to the end of the file)
+        advice_name: Name of the os.POSIX_FADV_* constant
+    """
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        # Only a hint; e.g. pipes reject it with ESPIPE
+        pass
+
+
+def drop_cache(fd: int, offset: int, length: int) -> None:
+    """Drop a range of a file that has been hashed from the page cache."""
+    fadvise(fd, offset, length, 'POSIX_FADV_DONTNEED')
+
+
+# FIEMAP ioctl (linux/fiemap.h): struct fiemap header and struct fiemap_extent
+FS_IOC_FIEMAP = 0xC020660B
+_FIEMAP_HEADER = struct.Struct('=QQIIII')
+_FIEMAP_EXTENT = struct.Struct('=QQQ16xI12x')
+_FIEMAP_MAX_OFFSET = 0xFFFFFFFFFFFFFFFF
+# Extent flags: location not known yet (delayed allocation), or not a plain block range
+_FIEMAP_EXTENT_UNKNOWN = 0x2
+_FIEMAP_EXTENT_NOT_ALIGNED = 0x100
+
+
+def file_extents(fd: int, max_extents: int = 1) -> list[tuple[int, int, int]] | None:
+    """Return the first extents of a file as mapped on disk, using FIEMAP.
+
+    Args:
+        fd: Descriptor of a regular file
+        max_extents: Maximum number of extents to return
+
+    Returns:
+        List of (logical offset, physical offset, length) in bytes; empty
+        for files without allocated blocks. Extents whose location is not
+        known yet are left out. None if the filesystem does not support
+        FIEMAP.
+    """
+    buf = bytearray(_FIEMAP_HEADER.size + max_extents * _FIEMAP_EXTENT.size)
+    _FIEMAP_HEADER.pack_into(buf, 0, 0, _FIEMAP_MAX_OFFSET, 0, 0, max_extents, 0)
+    try:
+        fcntl.ioctl(fd, FS_IOC_FIEMAP, buf, True)
+    except OSError:
+        return None
+    mapped = _FIEMAP_HEADER.unpack_from(buf)[3]
+    extents = []
+    for index in range(mapped):
+        logical, physical, length, flags = _FIEMAP_EXTENT.unpack_from(
+            buf, _FIEMAP_HEADER.size + index * _FIEMAP_EXTENT.size)
+        if not flags & (_FIEMAP_EXTENT_UNKNOWN | _FIEMAP_EXTENT_NOT_ALIGNED):
+            extents.append((logical, physical, length))
+    return extents
+
+
+def open_fd(filepath: str, dir_fd: int | None = None) -> int:
+    """Open a file for reading and return its descriptor.
+
+    The descriptor serves for fstat, the xattr calls and hashing, so the
+    path is resolved only once. With the scrub I/O profile the file is
+    opened with O_NOATIME, so that reading it does not cause an atime
+    update. The kernel only permits this for the owner of the file (or with
+    CAP_FOWNER); otherwise the file is opened normally. With
+    Settings.direct_io, O_DIRECT is added if the filesystem supports it.
 
-    if attr_format == AttributeType.HIDDEN_ATTR:
+    Args:
+        filepath: Path to the file, relative to dir_fd if given
+        dir_fd: Descriptor of the directory filepath is relative to
+
+    Returns:
+        File descriptor
+    """
+    flags = os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0)
+    if Settings.direct_io:
+        flags |= getattr(os, 'O_DIRECT', 0)
+    if Settings.io_profile == IoProfile.SCRUB:
+        flags |= getattr(os, 'O_NOATIME', 0)
+
+    while True:
         try:
-            with open(hidden_crc_file(filepath), 'rb') as f:
-                data = f.read(8)
-                crc_value = struct.unpack('<Q', data)[0]
-                return ErrorType.SUCCESS, crc_value
-        except (OSError, IOError, struct.error):
-            return ErrorType.ERROR_READ_FILE, None
+            return os.open(filepath, flags, dir_fd=dir_fd)
+        except OSError as e:
+            if e.errno == errno.EPERM and flags & getattr(os, 'O_NOATIME', 0):
+                flags &= ~os.O_NOATIME
+            elif e.errno == errno.EINVAL and flags & getattr(os, 'O_DIRECT', 0):
+                # Filesystem without O_DIRECT support, e.g. tmpfs
+                flags &= ~os.O_DIRECT
+            else:
+                raise
+
+
+def open_dir_fd(dirpath: str, dir_fd: int | None = None) -> int:
+    """Open a directory for dir_fd-relative lookups of its entries.
+
+    Args:
+        dirpath: Path to the directory; only its last component is used
+            if dir_fd is given
+        dir_fd: Descriptor of the parent directory
+
+    Returns:
+        Directory file descriptor
+    """
+    if dir_fd is not None:
+        dirpath = os.path.basename(os.path.normpath(dirpath))
+    return os.open(dirpath, os.O_RDONLY | os.O_DIRECTORY | getattr(os, 'O_CLOEXEC', 0), dir_fd=dir_fd)
+
 
-    return ErrorType.ERROR_CRC_CALC, None
+def open_for_hashing(filepath: str):
+    """Open a file for reading its data, see open_fd().
 
+    Args:
+        filepath: Path to the file
 
-def file_crc64(filepath: str) -> Tuple[ErrorType, Optional[int]]:
+    Returns:
+        Unbuffered binary file object
+    """
+    return os.fdopen(open_fd(filepath), 'rb', buffering=0)
+
+
+def scrub_crc64(f, st: os.stat_result) -> int:
+    """Hash an open file without leaving its data in the page cache.
+
+    The kernel is told the file is read sequentially, and every
+    DROP_BEHIND_LEN bytes that have been hashed are dropped from the page
+    cache again. If the file was opened with O_DIRECT, the reads go into a
+    page-aligned buffer with sizes rounded up to whole MIN_BUF_LEN blocks.
+    """
+    fd = f.fileno()
+    chunk, maximum = read_sizes(st)
+    o_direct = getattr(os, 'O_DIRECT', 0)
+    direct = bool(o_direct and fcntl.fcntl(fd, fcntl.F_GETFL) & o_direct)
+    buf: mmap.mmap | bytearray
+    if direct:
+        chunk = -(-chunk // MIN_BUF_LEN) * MIN_BUF_LEN
+        maximum = -(-maximum // MIN_BUF_LEN) * MIN_BUF_LEN
+        # Anonymous mappings are page aligned, as O_DIRECT requires
+        buf = mmap.mmap(-1, maximum)
+    else:
+        buf = bytearray(maximum)
+    view = memoryview(buf)
+
+    fadvise(fd, 0, 0, 'POSIX_FADV_SEQUENTIAL')
+    crc = 0
+    reads = 0
+    offset = 0
+    dropped = 0
+    io_wait = hash_time = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            length = f.readinto(view[:chunk])
+            read_done = time.perf_counter()
+            io_wait += read_done - start
+            if not length:
+                break
+            throttle_read(length, read_done - start)
+            read_done = time.perf_counter()
+            reads += 1
+            offset += length
+            crc = crc64(crc, view[:length])
+            hash_time += time.perf_counter() - read_done
+            if offset - dropped >= DROP_BEHIND_LEN:
+                drop_cache(fd, dropped, offset - dropped)
+                dropped = offset
+            if length == chunk:
+                chunk = min(chunk * 2, maximum)
+        drop_cache(fd, dropped, 0)
+    finally:
+        view.release()
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+    Stats.add_reads(reads, offset)
+    Stats.add_times(io_wait, hash_time)
+    return crc
+
+
+def mmap_crc64(f) -> int:
+    """Hash an open regular file by mapping it into memory.
+
+    The mapping is hashed in windows of Settings.buffer_size bytes, each
+    accounted against the byte rate limit before it is touched. Its size
+    is taken with fstat right before mapping; if the file is truncated
+    while it is hashed, touching the lost pages raises SIGBUS.
+    """
+    size = os.fstat(f.fileno()).st_size
+    if not size:
+        return 0
+    crc = 0
+    hash_time = 0.0
+    window = Settings.buffer_size
+    with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapping, memoryview(mapping) as view:
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapping.madvise(mmap.MADV_SEQUENTIAL)
+        for offset in range(0, size, window):
+            length = min(window, size - offset)
+            throttle_read(length)
+            start = time.perf_counter()
+            crc = crc64(crc, view[offset:offset + length])
+            # Page faults are part of hashing here; there is no separate read
+            hash_time += time.perf_counter() - start
+    Stats.add_times(0.0, hash_time)
+    Stats.add_reads(0, size)
+    return crc
+
+
+def file_crc64(filepath: str, fd: int | None = None,
+               st: os.stat_result | None = None) -> tuple[ErrorType, int | None]:
     """Calculate CRC64 checksum for a file.
 
+    Files of at least Settings.parallel_threshold bytes are hashed in
+    parallel ranges, all others sequentially with Settings.read_method,
+    reading ahead on a second thread if Settings.prefetch is set. The scrub
+    I/O profile and direct I/O use scrub_crc64 instead, which keeps the
+    file out of the page cache. A file with several hard links is only
+    read once per run if Settings.hardlinks is set; later links get the
+    remembered checksum, and a link met while another thread is reading
+    the inode waits for its result.
+
     Args:
         filepath: Path to the file
+        fd: Descriptor of the file, opened with open_fd(); it is hashed from
+            the start and left open
+        st: Stat result of the file if already known (e.g. from os.scandir);
+            used to find other hard links of the file. The size hashed is
+            always taken from the open file, as the file may have changed
+            since st was taken.
 
     Returns:
         Tuple of (error_code, crc64_value)
     """
+    links = Settings.hardlinks
+    if links is None or st is None or st.st_nlink < 2:
+        return _read_file_crc64(filepath, fd)
+    while True:
+        crc = links.get(st)
+        if crc is not None:
+            Stats.count('linked')
+            return ErrorType.SUCCESS, crc
+        claimed = links.claim(st)
+        if claimed or not links.wait(st):
+            break
     try:
-        crc = 0
-        with open(filepath, 'rb') as f:
-            while True:
-                data = f.read(MAX_BUF_LEN)
-                if not data:
-                    break
-                crc = crc64(crc, data)
-        return ErrorType.SUCCESS, crc
+        status, crc = _read_file_crc64(filepath, fd)
+        if status == ErrorType.SUCCESS:
+            links.put(st, crc)
+    finally:
+        if claimed:
+            links.release(st)
+    return status, crc
+
+
+def _read_file_crc64(filepath: str, fd: int | None) -> tuple[ErrorType, int | None]:
+    """Read a file and calculate its CRC64 checksum, see file_crc64()."""
+    if Settings.file_limiter is not None:
+        Settings.file_limiter.acquire(1)
+    try:
+        if fd is not None:
+            os.lseek(fd, 0, os.SEEK_SET)
+        with (open(fd, 'rb', buffering=0, closefd=False) if fd is not None
+              else open_for_hashing(filepath)) as f:
+            st = os.fstat(f.fileno())
+            size = st.st_size
+            if (Settings.parallel_threshold and size >= Settings.parallel_threshold
+                    and Settings.parallel_workers > 1 and not Settings.direct_io):
+                return ErrorType.SUCCESS, parallel_file_crc64(f.fileno(), st)
+
+            if Settings.io_profile == IoProfile.SCRUB or Settings.direct_io:
+                return ErrorType.SUCCESS, scrub_crc64(f, st)
+
+            if Settings.read_method == ReadMethod.MMAP and stat.S_ISREG(st.st_mode):
+                return ErrorType.SUCCESS, mmap_crc64(f)
+            if Settings.prefetch:
+                return ErrorType.SUCCESS, prefetch_crc64(f, st)
+            if Settings.read_method == ReadMethod.READ:
+                return ErrorType.SUCCESS, read_crc64(f, st)
+            return ErrorType.SUCCESS, readinto_crc64(f, st)
     except (OSError, IOError):
         return ErrorType.ERROR_CRC_CALC, None
 
 
-def get_fs_type(filepath: str) -> Optional[int]:
+def get_fs_type(filepath: str | int, st: os.stat_result | None = None) -> int | None:
     """Get filesystem type for a file.
 
+    The type is looked up with statfs(2) once per device and cached in
+    Mounts.
+
     Args:
-        filepath: Path to the file
+        filepath: Path to the file or open file descriptor
+        st: Stat result of the file if already known
 
     Returns:
-        Filesystem type constant or None
+        Filesystem type constant (f_type) or None
     """
-    try:
-        stat_result = os.statvfs(filepath)
-        # Python's statvfs doesn't provide f_type, so we'll just return None
-        # and assume extended attributes are supported
-        return None
-    except (OSError, IOError):
-        return None
+    if st is None:
+        try:
+            st = os.fstat(filepath) if isinstance(filepath, int) else os.stat(filepath)
+        except OSError:
+            return None
+    return Mounts.fs_type(filepath, st)
 
 
-def put_crc(filepath: str, flags) -> ErrorType:
+def put_crc(filepath: str, flags, crc: int | None = None, meta: FileMeta | None = None) -> ErrorType:
     """Calculate and store CRC64 checksum.
 
     Args:
         filepath: Path to the file
         flags: Command line flags
+        crc: Checksum of the file if it is already known
+        meta: Already loaded metadata of the file
 
     Returns:
         Error code
     """
 
     # Get old CRC if exists
-    old_status, old_crc = get_crc(filepath)
+    old_status, old_crc = get_crc(filepath, meta)
 
     # If there's an error other than NO_XATTR, return it
     if old_status != ErrorType.SUCCESS and old_status != ErrorType.ERROR_NO_XATTR:
@@ -168,57 +1121,117 @@ def put_crc(filepath: str, flags) -> ErrorType:
     if old_status == ErrorType.SUCCESS and not (flags & Flags.OVERWRITE):
         return ErrorType.ERROR_NO_OVERWRITE
 
+    # The record describes the file as it was before hashing
+    target = meta.target if meta else filepath
+    try:
+        st = meta.st if meta and meta.st else os.stat(target)
+    except OSError:
+        st = None
+
+    # Decided once per mount, before reading the file: without xattr
+    # support the checksum can only go to a hidden file
+    use_xattr = xattrs_supported(target, st)
+    if not use_xattr and not flags & Flags.EXPORT:
+        return ErrorType.ERROR_NO_XATTR_SUPPORT
+
     # Calculate new checksum
-    status, new_crc = file_crc64(filepath)
-    if status != ErrorType.SUCCESS:
-        return status
+    if crc is not None:
+        new_crc = crc
+    else:
+        status, new_crc = file_crc64(filepath, meta.fd, meta.st) if meta else file_crc64(filepath)
+        if status != ErrorType.SUCCESS:
+            return status
+    hashed_ns = time.time_ns()
 
     # Notify if checksum changed
     if old_status == ErrorType.SUCCESS and old_crc != new_crc:
         print(f"File {filepath} has been changed since checksum last computed!")
 
-    # Try to store in extended attribute
-    fs_type = get_fs_type(filepath)
+    crc_bytes = struct.pack('<Q', new_crc)
+    if use_xattr:
+        try:
+            if flags & Flags.OVERWRITE:
+                xattr.setxattr(target, ATTRIBUTE_NAME, crc_bytes)
+            else:
+                xattr.setxattr(target, ATTRIBUTE_NAME, crc_bytes, xattr.XATTR_CREATE)
+        except OSError as e:
+            unsupported = e.errno in _NO_XATTR_SUPPORT_ERRNOS
+            if unsupported and st is not None:
+                Mounts.mark_no_xattrs(st)
+            # Fall back to hidden file only if option -e is set; abort the
+            # run only if the filesystem cannot store xattrs at all
+            if not flags & Flags.EXPORT:
+                return ErrorType.ERROR_NO_XATTR_SUPPORT if unsupported else ErrorType.ERROR_SET_CRC
+            use_xattr = False
+
+    if not use_xattr:
+        try:
+            with open(hidden_crc_file(filepath), 'wb') as f:
+                f.write(crc_bytes)
+            return ErrorType.SUCCESS
+        except OSError:
+            return ErrorType.ERROR_SET_CRC
+
+    _write_crc_record(target, st, hashed_ns)
+    return ErrorType.SUCCESS
+
+
+def refresh_crc(meta: FileMeta, crc: int) -> ErrorType:
+    """Replace the checksum xattr of a file that has been modified.
+
+    The new value replaces the old one in a single setxattr call, so the
+    file is never without a checksum. The CrcRecord is updated from
+    meta.st, the stat result taken before hashing.
 
+    Args:
+        meta: Loaded metadata of the file; its checksum must be an xattr
+        crc: New checksum
+
+    Returns:
+        Error code
+    """
+    hashed_ns = time.time_ns()
     try:
-        crc_bytes = struct.pack('<Q', new_crc)
-        if flags & Flags.OVERWRITE:
-            xattr.setxattr(filepath, ATTRIBUTE_NAME, crc_bytes)
-        else:
-            xattr.setxattr(filepath, ATTRIBUTE_NAME, crc_bytes, xattr.XATTR_CREATE)
-        return ErrorType.SUCCESS
-    except (OSError, IOError):
-        # If extended attributes are not supported, return appropriate error
-        # instead of automatically falling back to hidden files
-        # Fall back to hidden file only if option -e is set
-        if flags & Flags.EXPORT:
-            try:
-                with open(hidden_crc_file(filepath), 'wb') as f:
-                    f.write(struct.pack('<Q', new_crc))
-                return ErrorType.SUCCESS
-            except (OSError, IOError):
-                return ErrorType.ERROR_SET_CRC
-        else:
-            return ErrorType.ERROR_NO_XATTR_SUPPORT
+        xattr.setxattr(meta.target, ATTRIBUTE_NAME, struct.pack('<Q', crc), xattr.XATTR_REPLACE)
+    except OSError:
+        return ErrorType.ERROR_SET_CRC
+    _write_crc_record(meta.target, meta.st, hashed_ns)
+    meta.crc = crc
+    return ErrorType.SUCCESS
+
 
+def _write_crc_record(target: str | int, st: os.stat_result | None, hashed_ns: int) -> None:
+    """Store the CrcRecord of a checksum that has just been written.
 
+    Best effort: without a record the next incremental store reads the
+    file again.
+    """
+    if st is None:
+        return
+    try:
+        xattr.setxattr(target, CRC_RECORD_NAME, CrcRecord.from_stat(st, hashed_ns).pack())
+    except OSError:
+        pass
 
-def remove_crc(filepath: str) -> ErrorType:
+
+def remove_crc(filepath: str, meta: FileMeta | None = None) -> ErrorType:
     """Remove stored CRC64 checksum.
 
     Args:
         filepath: Path to the file
+        meta: Already loaded metadata of the file
 
     Returns:
         Error code
     """
-    attr_type = present_crc64(filepath)
+    attr_type = present_crc64(filepath, meta)
 
     if attr_type == AttributeType.XATTR:
         try:
-            xattr.removexattr(filepath, ATTRIBUTE_NAME)
+            xattr.removexattr(meta.target if meta else filepath, ATTRIBUTE_NAME)
         except (OSError, IOError):
             return ErrorType.ERROR_REMOVE_XATTR
+        _remove_crc_record(meta.target if meta else filepath)
 
     if attr_type == AttributeType.HIDDEN_ATTR:
         try:
@@ -229,47 +1242,51 @@ def remove_crc(filepath: str) -> ErrorType:
     return ErrorType.SUCCESS
 
 
-def export_crc(filepath: str, flags) -> ErrorType:
+def export_crc(filepath: str, flags, meta: FileMeta | None = None) -> ErrorType:
     """Export CRC from extended attribute to hidden file.
 
     Args:
         filepath: Path to the file
         flags: Command line flags
+        meta: Already loaded metadata of the file
 
     Returns:
         Error code
     """
-    if present_crc64(filepath) != AttributeType.XATTR:
+    meta = meta or FileMeta(filepath)
+    if meta.attr_type != AttributeType.XATTR:
         return ErrorType.ERROR_NO_XATTR
 
     hidden_file = hidden_crc_file(filepath)
     if file_exists(hidden_file) and not (flags & Flags.OVERWRITE):
         return ErrorType.ERROR_NO_OVERWRITE
 
-    status, crc_value = get_crc(filepath)
+    status, crc_value = meta.crc_status, meta.crc
     if status != ErrorType.SUCCESS:
         return ErrorType.ERROR_READ_FILE
 
     try:
         with open(hidden_file, 'wb') as f:
             f.write(struct.pack('<Q', crc_value))
-        xattr.removexattr(filepath, ATTRIBUTE_NAME)
+        xattr.removexattr(meta.target, ATTRIBUTE_NAME)
+        _remove_crc_record(meta.target)
         return ErrorType.SUCCESS
     except (OSError, IOError):
         return ErrorType.ERROR_WRITE_FILE
 
 
-def import_crc(filepath: str, flags) -> ErrorType:
+def import_crc(filepath: str, flags, meta: FileMeta | None = None) -> ErrorType:
     """Import CRC from hidden file to extended attribute.
 
     Args:
         filepath: Path to the file
         flags: Command line flags
+        meta: Already loaded metadata of the file
 
     Returns:
         Error code
     """
-    if present_crc64(filepath) != AttributeType.HIDDEN_ATTR:
+    if present_crc64(filepath, meta) != AttributeType.HIDDEN_ATTR:
         return ErrorType.ERROR_NO_OVERWRITE
 
     hidden_file = hidden_crc_file(filepath)
@@ -279,11 +1296,12 @@ def import_crc(filepath: str, flags) -> ErrorType:
             data = f.read(8)
             crc_value = struct.unpack('<Q', data)[0]
 
+        target = meta.target if meta else filepath
         crc_bytes = struct.pack('<Q', crc_value)
         if flags & Flags.OVERWRITE:
-            xattr.setxattr(filepath, ATTRIBUTE_NAME, crc_bytes)
+            xattr.setxattr(target, ATTRIBUTE_NAME, crc_bytes)
         else:
-            xattr.setxattr(filepath, ATTRIBUTE_NAME, crc_bytes, xattr.XATTR_CREATE)
+            xattr.setxattr(target, ATTRIBUTE_NAME, crc_bytes, xattr.XATTR_CREATE)
 
         os.unlink(hidden_file)
         return ErrorType.SUCCESS
@@ -291,19 +1309,18 @@ def import_crc(filepath: str, flags) -> ErrorType:
         return ErrorType.ERROR_SET_CRC
 
 
-def get_checkit_options(filepath: str) -> CheckitOptions:
+def get_checkit_options(filepath: str | int) -> CheckitOptions:
     """Get checkit options for a file.
 
     Args:
-        filepath: Path to the file
+        filepath: Path to the file or open file descriptor
 
     Returns:
         Checkit options
     """
     try:
-        attrs = xattr.listxattr(filepath)
-        if CHECKIT_OPTIONS_NAME in attrs:
-            data = xattr.getxattr(filepath, CHECKIT_OPTIONS_NAME)
+        data = _read_xattr(filepath, CHECKIT_OPTIONS_NAME)
+        if data is not None:
             return CheckitOptions(ord(data))
     except (OSError, IOError):
         pass
@@ -311,11 +1328,11 @@ def get_checkit_options(filepath: str) -> CheckitOptions:
     return CheckitOptions.OPT_ERROR
 
 
-def set_checkit_options(filepath: str, options: CheckitOptions) -> ErrorType:
+def set_checkit_options(filepath: str | int, options: CheckitOptions) -> ErrorType:
     """Set checkit options for a file.
 
     Args:
-        filepath: Path to the file
+        filepath: Path to the file or open file descriptor
         options: Options to set
 
     Returns:
@@ -328,20 +1345,24 @@ def set_checkit_options(filepath: str, options: CheckitOptions) -> ErrorType:
         return ErrorType.ERROR_SET_CRC
 
 
-def remove_checkit_options(filepath: str) -> ErrorType:
+def remove_checkit_options(filepath: str, meta: FileMeta | None = None) -> ErrorType:
     """Remove checkit options from a file.
 
     Args:
         filepath: Path to the file
+        meta: Already loaded metadata of the file; nothing is removed if
+            it has no options
 
     Returns:
         Error code
     """
+    if meta is not None and meta.options == CheckitOptions.OPT_ERROR:
+        return ErrorType.SUCCESS
     try:
-        attrs = xattr.listxattr(filepath)
-        if CHECKIT_OPTIONS_NAME in attrs:
-            xattr.removexattr(filepath, CHECKIT_OPTIONS_NAME)
+        xattr.removexattr(meta.target if meta else filepath, CHECKIT_OPTIONS_NAME)
         return ErrorType.SUCCESS
-    except (OSError, IOError):
+    except OSError as e:
+        if e.errno in _NO_ATTR_ERRNOS:
+            return ErrorType.SUCCESS
         return ErrorType.ERROR_REMOVE_XATTR
 
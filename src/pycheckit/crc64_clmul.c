@@ -0,0 +1,207 @@
+/*
+ * Carry-less multiplication folding for CRC-64-Jones.
+ *
+ * The data is split into eight 128-bit lanes which are folded forward by
+ * 1024 bits per iteration, then the lanes are folded into one remainder.
+ * Folding a 128-bit value A = A_hi * x^64 + A_lo over a distance of d bits
+ * multiplies A_hi by x^(d+63) mod P and A_lo by x^(d-1) mod P. The -1
+ * accounts for the one-bit offset of a carry-less product of two
+ * bit-reflected operands.
+ *
+ * The folding constants are derived from the polynomial when the module is
+ * initialised instead of being hard-coded.
+ */
+
+#include "crc64_clmul.h"
+
+#include <string.h>
+
+/* Bit-reflected CRC-64-Jones polynomial (0xad93d23594c935a9). */
+#define CRC64_POLY_REFLECTED 0x95ac9329ac4bc9b5ULL
+
+#if (defined(__GNUC__) || defined(__clang__)) && defined(__x86_64__)
+#define CRC64_CLMUL_X86 1
+#include <immintrin.h>
+#elif (defined(__GNUC__) || defined(__clang__)) && defined(__aarch64__) \
+    && defined(__ORDER_LITTLE_ENDIAN__) \
+    && __BYTE_ORDER__ == __ORDER_LITTLE_ENDIAN__
+#define CRC64_CLMUL_ARM 1
+#include <arm_neon.h>
+#if defined(__linux__)
+#include <sys/auxv.h>
+#include <asm/hwcap.h>
+#endif
+#endif
+
+/* Folding constants for a distance of 1024 bits (8 lanes) and 128 bits. */
+static uint64_t k1024_lo, k1024_hi, k128_lo, k128_hi;
+
+/* Return x^n mod P in bit-reflected form. */
+static uint64_t xpow_mod(unsigned n)
+{
+    uint64_t r = 1ULL << 63;
+
+    while (n--)
+        r = (r >> 1) ^ ((r & 1) ? CRC64_POLY_REFLECTED : 0);
+    return r;
+}
+
+static void init_constants(void)
+{
+    k1024_lo = xpow_mod(1024 + 63);
+    k1024_hi = xpow_mod(1024 - 1);
+    k128_lo = xpow_mod(128 + 63);
+    k128_hi = xpow_mod(128 - 1);
+}
+
+#if defined(CRC64_CLMUL_X86)
+
+#define CLMUL_TARGET __attribute__((target("pclmul,sse2")))
+
+typedef __m128i v128;
+
+static inline CLMUL_TARGET v128 load128(const unsigned char *p)
+{
+    return _mm_loadu_si128((const __m128i *)p);
+}
+
+static inline CLMUL_TARGET v128 xor128(v128 a, v128 b)
+{
+    return _mm_xor_si128(a, b);
+}
+
+static inline CLMUL_TARGET v128 fold128(v128 x, v128 k)
+{
+    return _mm_xor_si128(_mm_clmulepi64_si128(x, k, 0x00),
+                         _mm_clmulepi64_si128(x, k, 0x11));
+}
+
+static inline CLMUL_TARGET v128 make_constant(uint64_t lo, uint64_t hi)
+{
+    return _mm_set_epi64x((long long)hi, (long long)lo);
+}
+
+static inline CLMUL_TARGET void store128(unsigned char *out, v128 x)
+{
+    _mm_storeu_si128((__m128i *)out, x);
+}
+
+int crc64_clmul_init(void)
+{
+    init_constants();
+    __builtin_cpu_init();
+    return __builtin_cpu_supports("pclmul") && __builtin_cpu_supports("sse2");
+}
+
+#elif defined(CRC64_CLMUL_ARM)
+
+#if defined(__clang__)
+#define CLMUL_TARGET __attribute__((target("aes")))
+#else
+#define CLMUL_TARGET __attribute__((target("+crypto")))
+#endif
+
+typedef uint64x2_t v128;
+
+static inline CLMUL_TARGET v128 load128(const unsigned char *p)
+{
+    return vreinterpretq_u64_u8(vld1q_u8(p));
+}
+
+static inline CLMUL_TARGET v128 xor128(v128 a, v128 b)
+{
+    return veorq_u64(a, b);
+}
+
+static inline CLMUL_TARGET v128 fold128(v128 x, v128 k)
+{
+    poly128_t lo = vmull_p64((poly64_t)vgetq_lane_u64(x, 0),
+                             (poly64_t)vgetq_lane_u64(k, 0));
+    poly128_t hi = vmull_p64((poly64_t)vgetq_lane_u64(x, 1),
+                             (poly64_t)vgetq_lane_u64(k, 1));
+    return veorq_u64(vreinterpretq_u64_p128(lo), vreinterpretq_u64_p128(hi));
+}
+
+static inline CLMUL_TARGET v128 make_constant(uint64_t lo, uint64_t hi)
+{
+    return vcombine_u64(vcreate_u64(lo), vcreate_u64(hi));
+}
+
+static inline CLMUL_TARGET void store128(unsigned char *out, v128 x)
+{
+    vst1q_u8(out, vreinterpretq_u8_u64(x));
+}
+
+int crc64_clmul_init(void)
+{
+    init_constants();
+#if defined(__APPLE__)
+    return 1;
+#elif defined(__linux__) && defined(HWCAP_PMULL)
+    return (getauxval(AT_HWCAP) & HWCAP_PMULL) != 0;
+#else
+    return 0;
+#endif
+}
+
+#endif
+
+#if defined(CRC64_CLMUL_X86) || defined(CRC64_CLMUL_ARM)
+
+CLMUL_TARGET
+size_t crc64_clmul_fold(uint64_t crc, const unsigned char *p, size_t len,
+                        unsigned char out[16])
+{
+    const unsigned char *start = p;
+    v128 k1024 = make_constant(k1024_lo, k1024_hi);
+    v128 k128 = make_constant(k128_lo, k128_hi);
+    v128 x[8];
+    v128 r;
+    int i;
+
+    for (i = 0; i < 8; i++)
+        x[i] = load128(p + 16 * i);
+    x[0] = xor128(x[0], make_constant(crc, 0));
+    p += 128;
+    len -= 128;
+
+    while (len >= 128) {
+        for (i = 0; i < 8; i++)
+            x[i] = xor128(fold128(x[i], k1024), load128(p + 16 * i));
+        p += 128;
+        len -= 128;
+    }
+
+    r = x[0];
+    for (i = 1; i < 8; i++)
+        r = xor128(fold128(r, k128), x[i]);
+
+    while (len >= 16) {
+        r = xor128(fold128(r, k128), load128(p));
+        p += 16;
+        len -= 16;
+    }
+
+    store128(out, r);
+    return (size_t)(p - start);
+}
+
+#else
+
+int crc64_clmul_init(void)
+{
+    init_constants();
+    return 0;
+}
+
+size_t crc64_clmul_fold(uint64_t crc, const unsigned char *p, size_t len,
+                        unsigned char out[16])
+{
+    (void)crc;
+    (void)p;
+    (void)len;
+    memset(out, 0, 16);
+    return 0;
+}
+
+#endif
@@ -0,0 +1,35 @@
+/*
+ * Carry-less multiplication folding for CRC-64-Jones.
+ *
+ * The folding kernel reduces a buffer to a 128-bit remainder using
+ * PCLMULQDQ (x86-64) or PMULL (aarch64). The caller turns that remainder
+ * into the final CRC with the table-driven kernel and hashes any tail bytes
+ * the same way, so no Barrett reduction is needed here.
+ */
+
+#ifndef PYCHECKIT_CRC64_CLMUL_H
+#define PYCHECKIT_CRC64_CLMUL_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+/* Smallest buffer length the folding kernel accepts. */
+#define CRC64_CLMUL_MIN_LEN 256
+
+/*
+ * Prepare the folding constants and detect CPU support. Must be called once
+ * before crc64_clmul_fold(). Returns 1 if the folding kernel can be used.
+ */
+int crc64_clmul_init(void);
+
+/*
+ * Fold the longest multiple-of-16 prefix of p (len >= CRC64_CLMUL_MIN_LEN)
+ * into the 16 bytes at out, starting from the CRC value crc. The CRC of the
+ * prefix is the table-driven CRC of out with an initial value of 0.
+ *
+ * Returns the number of bytes consumed.
+ */
+size_t crc64_clmul_fold(uint64_t crc, const unsigned char *p, size_t len,
+                        unsigned char out[16]);
+
+#endif
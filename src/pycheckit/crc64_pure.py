@@ -40,6 +40,8 @@ ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 """
 
+from collections.abc import Buffer
+
 CRC64_TABLE = [
     0x0000000000000000, 0x7ad870c830358979,
     0xf5b0e190606b12f2, 0x8f689158505e9b8b,
@@ -172,21 +174,82 @@ CRC64_TABLE = [
 ]
 
 
-def crc64(crc: int, data: bytes) -> int:
+def crc64(crc: int, data: Buffer) -> int:
     """Calculate CRC64 checksum.
 
     Args:
         crc: Initial CRC value
-        data: Data bytes to calculate checksum for
+        data: Bytes-like object (any contiguous buffer) to calculate checksum for
 
     Returns:
         CRC64 checksum as integer
     """
-    for byte in data:
+    for byte in memoryview(data).cast('B'):
         crc = CRC64_TABLE[(crc ^ byte) & 0xff] ^ (crc >> 8)
     return crc & 0xffffffffffffffff
 
 
+# Bit-reflected CRC-64-Jones polynomial, x^0 in bit 63.
+CRC64_POLY = 0x95ac9329ac4bc9b5
+_X0 = 1 << 63
+
+
+def _multmodp(a: int, b: int) -> int:
+    """Multiply two bit-reflected polynomials modulo the CRC polynomial."""
+    m = _X0
+    p = 0
+    while True:
+        if a & m:
+            p ^= b
+            if not a & (m - 1):
+                break
+        m >>= 1
+        b = (b >> 1) ^ CRC64_POLY if b & 1 else b >> 1
+    return p
+
+
+def _x2n_table() -> list:
+    """Return x^(2^n) modulo the CRC polynomial for n in 0..63."""
+    table = []
+    p = _X0 >> 1
+    for _ in range(64):
+        table.append(p)
+        p = _multmodp(p, p)
+    return table
+
+
+CRC64_X2N_TABLE = _x2n_table()
+
+
+def _x8nmodp(length: int) -> int:
+    """Return x^(8 * length) modulo the CRC polynomial."""
+    p = _X0
+    k = 3
+    while length:
+        if length & 1:
+            p = _multmodp(CRC64_X2N_TABLE[k & 63], p)
+        length >>= 1
+        k += 1
+    return p
+
+
+def crc64_combine(crc_a: int, crc_b: int, len_b: int) -> int:
+    """Combine the CRC64 checksums of two consecutive blocks.
+
+    Shifts crc_a over len_b zero bytes by multiplying it with x^(8 * len_b)
+    in GF(2) modulo the polynomial, then adds crc_b.
+
+    Args:
+        crc_a: CRC64 of the first block
+        crc_b: CRC64 of the second block, calculated with an initial value of 0
+        len_b: Length of the second block in bytes
+
+    Returns:
+        CRC64 checksum of both blocks concatenated
+    """
+    return _multmodp(_x8nmodp(len_b), crc_a) ^ crc_b
+
+
 if __name__ == "__main__":
     # Test with "123456789"
     test_crc = crc64(0, b"123456789")
@@ -1,23 +1,211 @@
 """CRC64 wrapper module.
 
-This module tries to import the fast Cython implementation of CRC64.
-If that fails (e.g., extension not compiled), it falls back to the pure Python version.
+This module keeps a registry of the available CRC64 implementations
+(backends) and routes all checksum calculations through the active one:
+
+- simd: carry-less multiplication folding in the Cython extension
+- sliced: slicing-by-16 table kernel in the Cython extension
+- table: byte-wise table loop in the Cython extension
+- numpy: vectorized NumPy implementation
+- python: pure Python implementation
+
+By default the first available backend in that order is used, so an
+extension that is not compiled degrades to NumPy or pure Python instead of
+failing. The environment variable PYCHECKIT_CRC_BACKEND or select_backend()
+override the choice.
 """
 
-try:
-    # Try to import the compiled Cython extension
-    from pycheckit.crc64 import crc64
-    _IMPLEMENTATION = "cython"
-except ImportError:
-    # Fall back to pure Python implementation
-    from pycheckit.crc64_pure import crc64
-    _IMPLEMENTATION = "python"
+import errno
+import importlib
+import os
+import sys
+from collections.abc import Callable, Sequence
+
+BACKEND_ENV = "PYCHECKIT_CRC_BACKEND"
+AUTO = "auto"
+
+# Backend name -> (module, checksum function, module providing crc64_combine)
+_BACKENDS: dict[str, tuple[str, str, str]] = {
+    "simd": ("pycheckit.crc64", "crc64_clmul", "pycheckit.crc64"),
+    "sliced": ("pycheckit.crc64", "crc64_slice16", "pycheckit.crc64"),
+    "table": ("pycheckit.crc64", "crc64_bytewise", "pycheckit.crc64"),
+    "numpy": ("pycheckit.crc64_numpy", "crc64", "pycheckit.crc64_pure"),
+    "python": ("pycheckit.crc64_pure", "crc64", "pycheckit.crc64_pure"),
+}
+
+BACKEND_NAMES = list(_BACKENDS)
+
+_active: str | None = None
+_crc64: Callable | None = None
+_crc64_combine: Callable | None = None
+
+
+def _load(name: str) -> tuple[Callable, Callable]:
+    """Import a backend.
+
+    Args:
+        name: Backend name
+
+    Returns:
+        Tuple of (crc64, crc64_combine) functions
+
+    Raises:
+        ImportError: If the backend is not available
+    """
+    module_name, func_name, combine_module = _BACKENDS[name]
+    module = importlib.import_module(module_name)
+    if name == "simd" and not module.HAVE_CLMUL:
+        raise ImportError("CPU does not support carry-less multiplication")
+    return getattr(module, func_name), importlib.import_module(combine_module).crc64_combine
+
+
+def available_backends() -> list[str]:
+    """Return the names of all usable backends in order of preference."""
+    result = []
+    for name in BACKEND_NAMES:
+        try:
+            _load(name)
+        except ImportError:
+            continue
+        result.append(name)
+    return result
+
+
+def select_backend(name: str | None = None) -> str:
+    """Select the backend used for all CRC64 calculations.
+
+    Args:
+        name: Backend name or "auto". If None, the PYCHECKIT_CRC_BACKEND
+            environment variable is used, defaulting to "auto".
+
+    Returns:
+        Name of the selected backend
+
+    Raises:
+        ValueError: If the backend is unknown or not available
+    """
+    global _active, _crc64, _crc64_combine
+
+    if name is None:
+        name = os.environ.get(BACKEND_ENV) or AUTO
+
+    if name == AUTO:
+        candidates = BACKEND_NAMES
+    elif name in _BACKENDS:
+        candidates = [name]
+    else:
+        raise ValueError(f"Unknown CRC64 backend {name!r}, choose from: "
+                         f"{', '.join([AUTO] + BACKEND_NAMES)}")
 
+    for candidate in candidates:
+        try:
+            _crc64, _crc64_combine = _load(candidate)
+        except ImportError:
+            continue
+        _active = candidate
+        return candidate
 
-__all__ = ['crc64']
+    raise ValueError(f"CRC64 backend {name!r} is not available")
+
+
+def _ensure_backend() -> str:
+    """Select the default backend on first use.
+
+    An unknown or unavailable backend in PYCHECKIT_CRC_BACKEND is reported
+    on stderr and the automatic choice is used instead.
+
+    Returns:
+        Name of the active backend
+    """
+    if _active is not None:
+        return _active
+    try:
+        return select_backend()
+    except ValueError as e:
+        name = select_backend(AUTO)
+        print(f"{e}; ignoring {BACKEND_ENV}, using {name!r}", file=sys.stderr)
+        return name
+
+
+def crc64(crc: int, data) -> int:
+    """Calculate CRC64 checksum with the active backend.
+
+    Args:
+        crc: Initial CRC value
+        data: Bytes-like object (any contiguous buffer) to calculate checksum for
+
+    Returns:
+        CRC64 checksum as integer
+    """
+    if _crc64 is None:
+        _ensure_backend()
+        assert _crc64 is not None
+    return _crc64(crc, data)
+
+
+def crc64_combine(crc_a: int, crc_b: int, len_b: int) -> int:
+    """Combine the CRC64 checksums of two consecutive blocks.
+
+    Args:
+        crc_a: CRC64 of the first block
+        crc_b: CRC64 of the second block, calculated with an initial value of 0
+        len_b: Length of the second block in bytes
+
+    Returns:
+        CRC64 checksum of both blocks concatenated
+    """
+    if _crc64_combine is None:
+        _ensure_backend()
+        assert _crc64_combine is not None
+    return _crc64_combine(crc_a, crc_b, len_b)
+
+
+def crc64_files(paths: Sequence, buffer_size: int = 65536) -> list[tuple[int, int]]:
+    """Calculate the CRC64 checksums of many files in one call.
+
+    With one of the extension backends the files are opened, read and
+    hashed natively without the GIL, by the kernel of that backend;
+    otherwise they are hashed one by one with the active backend.
+
+    Args:
+        paths: Sequence of file paths
+        buffer_size: Size of the read buffer in bytes
+
+    Returns:
+        List of (errno, crc64_value) tuples in the order of paths. errno is
+        0 on success; crc64_value is only meaningful in that case.
+    """
+    module_name, func_name, _ = _BACKENDS[_ensure_backend()]
+    if module_name == "pycheckit.crc64":
+        # crc64_clmul -> "clmul", crc64_slice16 -> "slice16", ...
+        kernel = func_name[len("crc64_"):]
+        return importlib.import_module(module_name).crc64_files(paths, buffer_size, kernel)
+
+    results = []
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    for path in paths:
+        try:
+            crc = 0
+            with open(path, 'rb', buffering=0) as f:
+                while length := f.readinto(buf):
+                    crc = crc64(crc, view[:length])
+            results.append((0, crc))
+        except OSError as e:
+            results.append((e.errno or errno.EIO, 0))
+    return results
 
 
 def get_implementation():
     """Return the current CRC64 implementation being used."""
-    return _IMPLEMENTATION
+    return _ensure_backend()
+
 
+__all__ = [
+    'available_backends',
+    'crc64',
+    'crc64_combine',
+    'crc64_files',
+    'get_implementation',
+    'select_backend',
+]
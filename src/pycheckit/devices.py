@@ -0,0 +1,91 @@
+"""Per-device I/O queues for pycheckit.
+
+Files on different disks can be read in parallel without slowing each
+other down, but concurrent reads on one spinning disk only add seeks.
+DeviceQueues gives every device (st_dev) its own pool of worker threads,
+sized by the kind of device: one reader per rotational disk, several per
+SSD. The kind is read from /sys/block/<disk>/queue/rotational.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pycheckit.constants import (
+    HDD_QUEUE_DEPTH,
+    OTHER_QUEUE_DEPTH,
+    SSD_QUEUE_DEPTH,
+    DeviceClass,
+)
+
+SYS_DEV_BLOCK = "/sys/dev/block"
+
+DEFAULT_DEPTHS = {
+    DeviceClass.HDD: HDD_QUEUE_DEPTH,
+    DeviceClass.SSD: SSD_QUEUE_DEPTH,
+    DeviceClass.OTHER: OTHER_QUEUE_DEPTH,
+}
+
+
+def device_class(dev: int) -> DeviceClass:
+    """Return the kind of the block device with device number dev.
+
+    Partitions inherit the queue of their disk. Device numbers without a
+    block device behind them (major 0: tmpfs, NFS, btrfs subvolumes, ...)
+    and devices whose queue cannot be read are DeviceClass.OTHER.
+    """
+    if not os.major(dev):
+        return DeviceClass.OTHER
+    path = os.path.realpath(
+        os.path.join(SYS_DEV_BLOCK, f"{os.major(dev)}:{os.minor(dev)}")
+    )
+    for directory in (path, os.path.dirname(path)):
+        try:
+            with open(os.path.join(directory, "queue", "rotational")) as f:
+                return DeviceClass.HDD if f.read().strip() == "1" else DeviceClass.SSD
+        except OSError:
+            continue
+    return DeviceClass.OTHER
+
+
+class DeviceQueues:
+    """Worker threads per device, created when a device is first used."""
+
+    def __init__(self, depths: dict[DeviceClass | int, int] | None = None):
+        """Initialize the queues.
+
+        Args:
+            depths: Number of worker threads by DeviceClass, overriding the
+                defaults, or by device number for single devices
+        """
+        self.depths: dict[DeviceClass | int, int] = {**DEFAULT_DEPTHS, **(depths or {})}
+        self.total_depth = 0
+        self._executors: dict[int, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    def depth(self, dev: int) -> int:
+        """Return the number of files read at a time from device dev."""
+        if dev in self.depths:
+            return self.depths[dev]
+        return self.depths[device_class(dev)]
+
+    def executor(self, dev: int) -> ThreadPoolExecutor:
+        """Return the worker threads of device dev."""
+        with self._lock:
+            executor = self._executors.get(dev)
+            if executor is None:
+                depth = self.depth(dev)
+                executor = ThreadPoolExecutor(
+                    max_workers=depth,
+                    thread_name_prefix=f"pycheckit-{os.major(dev)}:{os.minor(dev)}",
+                )
+                self._executors[dev] = executor
+                self.total_depth += depth
+            return executor
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down the worker threads of all devices."""
+        with self._lock:
+            executors = list(self._executors.values())
+        for executor in executors:
+            executor.shutdown(wait=wait)
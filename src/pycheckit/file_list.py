@@ -3,13 +3,16 @@
 This module provides functionality to track lists of files during processing.
 """
 
+import threading
+
 
 class FileList:
-    """Manages a list of files with their paths."""
+    """Manages a list of files with their paths. Safe to use from several threads."""
 
     def __init__(self):
         """Initialize an empty file list."""
         self.files = []
+        self._lock = threading.Lock()
 
     def append(self, basename: str, filename: str) -> None:
         """Add a file to the list.
@@ -22,7 +25,8 @@ class FileList:
             full_path = f"{basename}{filename}"
         else:
             full_path = filename
-        self.files.append(full_path)
+        with self._lock:
+            self.files.append(full_path)
 
     def get_list(self) -> str:
         """Get the list of files as a newline-separated string.
@@ -30,11 +34,13 @@ class FileList:
         Returns:
             String containing all files separated by newlines
         """
-        return "\n".join(self.files)
+        with self._lock:
+            return "\n".join(self.files)
 
     def clear(self) -> None:
         """Clear the file list."""
-        self.files.clear()
+        with self._lock:
+            self.files.clear()
 
     def __len__(self) -> int:
         """Return the number of files in the list."""
@@ -0,0 +1,388 @@
+"""Parallel processing of files with ordered output.
+
+The main thread walks the tree and submits one task per file to a pool of
+worker threads. Everything a task writes to sys.stdout or sys.stderr, and
+every call it defers with in_order(), is recorded instead of executed and
+replayed by the main thread in submission order. The output of a run is
+therefore the same no matter how many workers there are or which of them
+finishes first. With per-device queues (see devices.py) each task runs
+on the workers of the device it reads from.
+
+With pure-Python or other GIL-bound CRC backends threads do not hash in
+parallel. ProcessPool instead sends batches of paths to worker processes,
+which only hash, and hands the checksums back to the main process, which
+does everything else with them.
+"""
+
+import multiprocessing
+import sys
+import threading
+from collections import deque
+from collections.abc import Callable, Sequence
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Self, TextIO
+
+from pycheckit.constants import PROCESS_BATCH, ErrorType
+from pycheckit.core import Settings, Stats, file_crc64, throttle_read
+from pycheckit.crc64_wrapper import get_implementation, select_backend
+from pycheckit.devices import DeviceQueues
+
+_local = threading.local()
+# Pipeline or ProcessPool whose context is active, for in_order()
+_active: "Pipeline | ProcessPool | None" = None
+
+
+class _Capture:
+    """Recorded side effects of one task."""
+
+    def __init__(self):
+        self.ops: list[tuple[Callable, tuple]] = []
+
+
+class _StreamProxy:
+    """Stand-in for sys.stdout/sys.stderr that records writes of worker threads."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text: str) -> int:
+        capture = getattr(_local, "capture", None)
+        if capture is None:
+            return self._stream.write(text)
+        capture.ops.append((self._stream.write, (text,)))
+        return len(text)
+
+    def flush(self) -> None:
+        if getattr(_local, "capture", None) is None:
+            self._stream.flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self._stream, name)
+
+
+def in_worker() -> bool:
+    """Return True if called from a task running in a pipeline worker."""
+    return getattr(_local, "capture", None) is not None
+
+
+def in_order(func: Callable, *args) -> None:
+    """Call func(*args) in output order.
+
+    In a worker the call is deferred until the main thread replays the
+    output of the task. In the main thread, while a Pipeline or ProcessPool
+    is active, it is queued behind the tasks that are still pending, so
+    that it comes out in the same place as with a single job. Elsewhere
+    the call is made immediately.
+    """
+    capture = getattr(_local, "capture", None)
+    if capture is not None:
+        capture.ops.append((func, args))
+    elif _active is not None:
+        _active.defer(func, args)
+    else:
+        func(*args)
+
+
+class Pipeline:
+    """Pool of worker threads whose output is replayed in submission order.
+
+    At most `window` tasks are in flight; submitting more first replays
+    the oldest ones, which bounds memory and keeps the walker only a little
+    ahead of the workers. Exceptions raised by a task (including
+    SystemExit) are re-raised by the main thread when the task's turn comes.
+
+    Use as a context manager; sys.stdout and sys.stderr are replaced by
+    recording proxies while it is active.
+    """
+
+    def __init__(
+        self, jobs: int, window: int | None = None, devices: DeviceQueues | None = None
+    ):
+        """Initialize the pipeline.
+
+        Args:
+            jobs: Number of worker threads
+            window: Maximum number of tasks in flight (default: 4 per worker)
+            devices: Per-device worker threads for tasks submitted with a
+                device; the window grows by 4 per device worker
+        """
+        self.jobs = jobs
+        self.window = window or 4 * jobs
+        self.devices = devices
+        self.executor = ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix="pycheckit"
+        )
+        self._pending: deque[tuple[Future, _Capture, Callable[[], None] | None]] = (
+            deque()
+        )
+        self._streams: tuple[TextIO, TextIO] | None = None
+
+    def __enter__(self) -> Self:
+        global _active
+        self._streams = (sys.stdout, sys.stderr)
+        sys.stdout = _StreamProxy(sys.stdout)
+        sys.stderr = _StreamProxy(sys.stderr)
+        _active = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        global _active
+        try:
+            if exc_type is None:
+                self.drain()
+        finally:
+            _active = None
+            # Discard what is left after an error, but still run the cleanups
+            for future, _, _ in self._pending:
+                future.cancel()
+            self.executor.shutdown(wait=True)
+            if self.devices is not None:
+                self.devices.shutdown(wait=True)
+            while self._pending:
+                _, _, cleanup = self._pending.popleft()
+                if cleanup is not None:
+                    cleanup()
+            if self._streams is not None:
+                sys.stdout, sys.stderr = self._streams
+
+    def submit(
+        self,
+        func: Callable,
+        *args,
+        cleanup: Callable[[], None] | None = None,
+        device: int | None = None,
+    ) -> None:
+        """Run func(*args) on a worker.
+
+        Args:
+            func: Task function
+            *args: Arguments of the task
+            cleanup: Called by the main thread after the task's output has
+                been replayed, or when the task is discarded
+            device: Device (st_dev) the task reads from; with per-device
+                queues the task runs on the workers of that device
+        """
+        capture = _Capture()
+        future = self.executor_for(device).submit(self._run, capture, func, args)
+        self._pending.append((future, capture, cleanup))
+        window = self.window
+        if self.devices is not None:
+            window += 4 * self.devices.total_depth
+        while len(self._pending) > window:
+            self._replay_next()
+
+    def executor_for(self, device: int | None) -> Executor:
+        """Return the workers for tasks reading from device."""
+        if self.devices is None or device is None:
+            return self.executor
+        return self.devices.executor(device)
+
+    def defer(self, func: Callable, args: tuple) -> None:
+        """Call func(*args) from the main thread after the pending tasks' output."""
+        if not self._pending:
+            func(*args)
+            return
+        capture = _Capture()
+        capture.ops.append((func, args))
+        future: Future = Future()
+        future.set_result(None)
+        self._pending.append((future, capture, None))
+
+    def drain(self) -> None:
+        """Wait for all submitted tasks and replay their output."""
+        while self._pending:
+            self._replay_next()
+
+    @staticmethod
+    def _run(capture: _Capture, func: Callable, args: tuple) -> None:
+        _local.capture = capture
+        try:
+            func(*args)
+        finally:
+            _local.capture = None
+
+    def _replay_next(self) -> None:
+        future, capture, cleanup = self._pending.popleft()
+        try:
+            # The output of a failed task is replayed before its exception
+            error = future.exception()
+            for func, args in capture.ops:
+                func(*args)
+            if error is not None:
+                raise error
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+
+# Settings that affect how a worker process reads and hashes a file
+_WORKER_SETTINGS = (
+    "parallel_threshold",
+    "parallel_workers",
+    "parallel_range_size",
+    "read_method",
+    "buffer_size",
+    "adaptive_buffer",
+    "prefetch",
+    "io_profile",
+    "direct_io",
+)
+
+# Result of hashing one file: (path, error code, checksum or None)
+HashResult = tuple[str, int, int | None]
+
+
+def _init_worker(settings: dict[str, Any], backend: str) -> None:
+    """Set up a worker process like the main process."""
+    select_backend(backend)
+    for name, value in settings.items():
+        setattr(Settings, name, value)
+
+
+def _hash_batch(
+    paths: Sequence[str],
+) -> tuple[list[HashResult], tuple[int, int, float, float]]:
+    """Hash a batch of files in a worker process.
+
+    Returns:
+        The results per file and the read statistics of the batch as
+        (read calls, bytes read, I/O wait, hash time)
+    """
+    Stats.reset()
+    results = []
+    for path in paths:
+        error, crc = file_crc64(path)
+        results.append((path, int(error), crc))
+    return results, (Stats.read_calls, Stats.bytes_read, Stats.io_wait, Stats.hash_time)
+
+
+class ProcessPool:
+    """Pool of worker processes that hash files for the main process.
+
+    hash() splits a list of files into batches, which the workers hash
+    with file_crc64() and the current Settings. Results come back as
+    compact (path, error, checksum) tuples and are handed to a callback in
+    the main process, in submission order, so xattr updates, output and
+    Stats stay in one place. At most `window` batches are in flight.
+
+    The rate limits are applied by the main process when a batch is
+    submitted. Use as a context manager; leaving it waits for all
+    callbacks.
+    """
+
+    def __init__(
+        self, jobs: int, window: int | None = None, batch_size: int = PROCESS_BATCH
+    ):
+        """Initialize the pool.
+
+        Args:
+            jobs: Number of worker processes
+            window: Maximum number of batches in flight (default: 4 per worker)
+            batch_size: Maximum number of files per batch
+        """
+        self.jobs = jobs
+        self.window = window or 4 * jobs
+        self.batch_size = batch_size
+        settings = {name: getattr(Settings, name) for name in _WORKER_SETTINGS}
+        # Spawn rather than fork: the main process may already run threads
+        self.executor = ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(settings, get_implementation()),
+        )
+        self._pending: deque[
+            tuple[
+                list[Future],
+                Callable[[dict[str, int]], None],
+                Callable[[], None] | None,
+            ]
+        ] = deque()
+        self._in_flight = 0
+        self.completing = False
+
+    def __enter__(self) -> Self:
+        global _active
+        _active = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        global _active
+        try:
+            if exc_type is None:
+                self.drain()
+        finally:
+            _active = None
+            for futures, _, _ in self._pending:
+                for future in futures:
+                    future.cancel()
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            while self._pending:
+                _, _, cleanup = self._pending.popleft()
+                if cleanup is not None:
+                    cleanup()
+
+    def hash(
+        self,
+        files: Sequence[tuple[str, int]],
+        callback: Callable[[dict[str, int]], None],
+        cleanup: Callable[[], None] | None = None,
+    ) -> None:
+        """Hash files in the workers and pass the checksums to callback.
+
+        Args:
+            files: (path, size) of each file
+            callback: Called by the main process with a dictionary mapping
+                the paths that were hashed successfully to their checksums.
+                Files that failed are left out, so the caller can handle
+                them (and report the error) as usual.
+            cleanup: Called after the callback, or when the batch is discarded
+        """
+        # Spread small lists over all workers
+        batch_size = max(1, min(self.batch_size, -(-len(files) // self.jobs)))
+        futures = []
+        for start in range(0, len(files), batch_size):
+            batch = files[start : start + batch_size]
+            if Settings.file_limiter is not None:
+                Settings.file_limiter.acquire(len(batch))
+            throttle_read(sum(size for _, size in batch))
+            futures.append(
+                self.executor.submit(_hash_batch, [path for path, _ in batch])
+            )
+        self._pending.append((futures, callback, cleanup))
+        self._in_flight += len(futures)
+        while self._in_flight > self.window and len(self._pending) > 1:
+            self._complete_next()
+
+    def defer(self, func: Callable, args: tuple) -> None:
+        """Call func(*args) after the callbacks of the pending batches."""
+        if self.completing or not self._pending:
+            func(*args)
+        else:
+            self.hash([], lambda crcs: func(*args))
+
+    def drain(self) -> None:
+        """Wait for all batches and run their callbacks."""
+        while self._pending:
+            self._complete_next()
+
+    def _complete_next(self) -> None:
+        futures, callback, cleanup = self._pending.popleft()
+        self._in_flight -= len(futures)
+        try:
+            crcs = {}
+            for future in futures:
+                results, (calls, nbytes, io_wait, hash_time) = future.result()
+                Stats.add_reads(calls, nbytes)
+                Stats.add_times(io_wait, hash_time)
+                for path, error, crc in results:
+                    if error == ErrorType.SUCCESS:
+                        crcs[path] = crc
+            self.completing = True
+            try:
+                callback(crcs)
+            finally:
+                self.completing = False
+        finally:
+            if cleanup is not None:
+                cleanup()
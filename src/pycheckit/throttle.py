@@ -0,0 +1,120 @@
+"""Rate limiting for background verification.
+
+This module provides token buckets that limit the rate of bytes read and
+files opened. One bucket is shared by all threads reading files, so the
+limit holds for the whole run no matter how many workers there are.
+"""
+
+import threading
+import time
+from collections.abc import Callable
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Tokens are refilled continuously at `rate` per second up to `burst`.
+    A request larger than the available tokens is granted at once but puts
+    the bucket into debt, and the caller sleeps until the debt is paid off.
+    This keeps the average rate exact for requests of any size, including
+    ones larger than the burst.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """Initialize a full bucket.
+
+        Args:
+            rate: Tokens per second
+            burst: Bucket capacity (default: one second worth of tokens)
+            clock: Monotonic clock returning seconds
+            sleep: Function sleeping for the given number of seconds
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive: {rate}")
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else self.rate
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = clock()
+
+    def acquire(self, amount: float) -> float:
+        """Take tokens from the bucket, sleeping if it runs into debt.
+
+        Args:
+            amount: Number of tokens (bytes, files)
+
+        Returns:
+            Seconds slept
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def observe(self, latency: float | None) -> None:
+        """Record the latency of a read; the plain bucket ignores it."""
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """Token bucket that backs off when read latency rises.
+
+    The lowest smoothed read latency seen so far serves as the baseline of
+    an idle device. When the smoothed latency grows beyond SPIKE_FACTOR
+    times the baseline, other users are queueing behind us and the rate is
+    halved (down to MIN_FRACTION of the configured maximum). Otherwise the
+    rate recovers by RECOVERY_STEP of the maximum per read.
+    """
+
+    SPIKE_FACTOR = 4.0
+    MIN_FRACTION = 1 / 16
+    RECOVERY_STEP = 1 / 64
+    # Smoothing weight of a new latency sample
+    ALPHA = 0.2
+    # Latencies below this are page cache hits and say nothing about the device
+    MIN_BASELINE = 0.0005
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        super().__init__(rate, burst, clock, sleep)
+        self.max_rate = self.rate
+        self._latency: float | None = None
+        self._baseline: float | None = None
+
+    def observe(self, latency: float | None) -> None:
+        """Record the latency of a read and adjust the rate."""
+        if latency is None:
+            return
+        with self._lock:
+            if self._latency is None:
+                self._latency = latency
+            else:
+                self._latency += self.ALPHA * (latency - self._latency)
+            baseline = max(self._latency, self.MIN_BASELINE)
+            if self._baseline is None or baseline < self._baseline:
+                self._baseline = baseline
+            if self._latency > self.SPIKE_FACTOR * self._baseline:
+                self.rate = max(self.rate / 2, self.max_rate * self.MIN_FRACTION)
+            else:
+                self.rate = min(
+                    self.rate + self.max_rate * self.RECOVERY_STEP, self.max_rate
+                )
@@ -0,0 +1,272 @@
+"""Directory tree traversal for pycheckit.
+
+This module provides a non-recursive walker that streams directory entries
+in bounded chunks, so neither the depth of a tree nor the size of a single
+directory affects the Python stack or the memory used.
+"""
+
+import os
+from collections import deque
+from collections.abc import Iterator
+from itertools import islice
+
+from pycheckit.constants import MAX_OPEN_DIRS, WALK_CHUNK, WalkOrder
+from pycheckit.core import file_extents, open_dir_fd
+
+
+class _DirScan:
+    """The entries of one directory, handed out run by run.
+
+    next() returns either a list of files or the name of a subdirectory to
+    descend into before asking for more. A scan can be suspended to free
+    its descriptors and resumed later by path. Only the position is kept
+    while suspended: the last name read before the current chunk and the
+    last name handed out of it. Resuming lists the directory again, skips
+    to that chunk and re-reads it, so that the same entries come in the
+    same order as without suspending, as long as the directory is not
+    changed in the meantime.
+    """
+
+    def __init__(self, path: str, fd: int, order: WalkOrder, chunk_size: int):
+        self.path = path
+        self.fd: int | None = fd
+        self.order = order
+        self.chunk_size = chunk_size
+        # Subdirectories come in their sorted position, except with the
+        # orders that group the files of a directory by their location
+        self.interleaved = order in (WalkOrder.NAME, WalkOrder.NONE)
+        self._pending: deque[os.DirEntry] = deque()
+        self._subdirs: deque[str] = deque()
+        self._scandir: "os._ScandirIterator[str] | None" = None
+        # Last name listed before the current chunk, last name listed in
+        # it and last name handed out of it
+        self._chunk_after: str | None = None
+        self._chunk_last: str | None = None
+        self._handed: str | None = None
+        self._suspended = False
+        self._start_scan(fd)
+
+    def _start_scan(self, fd: int) -> None:
+        try:
+            self._scandir = os.scandir(fd)
+        except OSError:
+            self._scandir = None
+
+    def _end_scan(self) -> None:
+        if self._scandir is not None:
+            self._scandir.close()
+            self._scandir = None
+
+    def _read_chunk(self, again: bool = False) -> bool:
+        """Read, sort and queue the next chunk; return False at the end of the directory.
+
+        With again set, the current chunk is read once more after resuming:
+        its subdirectories are already queued and the entries up to the
+        last one handed out are dropped.
+        """
+        if self._scandir is None:
+            return False
+        try:
+            entries = list(islice(self._scandir, self.chunk_size))
+        except OSError:
+            entries = []
+        if not entries:
+            self._end_scan()
+            return False
+        if not again:
+            self._chunk_after = self._chunk_last
+            self._handed = None
+        self._chunk_last = entries[-1].name
+        if self.interleaved:
+            if self.order == WalkOrder.NAME:
+                entries.sort(key=lambda e: e.name)
+            self._pending.extend(entries)
+        else:
+            files: list[os.DirEntry] = []
+            subdirs: list[os.DirEntry] = []
+            for entry in entries:
+                (subdirs if _is_dir(entry) else files).append(entry)
+            if self.order == WalkOrder.PHYSICAL and self.fd is not None:
+                files = physical_order(files, self.fd)
+            else:
+                files.sort(key=lambda e: e.inode())
+            self._pending.extend(files)
+            if not again:
+                subdirs.sort(key=lambda e: e.inode())
+                self._subdirs.extend(entry.name for entry in subdirs)
+        if again and self._handed is not None:
+            if any(entry.name == self._handed for entry in self._pending):
+                while self._pending.popleft().name != self._handed:
+                    pass
+        return True
+
+    def _pop(self) -> os.DirEntry:
+        entry = self._pending.popleft()
+        self._handed = entry.name
+        return entry
+
+    def next(self) -> list[os.DirEntry] | str | None:
+        """Return the next run of files, the name of the next subdirectory, or None at the end."""
+        files: list[os.DirEntry] = []
+        while True:
+            if not self._pending:
+                if files:
+                    return files
+                if not self._read_chunk():
+                    return self._subdirs.popleft() if self._subdirs else None
+                continue
+            if self.interleaved and _is_dir(self._pending[0]):
+                if files:
+                    return files
+                return self._pop().name
+            files.append(self._pop())
+
+    def suspend(self) -> None:
+        """Close the descriptors, remembering the position in the directory."""
+        self._suspended = self._scandir is not None
+        self._pending.clear()
+        self.close()
+
+    def resume(self) -> bool:
+        """Reopen a suspended directory by path; return False if nothing is left or it is gone."""
+        if not self._suspended and not self._subdirs:
+            return False
+        try:
+            self.fd = open_dir_fd(self.path)
+        except OSError:
+            return False
+        if self._suspended:
+            self._suspended = False
+            self._start_scan(self.fd)
+            if self._scandir is not None and self._chunk_after is not None:
+                # Skip the chunks handed out before, in listing order
+                for entry in self._scandir:
+                    if entry.name == self._chunk_after:
+                        break
+            if self._chunk_last is not None:
+                self._read_chunk(again=True)
+        return True
+
+    def close(self) -> None:
+        """Close the descriptors of the scan."""
+        self._end_scan()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def walk_tree(
+    root: str,
+    dir_fd: int | None = None,
+    order: WalkOrder = WalkOrder.NAME,
+    chunk_size: int = WALK_CHUNK,
+) -> Iterator[tuple[str, int, list[os.DirEntry]]]:
+    """Walk a directory tree without recursion.
+
+    Entries are read with os.scandir in chunks of at most chunk_size and
+    the files among them are yielded as they are read, together with the
+    path and an open descriptor of their directory, which stays valid
+    until the next chunk is requested. Subdirectories are not yielded;
+    they are walked depth first.
+
+    With WalkOrder.NAME (the default) each chunk is sorted by name and a
+    subdirectory is walked when its name is reached, so directories of up
+    to chunk_size entries are processed in the same order as a sorted
+    recursive listing; larger ones are sorted chunk by chunk.
+    WalkOrder.NONE keeps the order of the directory listing. With
+    WalkOrder.INODE and WalkOrder.PHYSICAL all files of a directory come
+    before its subdirectories: the files of each chunk are sorted by inode
+    number or by where their data starts on disk (see physical_order()),
+    to reduce seeks on rotating media, and the subdirectories by inode.
+
+    Subdirectories are opened relative to the descriptor of their parent.
+    At most MAX_OPEN_DIRS directories are kept open; beyond that the
+    outermost one is suspended and reopened by path when the walk returns
+    to it.
+
+    Args:
+        root: Path to the top directory
+        dir_fd: Descriptor of the directory root is relative to
+        order: Entry order
+        chunk_size: Maximum number of entries per chunk
+
+    Yields:
+        Tuples of (directory path, directory descriptor, entries)
+    """
+    try:
+        fd = open_dir_fd(root, dir_fd)
+    except OSError:
+        return
+    stack = [_DirScan(root, fd, order, chunk_size)]
+    try:
+        while stack:
+            scan = stack[-1]
+            if scan.fd is None and not scan.resume():
+                stack.pop()
+                continue
+            item = scan.next()
+            if item is None:
+                stack.pop().close()
+            elif isinstance(item, list):
+                yield scan.path, scan.fd, item
+            else:
+                try:
+                    fd = open_dir_fd(item, scan.fd)
+                except OSError:
+                    continue
+                open_scans = [s for s in stack if s.fd is not None]
+                if len(open_scans) >= MAX_OPEN_DIRS:
+                    open_scans[0].suspend()
+                stack.append(
+                    _DirScan(os.path.join(scan.path, item), fd, order, chunk_size)
+                )
+    finally:
+        # Close the descriptors of the open directories if the walk is
+        # abandoned early
+        for scan in stack:
+            scan.close()
+
+
+def physical_order(entries: list[os.DirEntry], dir_fd: int) -> list[os.DirEntry]:
+    """Sort directory entries by the physical offset of their first extent.
+
+    Each regular file is opened briefly for a FIEMAP ioctl. Files without
+    a known location (empty, inline or not yet written back, or on a
+    filesystem without FIEMAP) and other entries are sorted by inode
+    number, ahead of the mapped ones.
+
+    Args:
+        entries: Directory entries of one directory
+        dir_fd: Descriptor of that directory
+
+    Returns:
+        The entries in disk order
+    """
+
+    def key(entry: os.DirEntry) -> tuple[int, int]:
+        extents = None
+        try:
+            if entry.is_file(follow_symlinks=False):
+                fd = os.open(
+                    entry.name,
+                    os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC,
+                    dir_fd=dir_fd,
+                )
+                try:
+                    extents = file_extents(fd)
+                finally:
+                    os.close(fd)
+        except OSError:
+            pass
+        if not extents:
+            return 0, entry.inode()
+        return 1, extents[0][1]
+
+    return sorted(entries, key=key)
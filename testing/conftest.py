@@ -7,6 +7,17 @@ import pytest
 import shutil
 
 
+@pytest.fixture(autouse=True)
+def restore_settings():
+    """Restore the global settings the CLI changes, so tests stay independent."""
+    from pycheckit.core import Mounts, Settings
+    saved = {name: value for name, value in vars(Settings).items() if not name.startswith('__')}
+    yield
+    for name, value in saved.items():
+        setattr(Settings, name, value)
+    Mounts.reset()
+
+
 @pytest.fixture
 def temp_file():
     """Create a temporary file for testing."""
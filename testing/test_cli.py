@@ -69,10 +69,377 @@ class TestCLI:
         assert result == 0
 
 
+class TestRecursion:
+    """Test processing directory trees."""
+    def test_cli_recurse_small_files(self, temp_dir, monkeypatch):
+        """Test batched hashing of small files stores the same CRCs."""
+        from pycheckit.core import file_crc64
+        paths = []
+        for i in range(5):
+            path = os.path.join(temp_dir, f"small{i}.txt")
+            with open(path, 'w') as f:
+                f.write(f"content {i}\n" * (i * 100))
+            paths.append(path)
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-r', temp_dir])
+        assert main() == 0
+        for path in paths:
+            assert get_crc(path) == file_crc64(path)
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', '--small-file-size', '0', temp_dir])
+        assert main() == 0
+    @pytest.mark.parametrize("pool", [[], ['-j', '2', '--pool', 'process']], ids=["batch", "process"])
+    def test_cli_recurse_small_files_read_if_used(self, temp_dir, monkeypatch, capsys, pool):
+        """Test batches and worker processes skip files whose checksum would be discarded."""
+        for i in range(3):
+            with open(os.path.join(temp_dir, f"small{i}.txt"), 'w') as f:
+                f.write("x" * 100)
+        def bytes_read(*args):
+            monkeypatch.setattr(sys, 'argv', ['pycheckit', '-r', '--stats', *pool, *args, temp_dir])
+            main()
+            return [line for line in capsys.readouterr().err.splitlines() if line.startswith("Read ")][0]
+        # A check of files without a checksum and a store that may not overwrite read nothing
+        assert bytes_read('-c').startswith("Read 0 bytes")
+        assert bytes_read('-s').startswith("Read 300 bytes")
+        assert bytes_read('-s').startswith("Read 0 bytes")
+        assert bytes_read('-s', '-o').startswith("Read 300 bytes")
+        assert bytes_read('-c').startswith("Read 300 bytes")
+    def test_cli_recurse_no_restat(self, temp_dir, monkeypatch, capsys):
+        """Test recursing reuses the scandir stat results instead of stat'ing again."""
+        os.makedirs(os.path.join(temp_dir, "sub", "deeper"))
+        for name in ("a", "sub/b", "sub/deeper/c"):
+            with open(os.path.join(temp_dir, name), 'w') as f:
+                f.write(name)
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-r', temp_dir])
+        assert main() == 0
+        stat_calls = []
+        real_stat = os.stat
+        def counting_stat(*args, **kwargs):
+            stat_calls.append(args[0])
+            return real_stat(*args, **kwargs)
+        monkeypatch.setattr(os, 'stat', counting_stat)
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', '--small-file-size', '0', temp_dir])
+        assert main() == 0
+        # Only the directory given on the command line is stat'ed
+        assert stat_calls == [temp_dir]
+        assert capsys.readouterr().out.count("OK") == 3
+    def test_cli_recurse_order(self, temp_dir, monkeypatch, capsys):
+        """Test -r lists files in sorted order with subdirectories in their sorted position."""
+        for name in ("c", "a", "bdir/x"):
+            path = os.path.join(temp_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(name)
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-r', temp_dir])
+        assert main() == 0
+        capsys.readouterr()
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', '--small-file-size', '0', temp_dir])
+        assert main() == 0
+        lines = capsys.readouterr().out.splitlines()
+        assert [os.path.basename(line.split()[0]) for line in lines if "OK" in line] == ["a", "x", "c"]
+    @pytest.mark.parametrize("root", [".", "./"])
+    def test_cli_recurse_current_dir(self, temp_dir, monkeypatch, capsys, root):
+        """Test the current directory is walked, not skipped as a hidden file."""
+        os.makedirs(os.path.join(temp_dir, "sub"))
+        for name in ("a", "sub/b", ".hidden"):
+            with open(os.path.join(temp_dir, name), 'w') as f:
+                f.write(name)
+        monkeypatch.chdir(temp_dir)
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-r', root])
+        assert main() == 0
+        assert present_crc64(os.path.join(temp_dir, "sub", "b")) == AttributeType.XATTR
+        assert present_crc64(os.path.join(temp_dir, ".hidden")) == AttributeType.NO_ATTR
+        capsys.readouterr()
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', root])
+        assert main() == 0
+        assert capsys.readouterr().out.count("OK") == 2
+    def test_cli_order_none(self, temp_dir, monkeypatch, capsys):
+        """Test recursing without sorting processes every file."""
+        os.makedirs(os.path.join(temp_dir, "sub"))
+        for name in ("b", "a", "sub/c"):
+            with open(os.path.join(temp_dir, name), 'w') as f:
+                f.write(name)
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-r', '--order', 'none', temp_dir])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', '--order', 'none', temp_dir])
+        assert main() == 0
+        assert capsys.readouterr().out.count("OK") == 3
+
+
+class TestOptionParsing:
+    """Test parsing of command line options."""
+    def test_parse_size(self):
+        """Test sizes with and without unit suffix."""
+        from pycheckit.cli import parse_size
+        assert parse_size("4096") == 4096
+        assert parse_size("64K") == 64 * 1024
+        assert parse_size("1g") == 1 << 30
+        assert parse_size("2MB") == 2 << 20
+    def test_parse_size_invalid(self):
+        """Test invalid sizes are rejected."""
+        import argparse
+        from pycheckit.cli import parse_size
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_size("lots")
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_size("-1")
+    def test_cli_crc_backend(self, temp_file, monkeypatch, capsys):
+        """Test selecting the CRC64 backend and reporting it."""
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '--crc-backend', 'python', '--version'])
+        assert main() == 0
+        assert "CRC64 backend: python" in capsys.readouterr().out
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '--crc-backend', 'python', '-s', temp_file])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', temp_file])
+        assert main() == 0
+    def test_cli_read_method(self, temp_file, monkeypatch):
+        """Test checking with the mmap read path."""
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', temp_file])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '--read-method', 'mmap', temp_file])
+        assert main() == 0
+    def test_cli_parallel_threshold(self, temp_file, monkeypatch):
+        """Test storing and checking with range hashing enabled."""
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '--parallel-threshold', '1', temp_file])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', temp_file])
+        assert main() == 0
+    def test_cli_buffer_size(self, temp_file, monkeypatch, capsys):
+        """Test fixed and adaptive buffer sizes and the read statistics."""
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '--buffer-size', '1M', temp_file])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '--buffer-size', 'auto', '--stats', temp_file])
+        assert main() == 0
+        assert "Read 27 bytes in 1 read call(s)" in capsys.readouterr().err
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '--prefetch', '--stats', temp_file])
+        assert main() == 0
+        assert "s for I/O, hashed for" in capsys.readouterr().err
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '--max-bytes-per-sec', '1M', '--adaptive-throttle',
+                                          '--max-files-per-sec', '100', temp_file])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '--adaptive-throttle', temp_file])
+        assert main() == 1
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '--buffer-size', '512', temp_file])
+        with pytest.raises(SystemExit):
+            main()
+
+
+class TestParallelProcessing:
+    """Test processing files with worker threads, device queues and worker processes."""
+    def test_cli_jobs_same_output(self, temp_dir, monkeypatch, capsys):
+        """Test -j 4 and -j 3 with worker processes give exactly the output of -j 1."""
+        os.makedirs(os.path.join(temp_dir, "sub"))
+        for i in range(40):
+            with open(os.path.join(temp_dir, "sub" if i % 3 else "", f"f{i:02d}"), 'w') as f:
+                f.write("x" * i * 1000)
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-r', '-j', '4', temp_dir])
+        assert main() == 0
+        capsys.readouterr()
+        # Corrupt two files so the verbose lists are not empty
+        for name in ("sub/f01", "f03"):
+            with open(os.path.join(temp_dir, name), 'a') as f:
+                f.write("changed")
+        outputs = []
+        for jobs, pool in (("1", "thread"), ("4", "thread"), ("3", "process")):
+            monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', '-v', '-j', jobs, '--pool', pool, temp_dir])
+            assert main() == 2
+            outputs.append(capsys.readouterr())
+        assert outputs[0] == outputs[1] == outputs[2]
+        assert outputs[0].out.count("OK") == 38
+    def test_cli_jobs_main_thread_messages_in_order(self, temp_dir, monkeypatch, capsys):
+        """Test an error for a missing argument comes out between the trees around it, as with -j 1."""
+        for name in ("d", "e"):
+            os.makedirs(os.path.join(temp_dir, name))
+            for i in range(30):
+                with open(os.path.join(temp_dir, name, f"f{i:02d}"), 'w') as f:
+                    f.write("x" * i * 1000)
+        paths = [os.path.join(temp_dir, name) for name in ("d", "missing", "e")]
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-r', os.path.join(temp_dir, "d")])
+        assert main() == 0
+        capsys.readouterr()
+        # One stream, so the order of errors and results can be compared
+        monkeypatch.setattr(sys, 'stderr', sys.stdout)
+        outputs = []
+        for jobs, pool in (("1", "thread"), ("4", "thread"), ("3", "process")):
+            monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', '-j', jobs, '--pool', pool, *paths])
+            main()
+            outputs.append(capsys.readouterr().out)
+        assert outputs[0] == outputs[1] == outputs[2]
+        lines = outputs[0].splitlines()
+        missing = next(i for i, line in enumerate(lines) if "missing" in line)
+        assert all(os.sep + "d" + os.sep in line for line in lines[:missing])
+        assert os.sep + "e" + os.sep in lines[missing + 1]
+    def test_cli_device_queues(self, temp_dir, monkeypatch, capsys):
+        """Test directories walked side by side on device queues are all checked."""
+        for directory in ("one", "two"):
+            os.makedirs(os.path.join(temp_dir, directory, "sub"))
+            for i in range(5):
+                with open(os.path.join(temp_dir, directory, "sub" if i % 2 else "", f"f{i}"), 'w') as f:
+                    f.write(directory * i)
+        dirs = [os.path.join(temp_dir, "one"), os.path.join(temp_dir, "two")]
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-r', '--device-queues', *dirs])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', '--device-depth', f'{temp_dir}=2', *dirs])
+        assert main() == 0
+        lines = capsys.readouterr().out.splitlines()
+        assert sum("OK" in line for line in lines) == 10
+        # One file of each tree in turn
+        assert [line.split(os.sep)[-2] for line in lines[:2]] == ["one", "two"]
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', '--device-queues', '-j', '2',
+                                          '--pool', 'process', *dirs])
+        assert main() == 1
+
+
+class TestHardlinks:
+    """Test reading hard-linked files once per run."""
+    @pytest.mark.parametrize("pool", [[], ['-j', '3'], ['-j', '2', '--pool', 'process']],
+                             ids=["sequential", "threads", "process"])
+    def test_cli_hardlinks_read_once(self, temp_dir, monkeypatch, capsys, pool):
+        """Test a file hard-linked into several trees is read once but reported for every link."""
+        for name in ("a", "b", "c"):
+            os.makedirs(os.path.join(temp_dir, name))
+        first = os.path.join(temp_dir, "a", "data")
+        with open(first, 'wb') as f:
+            f.write(b"x" * 100000)
+        for name in ("b", "c"):
+            os.link(first, os.path.join(temp_dir, name, "data"))
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', first])
+        assert main() == 0
+        capsys.readouterr()
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', '--stats', *pool, temp_dir])
+        assert main() == 0
+        captured = capsys.readouterr()
+        assert captured.out.count("OK") == 3
+        assert "Read 100000 bytes" in captured.err
+        assert "hard link for 2 file(s)" in captured.err
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', '--stats', '--hardlink-cache', '0', temp_dir])
+        assert main() == 0
+        assert "Read 300000 bytes" in capsys.readouterr().err
+
+
+class TestIncremental:
+    """Test skipping unchanged files with --incremental."""
+    def test_cli_incremental(self, temp_dir, monkeypatch, capsys):
+        """Test an incremental store only reads the modified file."""
+        for name in ("a", "b", "c"):
+            with open(os.path.join(temp_dir, name), 'w') as f:
+                f.write(name * 1000)
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-r', temp_dir])
+        assert main() == 0
+        with open(os.path.join(temp_dir, "b"), 'a') as f:
+            f.write("more")
+        capsys.readouterr()
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-o', '-r', '--incremental', '--stats', temp_dir])
+        assert main() == 0
+        err = capsys.readouterr().err
+        assert "Read 1004 bytes" in err
+        assert "Skipped 2 unchanged file(s)." in err
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-r', temp_dir])
+        assert main() == 0
+        assert capsys.readouterr().out.count("OK") == 3
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '--incremental', temp_dir])
+        assert main() == 1
+
+
+class TestScrub:
+    """Test verifying and refreshing checksums with --scrub."""
+    def test_cli_scrub(self, temp_dir, monkeypatch, capsys):
+        """Test scrub updates modified updateable files and fails corrupted or static ones."""
+        paths = {name: os.path.join(temp_dir, name) for name in ("changed", "corrupt", "static", "same")}
+        for path in paths.values():
+            with open(path, 'wb') as f:
+                f.write(os.urandom(5000))
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-r', temp_dir])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-u', paths["changed"], paths["corrupt"]])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-d', paths["static"]])
+        assert main() == 0
+        for name in ("changed", "static"):
+            with open(paths[name], 'ab') as f:
+                f.write(b"appended")
+        # Same size and mtime: not a legitimate change
+        st = os.stat(paths["corrupt"])
+        with open(paths["corrupt"], 'r+b') as f:
+            f.write(b"X" if f.read(1) != b"X" else b"Y")
+        os.utime(paths["corrupt"], ns=(st.st_atime_ns, st.st_mtime_ns))
+        capsys.readouterr()
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '--scrub', '-r', '-m', '--stats', temp_dir])
+        assert main() == 2
+        captured = capsys.readouterr()
+        status = {line.split()[0]: line.split()[1] for line in captured.out.splitlines()}
+        assert status == {paths["changed"]: "CHANGED", paths["corrupt"]: "FAILED",
+                          paths["static"]: "FAILED", paths["same"]: "OK"}
+        assert f"Read {4 * 5000 + 2 * 8} bytes" in captured.err
+        assert "Updated the checksum of 1 modified file(s)." in captured.err
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', paths["changed"]])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '--scrub', '-s', temp_dir])
+        assert main() == 1
+
+
+class TestXattrCalls:
+    """Test the number of extended attribute calls per file."""
+    @pytest.fixture
+    def xattr_calls(self, monkeypatch):
+        """Count the calls of each xattr function."""
+        import xattr
+        calls = {}
+        for name in ('listxattr', 'getxattr', 'setxattr', 'removexattr'):
+            def counting(*args, _name=name, _func=getattr(xattr, name), **kwargs):
+                calls[_name] = calls.get(_name, 0) + 1
+                return _func(*args, **kwargs)
+            monkeypatch.setattr(xattr, name, counting)
+        return calls
+    def test_check_fetches_once(self, temp_dir, monkeypatch, xattr_calls):
+        """Test storing and checking read each attribute once per file and never list them."""
+        paths = []
+        for i in range(3):
+            paths.append(os.path.join(temp_dir, f"file{i}"))
+            with open(paths[-1], 'w') as f:
+                f.write(f"content {i}")
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', *paths])
+        assert main() == 0
+        assert xattr_calls == {'getxattr': 2 * 3, 'setxattr': 2 * 3}
+        xattr_calls.clear()
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', '-p', *paths])
+        assert main() == 0
+        assert xattr_calls == {'getxattr': 2 * 3}
+    def test_store_fetches_once(self, temp_file, monkeypatch, xattr_calls):
+        """Test storing needs two reads and two writes (checksum and record)."""
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', temp_file])
+        assert main() == 0
+        assert xattr_calls == {'getxattr': 2, 'setxattr': 2}
+    def test_incremental_skips_unchanged(self, temp_file, monkeypatch, xattr_calls, capsys):
+        """Test an incremental store of an unchanged file reads three attributes and no data."""
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', temp_file])
+        assert main() == 0
+        xattr_calls.clear()
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-o', '--incremental', '--stats', temp_file])
+        assert main() == 0
+        assert xattr_calls == {'getxattr': 3}
+        assert "Read 0 bytes" in capsys.readouterr().err
+    def test_no_xattr_filesystem(self, temp_dir, monkeypatch, xattr_calls):
+        """Test files on a filesystem without xattrs use hidden files and never call xattr functions."""
+        from pycheckit import core
+        from pycheckit.constants import FS_VFAT
+        monkeypatch.setattr(core, '_statfs_type', lambda target: FS_VFAT)
+        path = os.path.join(temp_dir, "file")
+        with open(path, 'w') as f:
+            f.write("content")
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', path])
+        with pytest.raises(SystemExit):
+            main()
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-s', '-e', path])
+        assert main() == 0
+        monkeypatch.setattr(sys, 'argv', ['pycheckit', '-c', path])
+        assert main() == 0
+        assert xattr_calls == {}
+
+
 class TestCheckitCompatibility:
     """Test compatibility with the original checkit command."""
     
-    # marks @pytest.mark.skipif(not shutil.which("checkit"), reason="checkit command not available in PATH")  for all tests in this class
+    # marks @pytest.mark.skipif(not shutil.which("checkit"), reason="checkit command not available in PATH")
+    # for all tests in this class
     pytestmark = pytest.mark.skipif(not shutil.which("checkit"), reason="checkit command not available in PATH")
 
     def test_store_compatibility(self, temp_file, extended_path):
@@ -1,6 +1,9 @@
 """Integration tests for core pycheckit functionality."""
 import pytest
 import os
+import shutil
+import subprocess
+import sys
 from pycheckit.core import (
     file_crc64, put_crc, get_crc, remove_crc,
     export_crc, import_crc, present_crc64,
@@ -101,3 +104,449 @@ class TestExportImport:
         # Verify CRC matches
         status2, crc2 = get_crc(temp_file)
         assert crc1 == crc2
+class TestParallelHashing:
+    """Test hashing large files in parallel ranges."""
+    def test_parallel_matches_sequential(self, temp_dir, monkeypatch):
+        """Test range hashing gives the same CRC as sequential hashing."""
+        from pycheckit.core import Settings
+        path = os.path.join(temp_dir, "large.bin")
+        with open(path, 'wb') as f:
+            f.write(bytes(range(256)) * 100 + b"tail")
+        status, expected = file_crc64(path)
+        assert status == ErrorType.SUCCESS
+        monkeypatch.setattr(Settings, 'parallel_threshold', 1)
+        monkeypatch.setattr(Settings, 'parallel_workers', 3)
+        for range_size in (7, 1000, 65536, 1 << 20):
+            monkeypatch.setattr(Settings, 'parallel_range_size', range_size)
+            status, crc = file_crc64(path)
+            assert status == ErrorType.SUCCESS
+            assert crc == expected
+    def test_parallel_records_times(self, temp_dir, monkeypatch):
+        """Test range reads count toward the I/O wait and hash time stats."""
+        from pycheckit.core import Settings, Stats
+        path = os.path.join(temp_dir, "large.bin")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(1 << 20))
+        monkeypatch.setattr(Settings, 'parallel_threshold', 1)
+        monkeypatch.setattr(Settings, 'parallel_range_size', 1 << 18)
+        Stats.reset()
+        assert file_crc64(path)[0] == ErrorType.SUCCESS
+        assert Stats.bytes_read == 1 << 20
+        assert Stats.io_wait > 0 and Stats.hash_time > 0
+    def test_parallel_below_threshold(self, temp_file, monkeypatch):
+        """Test files below the threshold are still hashed sequentially."""
+        from pycheckit import core
+        monkeypatch.setattr(core.Settings, 'parallel_threshold', 1 << 30)
+        monkeypatch.setattr(core, 'parallel_file_crc64', None)
+        status, crc = file_crc64(temp_file)
+        assert status == ErrorType.SUCCESS
+class TestReadMethods:
+    """Test the selectable read paths."""
+    @pytest.mark.parametrize("content", [b"", b"123456789", bytes(range(256)) * 1000])
+    def test_read_methods_agree(self, temp_dir, monkeypatch, content):
+        """Test all read methods give the same checksum."""
+        from pycheckit.core import Settings
+        from pycheckit.constants import ReadMethod
+        from pycheckit.crc64_wrapper import crc64
+        path = os.path.join(temp_dir, "data.bin")
+        with open(path, 'wb') as f:
+            f.write(content)
+        for method in ReadMethod:
+            monkeypatch.setattr(Settings, 'read_method', method)
+            assert file_crc64(path) == (ErrorType.SUCCESS, crc64(0, content))
+    def test_mmap_throttled_per_window(self, temp_dir, monkeypatch):
+        """Test the mmap path charges the byte limit window by window, not all at once."""
+        from pycheckit.core import Settings
+        from pycheckit.constants import ReadMethod
+        class Limiter:
+            def __init__(self):
+                self.acquired = []
+            def observe(self, latency):
+                pass
+            def acquire(self, nbytes):
+                self.acquired.append(nbytes)
+        path = os.path.join(temp_dir, "data.bin")
+        with open(path, 'wb') as f:
+            f.write(b"x" * 10000)
+        limiter = Limiter()
+        monkeypatch.setattr(Settings, 'read_method', ReadMethod.MMAP)
+        monkeypatch.setattr(Settings, 'buffer_size', 4096)
+        monkeypatch.setattr(Settings, 'byte_limiter', limiter)
+        assert file_crc64(path)[0] == ErrorType.SUCCESS
+        assert limiter.acquired == [4096, 4096, 1808]
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_file_grown_after_stat(self, temp_dir, monkeypatch, parallel):
+        """Test a file appended to after it was stat'ed is hashed in full."""
+        from pycheckit.core import Settings
+        from pycheckit.constants import ReadMethod
+        from pycheckit.crc64_wrapper import crc64
+        path = os.path.join(temp_dir, "data.bin")
+        with open(path, 'wb') as f:
+            f.write(b"x" * 1000)
+        st = os.stat(path)
+        with open(path, 'ab') as f:
+            f.write(b"y" * 5000)
+        monkeypatch.setattr(Settings, 'read_method', ReadMethod.MMAP)
+        if parallel:
+            monkeypatch.setattr(Settings, 'parallel_threshold', 1)
+            monkeypatch.setattr(Settings, 'parallel_range_size', 4096)
+        assert file_crc64(path, st=st) == (ErrorType.SUCCESS, crc64(0, b"x" * 1000 + b"y" * 5000))
+class TestAdaptiveBuffer:
+    """Test the configurable and adaptive read buffer."""
+    @pytest.mark.parametrize("adaptive", [False, True])
+    @pytest.mark.parametrize("method", ["read", "readinto"])
+    def test_buffer_sizes_agree(self, temp_dir, monkeypatch, adaptive, method):
+        """Test the checksum does not depend on the buffer size."""
+        from pycheckit.core import Settings
+        from pycheckit.constants import ReadMethod
+        from pycheckit.crc64_wrapper import crc64
+        content = bytes(range(256)) * 3000
+        path = os.path.join(temp_dir, "data.bin")
+        with open(path, 'wb') as f:
+            f.write(content)
+        monkeypatch.setattr(Settings, 'read_method', ReadMethod(method))
+        monkeypatch.setattr(Settings, 'adaptive_buffer', adaptive)
+        monkeypatch.setattr(Settings, 'buffer_size', 4096)
+        assert file_crc64(path) == (ErrorType.SUCCESS, crc64(0, content))
+    def test_read_sizes(self, monkeypatch):
+        """Test the adaptive read size follows file and block size."""
+        from pycheckit.core import Settings, read_sizes
+        from pycheckit.constants import MAX_BUF_LEN, ADAPTIVE_MAX_BUF_LEN
+        st = os.stat_result((0o100644, 0, 0, 1, 0, 0, 1000, 0, 0, 0))
+        monkeypatch.setattr(Settings, 'buffer_size', 8192)
+        monkeypatch.setattr(Settings, 'adaptive_buffer', False)
+        assert read_sizes(st) == (8192, 8192)
+        monkeypatch.setattr(Settings, 'adaptive_buffer', True)
+        initial, maximum = read_sizes(st)
+        assert initial == maximum and 1000 <= initial <= MAX_BUF_LEN
+        st = os.stat_result((0o100644, 0, 0, 1, 0, 0, 1 << 30, 0, 0, 0))
+        assert read_sizes(st) == (MAX_BUF_LEN, ADAPTIVE_MAX_BUF_LEN)
+    def test_adaptive_fewer_reads(self, temp_dir, monkeypatch):
+        """Test the adaptive buffer needs fewer read calls on a large file."""
+        from pycheckit.core import Settings, Stats
+        from pycheckit.constants import MAX_BUF_LEN
+        path = os.path.join(temp_dir, "data.bin")
+        with open(path, 'wb') as f:
+            f.write(bytes(4 << 20))
+        monkeypatch.setattr(Settings, 'read_method', 'readinto')
+        monkeypatch.setattr(Settings, 'buffer_size', MAX_BUF_LEN)
+        monkeypatch.setattr(Settings, 'adaptive_buffer', False)
+        Stats.reset()
+        file_crc64(path)
+        fixed_reads = Stats.read_calls
+        monkeypatch.setattr(Settings, 'adaptive_buffer', True)
+        Stats.reset()
+        file_crc64(path)
+        assert Stats.bytes_read == 4 << 20
+        assert Stats.read_calls < fixed_reads
+class TestPrefetch:
+    """Test the read-ahead reader."""
+    @pytest.mark.parametrize("content", [b"", b"123456789", bytes(range(256)) * 3000],
+                             ids=["empty", "short", "long"])
+    def test_prefetch_agrees(self, temp_dir, monkeypatch, content):
+        """Test prefetching gives the same checksum and counts all bytes."""
+        from pycheckit.core import Settings, Stats
+        from pycheckit.crc64_wrapper import crc64
+        path = os.path.join(temp_dir, "data.bin")
+        with open(path, 'wb') as f:
+            f.write(content)
+        monkeypatch.setattr(Settings, 'prefetch', True)
+        monkeypatch.setattr(Settings, 'read_method', 'readinto')
+        monkeypatch.setattr(Settings, 'buffer_size', 4096)
+        Stats.reset()
+        assert file_crc64(path) == (ErrorType.SUCCESS, crc64(0, content))
+        assert Stats.bytes_read == len(content)
+    def test_prefetch_read_error(self, monkeypatch):
+        """Test a read error on the reader thread is reported."""
+        from pycheckit.core import prefetch_crc64
+        class Failing:
+            def readinto(self, buf):
+                raise OSError(5, "Input/output error")
+        st = os.stat_result((0o100644, 0, 0, 1, 0, 0, 100, 0, 0, 0))
+        with pytest.raises(OSError):
+            prefetch_crc64(Failing(), st)
+class TestScrubProfile:
+    """Test the page-cache-friendly scrub I/O profile."""
+    @pytest.mark.parametrize("direct_io", [False, True])
+    @pytest.mark.parametrize("content", [b"", b"123456789", bytes(range(256)) * 40000],
+                             ids=["empty", "short", "long"])
+    def test_scrub_agrees(self, temp_dir, monkeypatch, direct_io, content):
+        """Test scrub reads, with and without O_DIRECT, give the same checksum."""
+        from pycheckit.core import Settings, Stats
+        from pycheckit.constants import IoProfile
+        from pycheckit.crc64_wrapper import crc64
+        path = os.path.join(temp_dir, "data.bin")
+        with open(path, 'wb') as f:
+            f.write(content)
+        monkeypatch.setattr(Settings, 'io_profile', IoProfile.SCRUB)
+        monkeypatch.setattr(Settings, 'direct_io', direct_io)
+        monkeypatch.setattr(Settings, 'buffer_size', 5000)
+        monkeypatch.setattr(Settings, 'adaptive_buffer', False)
+        Stats.reset()
+        assert file_crc64(path) == (ErrorType.SUCCESS, crc64(0, content))
+        assert Stats.bytes_read == len(content)
+    def test_scrub_drops_cache(self, temp_dir, monkeypatch):
+        """Test hashed ranges are dropped from the page cache."""
+        import pycheckit.core
+        from pycheckit.core import Settings
+        from pycheckit.constants import IoProfile
+        path = os.path.join(temp_dir, "data.bin")
+        with open(path, 'wb') as f:
+            f.write(bytes(20 << 20))
+        dropped = []
+        monkeypatch.setattr(pycheckit.core, 'drop_cache', lambda fd, offset, length: dropped.append((offset, length)))
+        monkeypatch.setattr(Settings, 'io_profile', IoProfile.SCRUB)
+        monkeypatch.setattr(Settings, 'direct_io', False)
+        file_crc64(path)
+        assert dropped[0] == (0, 8 << 20)
+        assert dropped[-1][1] == 0
+    def test_noatime_fallback(self, temp_file, monkeypatch):
+        """Test files are still opened if O_NOATIME is not permitted."""
+        import errno
+        import pycheckit.core
+        from pycheckit.core import Settings, open_for_hashing
+        from pycheckit.constants import IoProfile
+        if not hasattr(os, 'O_NOATIME'):
+            pytest.skip("O_NOATIME not available")
+        real_open = os.open
+        def fake_open(path, flags, *args, **kwargs):
+            if flags & os.O_NOATIME:
+                raise OSError(errno.EPERM, "Operation not permitted")
+            return real_open(path, flags, *args, **kwargs)
+        monkeypatch.setattr(pycheckit.core.os, 'open', fake_open)
+        monkeypatch.setattr(Settings, 'io_profile', IoProfile.SCRUB)
+        with open_for_hashing(temp_file) as f:
+            assert f.read() == b"Test content for pycheckit\n"
+class TestFileDescriptors:
+    """Test the descriptor based code path."""
+    def test_meta_and_hash_on_fd(self, temp_file):
+        """Test metadata, hashing and storing work on an open descriptor."""
+        from pycheckit.core import FileMeta, open_fd
+        fd = open_fd(temp_file)
+        try:
+            expected = file_crc64(temp_file)
+            assert file_crc64(temp_file, fd) == expected
+            # The descriptor is rewound, so hashing twice gives the same result
+            assert file_crc64(temp_file, fd) == expected
+            meta = FileMeta(temp_file, fd)
+            assert meta.target == fd
+            assert put_crc(temp_file, Flags(0), meta=meta) == ErrorType.SUCCESS
+        finally:
+            os.close(fd)
+        assert get_crc(temp_file) == expected
+    def test_dir_fd_relative_open(self, temp_dir):
+        """Test files are opened relative to a directory descriptor."""
+        from pycheckit.core import open_dir_fd, open_fd
+        os.makedirs(os.path.join(temp_dir, "a", "b"))
+        with open(os.path.join(temp_dir, "a", "b", "f"), 'wb') as f:
+            f.write(b"123456789")
+        top = open_dir_fd(temp_dir)
+        sub = open_dir_fd(os.path.join(temp_dir, "a"), top)
+        subsub = open_dir_fd("a/b", sub)
+        fd = open_fd("f", subsub)
+        try:
+            assert os.read(fd, 9) == b"123456789"
+        finally:
+            for d in (fd, subsub, sub, top):
+                os.close(d)
+class TestFileExtents:
+    """Test file_extents functionality."""
+    def test_extents(self, temp_dir):
+        """Test a written file has a mapped first extent and an empty file none."""
+        from pycheckit.core import file_extents
+        path = os.path.join(temp_dir, "data")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(100000))
+            f.flush()
+            os.fsync(f.fileno())
+        open(os.path.join(temp_dir, "empty"), 'wb').close()
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            extents = file_extents(fd)
+        finally:
+            os.close(fd)
+        if extents is None:
+            pytest.skip("filesystem does not support FIEMAP")
+        assert len(extents) == 1
+        assert extents[0][0] == 0 and extents[0][2] > 0
+        fd = os.open(os.path.join(temp_dir, "empty"), os.O_RDONLY)
+        try:
+            assert file_extents(fd) == []
+        finally:
+            os.close(fd)
+class TestHardlinkCache:
+    """Test HardlinkCache functionality."""
+    @staticmethod
+    def fake_stat(ino, nlink):
+        return os.stat_result((0o100644, ino, 1, nlink, 0, 0, 10, 0, 0, 0))
+    def test_dropped_after_last_link(self):
+        """Test an entry is served once per remaining link, then dropped."""
+        from pycheckit.core import HardlinkCache
+        cache = HardlinkCache()
+        st = self.fake_stat(7, 3)
+        assert cache.get(st) is None
+        cache.put(st, 0xABC)
+        assert cache.get(st) == 0xABC
+        assert cache.get(st) == 0xABC
+        assert len(cache) == 0
+        cache.put(self.fake_stat(8, 1), 1)
+        assert len(cache) == 0
+    def test_lru_bound(self):
+        """Test the least recently used entry goes when the cache is full."""
+        from pycheckit.core import HardlinkCache
+        cache = HardlinkCache(max_entries=2)
+        for ino in (1, 2):
+            cache.put(self.fake_stat(ino, 5), ino)
+        assert cache.get(self.fake_stat(1, 5)) == 1
+        cache.put(self.fake_stat(3, 5), 3)
+        assert self.fake_stat(2, 5) not in cache
+        assert self.fake_stat(1, 5) in cache and self.fake_stat(3, 5) in cache
+    def test_claim(self):
+        """Test only the first link of an inode is claimed for hashing."""
+        from pycheckit.core import HardlinkCache
+        cache = HardlinkCache()
+        st = self.fake_stat(9, 2)
+        assert cache.claim(st)
+        assert not cache.claim(st)
+        cache.release(st)
+        cache.add_link(st, 5)
+        assert not cache.claim(st)
+        assert cache.get(st) == 5
+    def test_concurrent_links_read_once(self, temp_dir, monkeypatch):
+        """Test threads hashing links to one inode at the same time read it once."""
+        import threading
+        import time
+        from pycheckit import core
+        from pycheckit.core import HardlinkCache, Settings
+        first = os.path.join(temp_dir, "first")
+        with open(first, 'wb') as f:
+            f.write(b"x" * 1000)
+        links = [first] + [os.path.join(temp_dir, f"link{i}") for i in range(3)]
+        for link in links[1:]:
+            os.link(first, link)
+        reads = []
+        real_read = core._read_file_crc64
+        def slow_read(*args):
+            reads.append(args[0])
+            time.sleep(0.05)
+            return real_read(*args)
+        monkeypatch.setattr(core, '_read_file_crc64', slow_read)
+        monkeypatch.setattr(Settings, 'hardlinks', HardlinkCache())
+        results = {}
+        threads = [threading.Thread(target=lambda p=p: results.setdefault(p, file_crc64(p, st=os.stat(p))))
+                   for p in links]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(reads) == 1
+        assert set(results.values()) == {file_crc64(first)}
+class TestCrcRecord:
+    """Test CrcRecord functionality."""
+    @staticmethod
+    def fake_stat(size, mtime_ns, ctime_ns):
+        return os.stat_result((0o100644, 1, 1, 1, 0, 0, size, 0, 0, 0, 0.0, 0.0, 0.0, 0, mtime_ns, ctime_ns))
+    def test_pack_unpack(self):
+        """Test records round-trip and later versions with more fields still parse."""
+        from pycheckit.core import CrcRecord
+        data = CrcRecord(10, 20, 30, 40).pack()
+        record = CrcRecord.unpack(data + b"future fields")
+        assert (record.size, record.mtime_ns, record.ctime_ns, record.hashed_ns) == (10, 20, 30, 40)
+        assert CrcRecord.unpack(data[:-1]) is None
+        assert CrcRecord.unpack(b"\0" + data[1:]) is None
+    def test_matches(self):
+        """Test size and mtime must match and ctime may only move shortly after hashing."""
+        from pycheckit.constants import CTIME_TOLERANCE_NS
+        from pycheckit.core import CrcRecord
+        record = CrcRecord(100, 5000, 6000, 10 ** 12)
+        assert record.matches(self.fake_stat(100, 5000, 6000))
+        assert record.matches(self.fake_stat(100, 5000, 10 ** 12 + 1000))
+        assert not record.matches(self.fake_stat(101, 5000, 6000))
+        assert not record.matches(self.fake_stat(100, 5001, 6000))
+        assert not record.matches(self.fake_stat(100, 5000, 10 ** 12 + CTIME_TOLERANCE_NS + 1))
+    def test_put_and_remove(self, temp_file):
+        """Test storing a checksum writes a matching record and removing it drops the record."""
+        from pycheckit.core import get_crc_record
+        assert put_crc(temp_file, Flags(0)) == ErrorType.SUCCESS
+        record = get_crc_record(temp_file)
+        assert record is not None and record.matches(os.stat(temp_file))
+        assert remove_crc(temp_file) == ErrorType.SUCCESS
+        assert get_crc_record(temp_file) is None
+class TestMounts:
+    """Test filesystem type detection and the per-device xattr decision."""
+    def test_fs_type_cached_per_device(self, temp_dir, monkeypatch):
+        """Test statfs is called once per device and agrees with the descriptor form."""
+        from pycheckit import core
+        paths = []
+        for name in ("a", "b"):
+            paths.append(os.path.join(temp_dir, name))
+            open(paths[-1], 'w').close()
+        expected = core._statfs_type(temp_dir)
+        if sys.platform.startswith('linux'):
+            assert isinstance(expected, int)
+        fd = os.open(paths[0], os.O_RDONLY)
+        try:
+            assert core._statfs_type(fd) == expected
+        finally:
+            os.close(fd)
+        calls = []
+        monkeypatch.setattr(core, '_statfs_type', lambda target: calls.append(target) or expected)
+        assert core.get_fs_type(paths[0]) == expected
+        assert core.get_fs_type(paths[1]) == expected
+        assert calls == [paths[0]]
+    @pytest.mark.skipif(not sys.platform.startswith('linux') or not shutil.which('stat'),
+                        reason="needs Linux and coreutils stat")
+    def test_fs_type_matches_stat(self, temp_dir):
+        """Test f_type is read from the right place of struct statfs on this ABI."""
+        from pycheckit import core
+        output = subprocess.run(['stat', '-f', '-c', '%t', temp_dir], capture_output=True, text=True, check=True)
+        assert core._statfs_type(temp_dir) == int(output.stdout, 16)
+    def test_known_fs_skips_xattrs(self, temp_dir, monkeypatch):
+        """Test a VFAT device stores only with -e, in the hidden file, without reading the file otherwise."""
+        import xattr
+        from pycheckit import core
+        from pycheckit.constants import FS_VFAT
+        path = os.path.join(temp_dir, "file")
+        with open(path, 'w') as f:
+            f.write("content")
+        monkeypatch.setattr(core, '_statfs_type', lambda target: FS_VFAT)
+        def forbidden(*args, **kwargs):
+            raise AssertionError("unexpected call")
+        for name in ('getxattr', 'setxattr'):
+            monkeypatch.setattr(xattr, name, forbidden)
+        with monkeypatch.context() as m:
+            m.setattr(core, 'file_crc64', forbidden)
+            assert put_crc(path, Flags(0)) == ErrorType.ERROR_NO_XATTR_SUPPORT
+        assert put_crc(path, Flags.EXPORT) == ErrorType.SUCCESS
+        assert present_crc64(path) == AttributeType.HIDDEN_ATTR
+        assert get_crc(path) == (ErrorType.SUCCESS, file_crc64(path)[1])
+    def test_enotsup_marks_device(self, temp_dir, monkeypatch):
+        """Test the first setxattr failing with ENOTSUP sends later files straight to hidden files."""
+        import errno
+        import xattr
+        from pycheckit import core
+        monkeypatch.setattr(core, '_statfs_type', lambda target: None)
+        calls = []
+        def unsupported(*args, **kwargs):
+            calls.append(args[0])
+            raise OSError(errno.ENOTSUP, os.strerror(errno.ENOTSUP))
+        monkeypatch.setattr(xattr, 'setxattr', unsupported)
+        paths = []
+        for name in ("a", "b"):
+            paths.append(os.path.join(temp_dir, name))
+            with open(paths[-1], 'w') as f:
+                f.write(name)
+        assert put_crc(paths[0], Flags.EXPORT) == ErrorType.SUCCESS
+        assert put_crc(paths[1], Flags.EXPORT) == ErrorType.SUCCESS
+        assert calls == [paths[0]]
+        assert [present_crc64(path) for path in paths] == [AttributeType.HIDDEN_ATTR] * 2
+    def test_other_setxattr_errors(self, temp_dir, monkeypatch):
+        """Test setxattr failing for another reason is a per-file error, not a missing feature."""
+        import errno
+        import xattr
+        path = os.path.join(temp_dir, "file")
+        open(path, 'w').close()
+        def denied(*args, **kwargs):
+            raise OSError(errno.EACCES, os.strerror(errno.EACCES))
+        monkeypatch.setattr(xattr, 'setxattr', denied)
+        assert put_crc(path, Flags(0)) == ErrorType.ERROR_SET_CRC
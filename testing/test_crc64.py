@@ -38,3 +38,262 @@ class TestCRC64:
 
         assert result_full == result_inc, "Incremental CRC64 doesn't match"
 
+
+class TestSlicedKernels:
+    """Test the slicing-by-8/16 kernels of the Cython extension."""
+
+    @pytest.fixture
+    def ext(self):
+        """Return the compiled extension, skip if it is not built."""
+        return pytest.importorskip("pycheckit.crc64")
+
+    def test_known_vector(self, ext):
+        """Test all kernels with the known test vector."""
+        for func in (ext.crc64, ext.crc64_slice16, ext.crc64_slice8, ext.crc64_bytewise):
+            assert func(0, b"123456789") == 0xe9c6d914c4b8d9ca
+
+    def test_match_pure_python(self, ext):
+        """Test sliced kernels against the pure Python loop for all tail lengths."""
+        from pycheckit.crc64_pure import crc64 as crc64_pure
+
+        data = bytes(range(256)) * 5
+        for length in list(range(0, 40)) + [255, 256, 1000, 1280]:
+            chunk = data[3:3 + length]
+            for init in (0, 0xe9c6d914c4b8d9ca):
+                expected = crc64_pure(init, chunk)
+                assert ext.crc64(init, chunk) == expected
+                assert ext.crc64_slice8(init, chunk) == expected
+
+    def test_clmul_matches_table_kernel(self, ext):
+        """Test carry-less multiplication folding against the byte-wise loop."""
+        if not ext.HAVE_CLMUL:
+            pytest.skip("CPU lacks carry-less multiply instructions")
+
+        assert ext.crc64_clmul(0, b"123456789") == 0xe9c6d914c4b8d9ca
+        data = bytes((i * 7 + 3) & 0xff for i in range(5000))
+        for length in (0, 15, 255, 256, 257, 271, 383, 384, 1024, 4099, 5000):
+            for init in (0, 0xe9c6d914c4b8d9ca):
+                expected = ext.crc64_bytewise(init, data[:length])
+                assert ext.crc64_clmul(init, data[:length]) == expected
+                assert ext.crc64(init, data[:length]) == expected
+
+
+class TestBufferProtocol:
+    """Test CRC64 with bytes-like objects other than bytes."""
+
+    @pytest.mark.parametrize("module", ["pycheckit.crc64", "pycheckit.crc64_numpy",
+                                        "pycheckit.crc64_pure"])
+    def test_buffer_types(self, module):
+        """Test bytearray, memoryview and mmap buffers give the same CRC."""
+        import mmap
+        crc64 = pytest.importorskip(module).crc64
+
+        data = b"123456789" * 100
+        expected = crc64(0, data)
+        assert crc64(0, bytearray(data)) == expected
+        assert crc64(0, memoryview(data)) == expected
+        assert crc64(0, memoryview(bytearray(data))[:9]) == 0xe9c6d914c4b8d9ca
+
+        with mmap.mmap(-1, len(data)) as mm:
+            mm.write(data)
+            assert crc64(0, mm) == expected
+
+    def test_threads(self):
+        """Test concurrent hashing from several threads."""
+        from concurrent.futures import ThreadPoolExecutor
+        crc64 = pytest.importorskip("pycheckit.crc64").crc64
+
+        buffers = [bytes([i]) * (1 << 20) for i in range(8)]
+        expected = [crc64(0, b) for b in buffers]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            assert list(pool.map(lambda b: crc64(0, b), buffers)) == expected
+
+
+class TestCRC64Combine:
+    """Test combining CRC64 checksums of consecutive blocks."""
+
+    @pytest.mark.parametrize("module", ["pycheckit.crc64", "pycheckit.crc64_pure"])
+    def test_combine_matches_sequential(self, module):
+        """Test combined CRCs match the CRC of the concatenated data."""
+        mod = pytest.importorskip(module)
+
+        data = bytes((i * 31 + 7) & 0xff for i in range(3000))
+        for split in (0, 1, 9, 1000, 2999, 3000):
+            crc_a = mod.crc64(0, data[:split])
+            crc_b = mod.crc64(0, data[split:])
+            assert mod.crc64_combine(crc_a, crc_b, len(data) - split) == mod.crc64(0, data)
+
+    def test_combine_many_chunks(self):
+        """Test folding the CRCs of many chunks into one value."""
+        from pycheckit.crc64_wrapper import crc64, crc64_combine
+
+        data = b"123456789" * 1000
+        crc = 0
+        for offset in range(0, len(data), 1024):
+            chunk = data[offset:offset + 1024]
+            crc = crc64_combine(crc, crc64(0, chunk), len(chunk))
+        assert crc == crc64(0, data)
+
+
+class TestNumpyBackend:
+    """Test the vectorized NumPy implementation."""
+
+    @pytest.fixture
+    def crc64_numpy(self):
+        """Return the NumPy backend, skip if NumPy is not installed."""
+        pytest.importorskip("numpy")
+        from pycheckit import crc64_numpy
+        return crc64_numpy
+
+    def test_known_vector(self, crc64_numpy):
+        """Test the NumPy backend with the known test vector."""
+        assert crc64_numpy.crc64(0, b"123456789") == 0xe9c6d914c4b8d9ca
+
+    def test_match_pure_python(self, crc64_numpy):
+        """Test lane hashing and merging for lengths around the lane size."""
+        from pycheckit.crc64_pure import crc64 as crc64_pure
+
+        data = bytes((i * 13 + 5) & 0xff for i in range(20000))
+        lane = crc64_numpy.LANE_LEN
+        for length in (0, 100, 4 * lane - 1, 4 * lane, 5 * lane + 3, 77 * lane + 9, 20000):
+            for init in (0, 0xe9c6d914c4b8d9ca):
+                assert crc64_numpy.crc64(init, data[:length]) == crc64_pure(init, data[:length])
+
+    def test_wrapper_prefers_numpy(self, crc64_numpy, monkeypatch):
+        """Test the wrapper falls back to NumPy if the extension is missing."""
+        import importlib
+        import sys
+        import pycheckit.crc64_wrapper as wrapper
+
+        monkeypatch.setitem(sys.modules, "pycheckit.crc64", None)
+        try:
+            importlib.reload(wrapper)
+            assert wrapper.get_implementation() == "numpy"
+            assert wrapper.crc64(0, b"123456789") == 0xe9c6d914c4b8d9ca
+        finally:
+            monkeypatch.undo()
+            importlib.reload(wrapper)
+
+
+class TestBackendRegistry:
+    """Test selection of the CRC64 backend."""
+
+    @pytest.fixture(autouse=True)
+    def restore_backend(self):
+        """Reselect the default backend after each test."""
+        from pycheckit import crc64_wrapper
+        yield
+        crc64_wrapper.select_backend("auto")
+
+    def test_all_available_backends_agree(self):
+        """Test every available backend gives the known test vector."""
+        from pycheckit import crc64_wrapper
+
+        available = crc64_wrapper.available_backends()
+        assert "python" in available
+        for name in available:
+            assert crc64_wrapper.select_backend(name) == name
+            assert crc64_wrapper.get_implementation() == name
+            assert crc64_wrapper.crc64(0, b"123456789") == 0xe9c6d914c4b8d9ca
+            assert crc64_wrapper.crc64_combine(crc64_wrapper.crc64(0, b"1234"),
+                                               crc64_wrapper.crc64(0, b"56789"), 5) == 0xe9c6d914c4b8d9ca
+
+    def test_auto_picks_first_available(self):
+        """Test auto selection follows the priority list."""
+        from pycheckit import crc64_wrapper
+
+        assert crc64_wrapper.select_backend("auto") == crc64_wrapper.available_backends()[0]
+
+    def test_environment_override(self, monkeypatch):
+        """Test the environment variable selects the backend."""
+        from pycheckit import crc64_wrapper
+
+        monkeypatch.setenv(crc64_wrapper.BACKEND_ENV, "python")
+        assert crc64_wrapper.select_backend() == "python"
+
+    def test_environment_typo_warns(self, monkeypatch, capsys):
+        """Test an unknown backend in the environment is reported, not silently replaced."""
+        from pycheckit import crc64_wrapper
+
+        monkeypatch.setenv(crc64_wrapper.BACKEND_ENV, "simdd")
+        monkeypatch.setattr(crc64_wrapper, "_active", None)
+        monkeypatch.setattr(crc64_wrapper, "_crc64", None)
+        assert crc64_wrapper.crc64(0, b"123456789") == 0xe9c6d914c4b8d9ca
+        err = capsys.readouterr().err
+        assert "'simdd'" in err and crc64_wrapper.BACKEND_ENV in err
+        assert crc64_wrapper.get_implementation() == crc64_wrapper.available_backends()[0]
+
+    def test_unknown_backend(self):
+        """Test selecting an unknown backend fails."""
+        from pycheckit import crc64_wrapper
+
+        with pytest.raises(ValueError):
+            crc64_wrapper.select_backend("quantum")
+
+    def test_core_uses_selected_backend(self, temp_file):
+        """Test file checksums are calculated with the selected backend."""
+        from pycheckit import crc64_wrapper
+        from pycheckit.core import file_crc64
+
+        expected = file_crc64(temp_file)
+        crc64_wrapper.select_backend("python")
+        assert file_crc64(temp_file) == expected
+
+
+class TestCRC64Files:
+    """Test hashing many files in one call."""
+
+    @pytest.fixture(autouse=True)
+    def restore_backend(self):
+        """Reselect the default backend after each test."""
+        from pycheckit import crc64_wrapper
+        yield
+        crc64_wrapper.select_backend("auto")
+
+    @pytest.mark.parametrize("backend", ["auto", "python"])
+    def test_crc64_files(self, backend, temp_dir):
+        """Test checksums and error codes of a batch of paths."""
+        import errno
+        import os
+        from pycheckit import crc64_wrapper
+
+        crc64_wrapper.select_backend(backend)
+        paths = []
+        for i, content in enumerate([b"", b"123456789", bytes(range(256)) * 700]):
+            path = os.path.join(temp_dir, f"file{i}")
+            with open(path, 'wb') as f:
+                f.write(content)
+            paths.append(path)
+        paths.append(os.path.join(temp_dir, "missing"))
+
+        results = crc64_wrapper.crc64_files(paths, buffer_size=4096)
+        assert results[0] == (0, 0)
+        assert results[1] == (0, 0xe9c6d914c4b8d9ca)
+        assert results[2] == (0, crc64_wrapper.crc64(0, bytes(range(256)) * 700))
+        assert results[3][0] == errno.ENOENT
+
+    @pytest.mark.parametrize("backend, kernel", [("simd", "clmul"), ("sliced", "slice16"), ("table", "bytewise")])
+    def test_crc64_files_uses_backend_kernel(self, backend, kernel, temp_dir, monkeypatch):
+        """Test the native batch hashes with the kernel of the selected backend."""
+        import os
+        from pycheckit import crc64_wrapper
+        ext = pytest.importorskip("pycheckit.crc64")
+        if backend not in crc64_wrapper.available_backends():
+            pytest.skip(f"{backend} backend not available")
+        path = os.path.join(temp_dir, "file")
+        with open(path, 'wb') as f:
+            f.write(b"123456789")
+        assert ext.crc64_files([path], 4096, kernel) == [(0, 0xe9c6d914c4b8d9ca)]
+
+        calls = []
+        real = ext.crc64_files
+        monkeypatch.setattr(ext, "crc64_files", lambda *args: calls.append(args[2:]) or real(*args))
+        crc64_wrapper.select_backend(backend)
+        assert crc64_wrapper.crc64_files([path]) == [(0, 0xe9c6d914c4b8d9ca)]
+        assert calls == [(kernel,)]
+
+    def test_crc64_files_unknown_kernel(self):
+        """Test an unknown kernel name is rejected."""
+        ext = pytest.importorskip("pycheckit.crc64")
+        with pytest.raises(ValueError):
+            ext.crc64_files([], 4096, "fast")
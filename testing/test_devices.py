@@ -0,0 +1,70 @@
+"""Unit tests for the per-device queues."""
+import os
+import threading
+import pytest
+from pycheckit import devices
+from pycheckit.constants import HDD_QUEUE_DEPTH, SSD_QUEUE_DEPTH, DeviceClass
+from pycheckit.devices import DeviceQueues, device_class
+HDD = os.makedev(8, 0)
+HDD_PART = os.makedev(8, 1)
+SSD = os.makedev(259, 0)
+@pytest.fixture
+def sysfs(temp_dir, monkeypatch):
+    """Fake /sys/dev/block with a rotational disk and partition and an SSD."""
+    def make_disk(name, rotational):
+        queue = os.path.join(temp_dir, "devices", name, "queue")
+        os.makedirs(queue)
+        with open(os.path.join(queue, "rotational"), 'w') as f:
+            f.write(f"{rotational}\n")
+    make_disk("sda", 1)
+    make_disk("nvme0n1", 0)
+    os.makedirs(os.path.join(temp_dir, "devices", "sda", "sda1"))
+    links = os.path.join(temp_dir, "dev", "block")
+    os.makedirs(links)
+    for dev, target in ((HDD, "sda"), (HDD_PART, "sda/sda1"), (SSD, "nvme0n1")):
+        os.symlink(os.path.join(temp_dir, "devices", target),
+                   os.path.join(links, f"{os.major(dev)}:{os.minor(dev)}"))
+    monkeypatch.setattr(devices, 'SYS_DEV_BLOCK', links)
+class TestDeviceClass:
+    """Test device_class functionality."""
+    def test_rotational(self, sysfs):
+        """Test disks and partitions are classified by the queue of the disk."""
+        assert device_class(HDD) == DeviceClass.HDD
+        assert device_class(HDD_PART) == DeviceClass.HDD
+        assert device_class(SSD) == DeviceClass.SSD
+    def test_other(self, sysfs):
+        """Test anonymous and unknown devices are OTHER."""
+        assert device_class(os.makedev(0, 42)) == DeviceClass.OTHER
+        assert device_class(os.makedev(9, 9)) == DeviceClass.OTHER
+class TestDeviceQueues:
+    """Test DeviceQueues functionality."""
+    def test_depths(self, sysfs):
+        """Test the depth comes from the class of the device unless overridden."""
+        queues = DeviceQueues({DeviceClass.SSD: 3, HDD_PART: 2})
+        assert queues.depth(HDD) == HDD_QUEUE_DEPTH
+        assert queues.depth(HDD_PART) == 2
+        assert queues.depth(SSD) == 3
+        assert DeviceQueues().depth(SSD) == SSD_QUEUE_DEPTH
+    def test_executor_per_device(self, sysfs):
+        """Test each device gets its own workers, at most depth at a time."""
+        queues = DeviceQueues({DeviceClass.SSD: 2})
+        assert queues.executor(HDD) is queues.executor(HDD)
+        assert queues.executor(HDD) is not queues.executor(SSD)
+        assert queues.total_depth == HDD_QUEUE_DEPTH + 2
+        lock = threading.Lock()
+        running = {HDD: 0, SSD: 0}
+        peak = {HDD: 0, SSD: 0}
+        barrier = threading.Barrier(2, timeout=5)
+        def task(dev):
+            with lock:
+                running[dev] += 1
+                peak[dev] = max(peak[dev], running[dev])
+            if dev == SSD:
+                barrier.wait()
+            with lock:
+                running[dev] -= 1
+        futures = [queues.executor(dev).submit(task, dev) for dev in (HDD, SSD) * 4]
+        for future in futures:
+            future.result()
+        queues.shutdown()
+        assert peak == {HDD: 1, SSD: 2}
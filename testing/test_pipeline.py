@@ -0,0 +1,93 @@
+"""Unit tests for the parallel pipeline."""
+import os
+import random
+import sys
+import threading
+import time
+import pytest
+from pycheckit.core import Stats, file_crc64
+from pycheckit.devices import DeviceQueues
+from pycheckit.pipeline import Pipeline, ProcessPool, in_order, in_worker
+class TestPipeline:
+    """Test Pipeline functionality."""
+    def test_output_in_submission_order(self, capsys):
+        """Test output is replayed in submission order, whichever task finishes first."""
+        rng = random.Random(1)
+        def task(i):
+            time.sleep(rng.random() / 1000)
+            print(f"out {i}")
+            print(f"err {i}", file=sys.stderr)
+        with Pipeline(4) as pipeline:
+            for i in range(50):
+                pipeline.submit(task, i)
+        captured = capsys.readouterr()
+        assert captured.out.splitlines() == [f"out {i}" for i in range(50)]
+        assert captured.err.splitlines() == [f"err {i}" for i in range(50)]
+    def test_in_order_calls(self):
+        """Test deferred calls run in submission order on the main thread."""
+        results = []
+        threads = set()
+        def task(i):
+            assert in_worker()
+            in_order(lambda: (results.append(i), threads.add(threading.get_ident())))
+        with Pipeline(3) as pipeline:
+            for i in range(20):
+                pipeline.submit(task, i)
+        assert results == list(range(20))
+        assert threads == {threading.get_ident()}
+        assert not in_worker()
+    def test_exception_is_reraised(self, capsys):
+        """Test a SystemExit in a task ends the run after the output before it."""
+        def task(i):
+            print(i)
+            if i == 3:
+                sys.exit(1)
+        cleanups = []
+        with pytest.raises(SystemExit):
+            with Pipeline(2) as pipeline:
+                for i in range(10):
+                    pipeline.submit(task, i, cleanup=lambda i=i: cleanups.append(i))
+        assert capsys.readouterr().out.splitlines()[:4] == ["0", "1", "2", "3"]
+        assert sorted(cleanups) == list(range(10))
+    def test_window_bounds_pending(self):
+        """Test no more than window tasks are in flight."""
+        running = []
+        def task():
+            running.append(1)
+        with Pipeline(2, window=3) as pipeline:
+            for _ in range(10):
+                pipeline.submit(task)
+                assert len(pipeline._pending) <= 3
+        assert len(running) == 10
+    def test_device_tasks_on_device_workers(self, capsys):
+        """Test tasks submitted with a device run on that device's workers, output still in order."""
+        def task(i):
+            print(f"{i} {threading.current_thread().name.rsplit('_', 1)[0]}")
+        queues = DeviceQueues({1: 1, 2: 1})
+        with Pipeline(2, devices=queues) as pipeline:
+            for i in range(6):
+                pipeline.submit(task, i, device=1 + i % 2)
+            pipeline.submit(task, 6)
+        assert capsys.readouterr().out.splitlines() == [
+            "0 pycheckit-0:1", "1 pycheckit-0:2", "2 pycheckit-0:1", "3 pycheckit-0:2",
+            "4 pycheckit-0:1", "5 pycheckit-0:2", "6 pycheckit"]
+class TestProcessPool:
+    """Test ProcessPool functionality."""
+    def test_checksums_and_order(self, temp_dir):
+        """Test workers return the checksums of file_crc64 and callbacks run in order."""
+        files = []
+        for i in range(10):
+            path = os.path.join(temp_dir, f"f{i}")
+            with open(path, 'wb') as f:
+                f.write(bytes([i]) * (i * 1000))
+            files.append((path, i * 1000))
+        missing = os.path.join(temp_dir, "missing")
+        Stats.reset()
+        calls = []
+        with ProcessPool(2, batch_size=3) as pool:
+            pool.hash(files[:5] + [(missing, 0)], lambda crcs: calls.append(crcs))
+            pool.hash(files[5:], lambda crcs: calls.append(crcs), cleanup=lambda: calls.append("done"))
+        assert len(calls) == 3 and calls[2] == "done"
+        assert calls[0] == {path: file_crc64(path)[1] for path, _ in files[:5]}
+        assert calls[1] == {path: file_crc64(path)[1] for path, _ in files[5:]}
+        assert Stats.bytes_read >= sum(size for _, size in files)
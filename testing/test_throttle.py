@@ -0,0 +1,67 @@
+"""Unit tests for the rate limiters."""
+import threading
+import pytest
+from pycheckit.throttle import TokenBucket, AdaptiveTokenBucket
+class FakeClock:
+    """Clock that only advances when sleeping."""
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.now += seconds
+class TestTokenBucket:
+    """Test TokenBucket functionality."""
+    def test_burst_is_free(self):
+        """Test requests within the burst do not sleep."""
+        clock = FakeClock()
+        bucket = TokenBucket(100, clock=clock, sleep=clock.sleep)
+        assert bucket.acquire(60) == 0
+        assert bucket.acquire(40) == 0
+        assert clock.now == 0
+    def test_average_rate(self):
+        """Test the long-term rate matches the limit, also for large requests."""
+        clock = FakeClock()
+        bucket = TokenBucket(1000, burst=100, clock=clock, sleep=clock.sleep)
+        for _ in range(50):
+            bucket.acquire(400)
+        assert clock.now == pytest.approx((50 * 400 - 100) / 1000)
+    def test_invalid_rate(self):
+        """Test a rate of 0 is rejected."""
+        with pytest.raises(ValueError):
+            TokenBucket(0)
+    def test_shared_between_threads(self):
+        """Test concurrent callers share one budget."""
+        clock = FakeClock()
+        lock = threading.Lock()
+        def sleep(seconds):
+            with lock:
+                clock.sleep(seconds)
+        bucket = TokenBucket(1000, burst=1000, clock=clock, sleep=sleep)
+        threads = [threading.Thread(target=lambda: [bucket.acquire(100) for _ in range(10)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 4000 tokens at 1000/s after a burst of 1000 need at least 3 s of sleeping
+        assert clock.now >= 3.0
+class TestAdaptiveTokenBucket:
+    """Test latency based back-off."""
+    def test_backs_off_and_recovers(self):
+        """Test the rate drops on latency spikes and recovers afterwards."""
+        clock = FakeClock()
+        bucket = AdaptiveTokenBucket(1 << 20, clock=clock, sleep=clock.sleep)
+        for _ in range(10):
+            bucket.observe(0.002)
+        assert bucket.rate == bucket.max_rate
+        for _ in range(10):
+            bucket.observe(0.1)
+        assert bucket.rate == bucket.max_rate * AdaptiveTokenBucket.MIN_FRACTION
+        for _ in range(200):
+            bucket.observe(0.002)
+        assert bucket.rate == bucket.max_rate
+    def test_unknown_latency_ignored(self):
+        """Test reads without a latency sample do not change the rate."""
+        bucket = AdaptiveTokenBucket(1000)
+        bucket.observe(None)
+        assert bucket.rate == 1000
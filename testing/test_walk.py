@@ -0,0 +1,142 @@
+"""Unit tests for the directory walker."""
+import os
+import sys
+import pytest
+from pycheckit.constants import WalkOrder
+from pycheckit import walk
+from pycheckit.walk import walk_tree
+def open_fds():
+    """Return the number of open file descriptors of this process."""
+    return len(os.listdir('/proc/self/fd'))
+@pytest.fixture
+def tree(temp_dir):
+    """Create a small tree with files and nested subdirectories."""
+    for name in ("b", "a", "c", "sub/x", "sub/deeper/y", "other/z"):
+        path = os.path.join(temp_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(name)
+    return temp_dir
+class TestWalkTree:
+    """Test walk_tree functionality."""
+    def test_walk_order(self, temp_dir):
+        """Test the default order is a sorted recursive listing, subdirectories in their sorted position."""
+        for name in ("c", "a", "bdir/x", "bdir/adir/w", "bdir/y", "d/e/f", "e"):
+            path = os.path.join(temp_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        names = [os.path.relpath(os.path.join(path, e.name), temp_dir)
+                 for path, _, entries in walk_tree(temp_dir) for e in entries]
+        assert names == ["a", "bdir/adir/w", "bdir/x", "bdir/y", "c", "d/e/f", "e"]
+    def test_walk_files_first(self, tree):
+        """Test the inode order walks the files of a directory before its subdirectories."""
+        names = [os.path.relpath(os.path.join(path, e.name), tree)
+                 for path, _, entries in walk_tree(tree, order=WalkOrder.INODE) for e in entries]
+        assert set(names[:3]) == {"a", "b", "c"}
+        assert names.index("sub/x") < names.index("sub/deeper/y")
+    def test_suspended_directories(self, temp_dir, monkeypatch):
+        """Test directories closed to stay below MAX_OPEN_DIRS are resumed in place."""
+        # l, m/l, m/m/l, ... and the n files on the way back up
+        parents = [os.path.join(*(["m"] * depth)) if depth else "" for depth in range(6)]
+        for parent in parents:
+            os.makedirs(os.path.join(temp_dir, parent, "m"), exist_ok=True)
+            for name in ("l", "n"):
+                open(os.path.join(temp_dir, parent, name), 'w').close()
+        expected = [os.path.join(parent, "l") for parent in parents]
+        expected += [os.path.join(parent, "n") for parent in reversed(parents)]
+        monkeypatch.setattr(walk, 'MAX_OPEN_DIRS', 2)
+        before = open_fds()
+        def walk_names(**kwargs):
+            return [os.path.relpath(os.path.join(path, e.name), temp_dir)
+                    for path, _, entries in walk_tree(temp_dir, **kwargs) for e in entries]
+        assert walk_names() == expected
+        # Suspended in the middle of reading a directory
+        suspended = walk_names(chunk_size=1)
+        assert open_fds() == before
+        monkeypatch.setattr(walk, 'MAX_OPEN_DIRS', 256)
+        assert suspended == walk_names(chunk_size=1)
+    @pytest.mark.parametrize("order", list(WalkOrder))
+    def test_suspended_large_directories(self, temp_dir, monkeypatch, order):
+        """Test directories suspended between and inside chunks give the same entries in the same order."""
+        for parent in ("", "s", "s/t"):
+            os.makedirs(os.path.join(temp_dir, parent, "sub"), exist_ok=True)
+            for i in range(12):
+                open(os.path.join(temp_dir, parent, f"f{i:02d}"), 'w').close()
+        def walk_names():
+            return [os.path.relpath(os.path.join(path, e.name), temp_dir)
+                    for path, _, entries in walk_tree(temp_dir, order=order, chunk_size=5) for e in entries]
+        expected = walk_names()
+        assert len(expected) == 36
+        monkeypatch.setattr(walk, 'MAX_OPEN_DIRS', 1)
+        assert walk_names() == expected
+    def test_walk_unsorted(self, tree):
+        """Test all files are found without sorting."""
+        names = {e.name for _, _, entries in walk_tree(tree, order=WalkOrder.NONE) for e in entries}
+        assert names == {"a", "b", "c", "x", "y", "z"}
+    def test_walk_inode_order(self, tree):
+        """Test files are sorted by inode number."""
+        chunks = [entries for _, _, entries in walk_tree(tree, order=WalkOrder.INODE)]
+        for entries in chunks:
+            assert [e.inode() for e in entries] == sorted(e.inode() for e in entries)
+        assert {e.name for c in chunks for e in c} == {"a", "b", "c", "x", "y", "z"}
+    def test_walk_physical_order(self, temp_dir, monkeypatch):
+        """Test files are sorted by their first extent, unmapped ones first by inode."""
+        offsets = {"a": 300, "b": None, "c": 100, "d": 200}
+        for name in offsets:
+            with open(os.path.join(temp_dir, name), 'w') as f:
+                f.write(name)
+        def fake_extents(fd):
+            offset = offsets[os.read(fd, 1).decode()]
+            return [] if offset is None else [(0, offset, 4096)]
+        monkeypatch.setattr(walk, 'file_extents', fake_extents)
+        names = [e.name for _, _, entries in walk_tree(temp_dir, order=WalkOrder.PHYSICAL) for e in entries]
+        assert names == ["b", "c", "d", "a"]
+    def test_chunks_are_bounded(self, temp_dir):
+        """Test a large directory is yielded in chunks of the given size."""
+        for i in range(10):
+            open(os.path.join(temp_dir, f"f{i}"), 'w').close()
+        chunks = [entries for _, _, entries in walk_tree(temp_dir, chunk_size=3)]
+        assert [len(c) for c in chunks] == [3, 3, 3, 1]
+        assert sorted(e.name for c in chunks for e in c) == [f"f{i}" for i in range(10)]
+    def test_dir_fd_is_usable(self, tree):
+        """Test the yielded descriptor resolves the entries."""
+        for _, fd, entries in walk_tree(tree):
+            for entry in entries:
+                assert os.stat(entry.name, dir_fd=fd).st_size > 0
+    def test_deeper_than_recursion_limit(self, temp_dir):
+        """Test trees deeper than the recursion limit are walked completely."""
+        depth = sys.getrecursionlimit() + 100
+        path = temp_dir
+        fd = os.open(temp_dir, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            for _ in range(depth):
+                os.mkdir("d", dir_fd=fd)
+                new_fd = os.open("d", os.O_RDONLY | os.O_DIRECTORY, dir_fd=fd)
+                os.close(fd)
+                fd = new_fd
+            open(os.open("leaf", os.O_CREAT | os.O_WRONLY, dir_fd=fd), 'w').close()
+        finally:
+            os.close(fd)
+        try:
+            found = [(path, e.name) for path, _, entries in walk_tree(temp_dir) for e in entries]
+            assert len(found) == 1
+            assert found[0][1] == "leaf"
+            assert found[0][0].count(os.sep + "d") == depth
+        finally:
+            # shutil.rmtree recurses and cannot remove the chain
+            fds = [os.open(temp_dir, os.O_RDONLY | os.O_DIRECTORY)]
+            for _ in range(depth):
+                fds.append(os.open("d", os.O_RDONLY | os.O_DIRECTORY, dir_fd=fds[-1]))
+            os.unlink("leaf", dir_fd=fds[-1])
+            while len(fds) > 1:
+                os.close(fds.pop())
+                os.rmdir("d", dir_fd=fds[-1])
+            os.close(fds[0])
+    def test_no_descriptor_leak(self, tree):
+        """Test descriptors are closed after a full and an abandoned walk."""
+        before = open_fds()
+        list(walk_tree(tree))
+        walk = walk_tree(tree)
+        next(walk)
+        walk.close()
+        assert open_fds() == before